@@ -1,4 +1,6 @@
 from .core import HttpLocust, Locust, TaskSet, task
+from .fasthttp import FastHttpLocust
+from .shape import LoadShape, StepLoadShape, RampLoadShape, SpikeLoadShape
 from .exception import InterruptTaskSet, ResponseError, RescheduleTaskImmediately
 
 __version__ = "0.7.5"
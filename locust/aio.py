@@ -0,0 +1,444 @@
+import sys
+import socket
+import signal
+import random
+import inspect
+import asyncio
+import logging
+import traceback
+import multiprocessing
+from time import time
+from hashlib import md5
+
+import six
+
+from . import events, stats
+from .core import Locust, TaskSet
+from .runners import (LocustRunner, STATE_INIT, STATE_HATCHING, STATE_RUNNING, STATE_STOPPED,
+                      SLAVE_REPORT_INTERVAL, HEARTBEAT_INTERVAL, HATCH_MIN_INTERVAL)
+from .processes import get_process_count
+from .usage import ResourceUsage
+from .rpc import Message
+from .rpc import asynciorpc
+from .rpc.protocol import COLUMNAR_STATS_SUPPORTED
+from .exception import LocustError, InterruptTaskSet, RescheduleTask, RescheduleTaskImmediately, StopLocust
+
+logger = logging.getLogger(__name__)
+
+
+def install_uvloop():
+    """
+    Make asyncio use uvloop's faster event loop, if uvloop is installed. Returns True if it is.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+class AsyncTaskSet(TaskSet):
+    """
+    TaskSet for :py:class:`AsyncLocust` classes, whose tasks are coroutine functions.
+
+    The tasks are awaited, and the wait between them is an asyncio sleep, so that thousands
+    of locusts can share a single asyncio event loop. Tasks and on_start can also be ordinary
+    functions, as long as they don't block. Nested TaskSets have to be AsyncTaskSets as well.
+    """
+
+    async def run(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+        try:
+            if hasattr(self, "on_start"):
+                await _await_result(self.on_start())
+        except InterruptTaskSet as e:
+            if e.reschedule:
+                raise RescheduleTaskImmediately(e.reschedule).with_traceback(sys.exc_info()[2])
+            else:
+                raise RescheduleTask(e.reschedule).with_traceback(sys.exc_info()[2])
+
+        while (True):
+            try:
+                if self.locust.stop_timeout is not None and time() - self._time_start > self.locust.stop_timeout:
+                    return
+                if self.locust._stopping:
+                    raise StopLocust()
+
+                if not self._task_queue:
+                    self.schedule_task(self.get_next_task())
+
+                self._task_start = time()
+                try:
+                    await self.execute_next_task()
+                except RescheduleTaskImmediately:
+                    pass
+                except RescheduleTask:
+                    await self.wait()
+                else:
+                    await self.wait()
+            except InterruptTaskSet as e:
+                if e.reschedule:
+                    raise RescheduleTaskImmediately(e.reschedule).with_traceback(sys.exc_info()[2])
+                else:
+                    raise RescheduleTask(e.reschedule).with_traceback(sys.exc_info()[2])
+            except StopLocust:
+                raise
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                events.locust_error.fire(locust_instance=self, exception=e, tb=sys.exc_info()[2])
+                if self.locust._catch_exceptions:
+                    sys.stderr.write("\n" + traceback.format_exc())
+                    await self.wait()
+                else:
+                    raise
+
+    async def execute_next_task(self):
+        task = self._task_queue.popleft()
+        await self.execute_task(task.callable, *task.args, **task.kwargs)
+
+    async def execute_task(self, task, *args, **kwargs):
+        # check if the function is a method bound to the current locust, and if so, don't pass self as first argument
+        if hasattr(task, "__self__") and task.__self__ == self:
+            # task is a bound method on self
+            await _await_result(task(*args, **kwargs))
+        elif hasattr(task, "tasks") and issubclass(task, TaskSet):
+            # task is another (nested) TaskSet class
+            await task(self).run(*args, **kwargs)
+        else:
+            # task is a function
+            await _await_result(task(self, *args, **kwargs))
+
+    async def wait(self):
+        locust = self.locust
+        if locust._stopping:
+            raise StopLocust()
+        locust._waiting = True
+        try:
+            if self.pacing:
+                # wait for what's left of the pacing interval, or not at all if the task took longer
+                await self._sleep(max(self.pacing / 1000.0 - (time() - self._task_start), 0))
+            else:
+                millis = random.randint(self.min_wait, self.max_wait)
+                await self._sleep(millis / 1000.0)
+        finally:
+            locust._waiting = False
+
+    def _sleep(self, seconds):
+        return asyncio.sleep(seconds)
+
+
+async def _await_result(result):
+    if inspect.isawaitable(result):
+        await result
+
+
+class AsyncLocust(Locust):
+    """
+    Locust that is run as an asyncio task by the asyncio backend, rather than in a greenlet.
+    Its task_set should be an :py:class:`AsyncTaskSet`.
+
+    The asyncio backend doesn't provide a client: use an asyncio client library, and fire
+    :py:attr:`request_success <locust.events.request_success>` and
+    :py:attr:`request_failure <locust.events.request_failure>` events for the requests.
+    """
+
+    async def run(self):
+        try:
+            await self.task_set(self).run()
+        except StopLocust:
+            pass
+        except (RescheduleTask, RescheduleTaskImmediately) as e:
+            raise LocustError("A task inside a Locust class' main TaskSet (`%s.task_set` of type `%s`) seems to have called interrupt() or raised an InterruptTaskSet exception. The interrupt() function is used to hand over execution to a parent TaskSet, and should never be called in the main TaskSet which a Locust class' task_set attribute points to." % (type(self).__name__, self.task_set.__name__)).with_traceback(sys.exc_info()[2])
+
+
+def is_async_locust(locust_class):
+    return issubclass(locust_class, AsyncLocust) and (locust_class.task_set is None or issubclass(locust_class.task_set, AsyncTaskSet))
+
+
+class AsyncLocustRunner(LocustRunner):
+    """
+    Runs :py:class:`AsyncLocust` users as tasks on an asyncio event loop. Hatching, killing
+    and stopping are coroutines, but work like they do in the gevent based runners, and the
+    same events are fired and the same stats are kept.
+    """
+    def __init__(self, locust_classes, options):
+        super(AsyncLocustRunner, self).__init__(locust_classes, options)
+        if self.arrival_rate:
+            logger.warning("The asyncio backend doesn't support --arrival-rate, the locusts will use their wait times instead")
+            self.arrival_rate = None
+        # the asyncio task of each live locust, and the locust instance that it runs
+        self.locust_tasks = {}
+        self.hatching_task = None
+
+    @property
+    def user_count(self):
+        return len(self.locust_tasks)
+
+    def spawn_locust(self, locust):
+        instance = locust()
+        task = asyncio.ensure_future(instance.run())
+        self.locust_tasks[task] = instance
+        live = self.live_locusts.setdefault(locust, set())
+        live.add(task)
+
+        def on_done(task):
+            live.discard(task)
+            self.locust_tasks.pop(task, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error("%s locust died" % locust.__name__, exc_info=task.exception())
+        task.add_done_callback(on_done)
+        return task
+
+    async def spawn_locusts(self, spawn_count=None, stop_timeout=None):
+        if spawn_count is None:
+            spawn_count = self.num_clients
+
+        if self.num_requests is not None:
+            self.stats.max_requests = self.num_requests
+
+        bucket = self.weight_locusts(spawn_count, stop_timeout)
+        spawn_count = len(bucket)
+        if self.state == STATE_INIT or self.state == STATE_STOPPED:
+            self.state = STATE_HATCHING
+            self.num_clients = spawn_count
+        else:
+            self.num_clients += spawn_count
+
+        logger.info("Hatching and swarming %i clients at the rate %g clients/s..." % (spawn_count, self.hatch_rate))
+        occurence_count = dict([(l.__name__, 0) for l in self.locust_classes])
+
+        random.shuffle(bucket)
+        total = len(bucket)
+        spawned = 0
+        start = time()
+        while bucket:
+            # spawn all the locusts that are due by now according to the wall clock
+            due = min(int((time() - start) * self.hatch_rate) + 1, total)
+            while spawned < due:
+                locust = bucket.pop()
+                occurence_count[locust.__name__] += 1
+                self.spawn_locust(locust)
+                spawned += 1
+            if bucket:
+                await asyncio.sleep(max(start + float(spawned) / self.hatch_rate - time(), HATCH_MIN_INTERVAL))
+
+        elapsed = time() - start
+        if spawned > 1 and elapsed > 0:
+            self.achieved_hatch_rate = (spawned - 1) / elapsed
+        else:
+            self.achieved_hatch_rate = float(self.hatch_rate)
+        logger.info("All locusts hatched: %s" % ", ".join(["%s: %d" % (name, count) for name, count in six.iteritems(occurence_count)]))
+        logger.info("Achieved hatch rate: %.2f clients/s (requested: %g clients/s)" % (self.achieved_hatch_rate, self.hatch_rate))
+        events.hatch_complete.fire(user_count=self.num_clients)
+
+    async def kill_locusts(self, kill_count, graceful=None):
+        """
+        Kill a kill_count of weighted locusts. See
+        :py:meth:`LocustRunner.kill_locusts() <locust.runners.LocustRunner.kill_locusts>`.
+        """
+        if graceful is None:
+            graceful = self.graceful_scale_down
+        bucket = self.weight_locusts(kill_count)
+        kill_count = len(bucket)
+        self.num_clients -= kill_count
+        logger.info("Killing %i locusts" % kill_count)
+        dying = []
+        for locust in bucket:
+            live = self.live_locusts.get(locust)
+            if not live:
+                continue
+            task = live.pop()
+            instance = self.locust_tasks.get(task)
+            if graceful and instance is not None and not instance._waiting:
+                # the locust is executing a task, and will exit before it starts the next one
+                instance._stopping = True
+            else:
+                task.cancel()
+                dying.append(task)
+        if dying:
+            await asyncio.wait(dying)
+        events.hatch_complete.fire(user_count=self.num_clients)
+
+    async def start_hatching(self, locust_count=None, hatch_rate=None):
+        if self.state != STATE_RUNNING and self.state != STATE_HATCHING:
+            self.stats.clear_all()
+            self.stats.start_time = time()
+            self.exceptions = {}
+            events.locust_start_hatching.fire()
+
+        # Dynamically changing the locust count
+        if self.state != STATE_INIT and self.state != STATE_STOPPED:
+            self.state = STATE_HATCHING
+            if self.num_clients > locust_count:
+                await self.kill_locusts(self.num_clients - locust_count)
+            elif self.num_clients < locust_count:
+                if hatch_rate:
+                    self.hatch_rate = hatch_rate
+                await self.spawn_locusts(spawn_count=locust_count - self.num_clients)
+            else:
+                events.hatch_complete.fire(user_count=self.num_clients)
+        else:
+            if hatch_rate:
+                self.hatch_rate = hatch_rate
+            await self.spawn_locusts(locust_count)
+
+    async def stop(self):
+        # if we are currently hatching locusts we need to stop hatching first
+        if self.hatching_task is not None and not self.hatching_task.done() and self.hatching_task is not _current_task():
+            self.hatching_task.cancel()
+            await asyncio.wait([self.hatching_task])
+        tasks = list(self.locust_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+        self.state = STATE_STOPPED
+        events.locust_stop_hatching.fire()
+
+
+def _current_task():
+    if hasattr(asyncio, "current_task"):
+        return asyncio.current_task()
+    return asyncio.Task.current_task()
+
+
+class AsyncSlaveLocustRunner(AsyncLocustRunner):
+    """
+    Slave node that runs :py:class:`AsyncLocust` users on an asyncio event loop, and talks to
+    the master with an asyncio RPC client. To the master it looks just like any other slave.
+    """
+    def __init__(self, locust_classes, options):
+        super(AsyncSlaveLocustRunner, self).__init__(locust_classes, options)
+        self.master_host = options.master_host
+        self.master_port = options.master_port
+        self.stats_encoding = options.stats_encoding
+        self.cores = min(multiprocessing.cpu_count() / float(get_process_count(options.processes)), 1.0)
+        self.client_id = socket.gethostname() + "_" + md5(str(time() + random.randint(0,10000)).encode("utf-8")).hexdigest()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # messages are sent by a single task, so that they can be sent from event listeners
+        self.outbox = asyncio.Queue()
+        self.client = self.create_client()
+
+        if self.stats_encoding == "columnar":
+            if COLUMNAR_STATS_SUPPORTED:
+                stats.report_encoder = stats.ColumnarReportEncoder()
+            else:
+                logger.warning("The columnar stats encoding isn't supported on this Python version, falling back to the delta encoding")
+
+        # register listener for when all locust users have hatched, and report it to the master node
+        def on_hatch_complete(user_count):
+            self.send(Message("hatch_complete", {"count":user_count, "hatch_rate":self.achieved_hatch_rate}, self.client_id))
+        events.hatch_complete += on_hatch_complete
+
+        # register listener that adds the current number of spawned locusts to the report that is sent to the master node
+        def on_report_to_master(client_id, data):
+            data["user_count"] = self.user_count
+            data["loop_lag"] = self.loop_lag
+            data["cpu_usage"] = self.loop_monitor.cpu_usage
+        events.report_to_master += on_report_to_master
+
+        # register listener thats sends locust exceptions to master
+        def on_locust_error(locust_instance, exception, tb):
+            formatted_tb = "".join(traceback.format_tb(tb))
+            self.send(Message("exception", {"msg" : str(exception), "traceback" : formatted_tb}, self.client_id))
+        events.locust_error += on_locust_error
+
+    def create_client(self):
+        return asynciorpc.Client(self.master_host, self.master_port, identity=self.client_id)
+
+    def send(self, msg):
+        self.outbox.put_nowait(msg)
+
+    async def sender(self):
+        while True:
+            msg = await self.outbox.get()
+            await self.client.send(msg)
+
+    async def worker(self):
+        while True:
+            msg = await self.client.recv()
+            if msg.type == "hatch":
+                self.send(Message("hatching", None, self.client_id))
+                job = msg.data
+                self.hatch_rate = job["hatch_rate"]
+                self.num_requests = job["num_requests"]
+                self.host = job["host"]
+                self.graceful_scale_down = job.get("graceful_scale_down", False)
+                self.rebalancing = job.get("rebalance", False)
+                self.hatching_task = asyncio.ensure_future(self.start_hatching(job["num_clients"], job["hatch_rate"]))
+            elif msg.type == "stop":
+                await self.stop()
+                self.send(Message("client_stopped", None, self.client_id))
+                self.send(Message("client_ready", None, self.client_id))
+            elif msg.type == "quit":
+                logger.info("Got quit message from master, shutting down...")
+                return
+
+    async def stats_reporter(self):
+        while True:
+            data = {}
+            events.report_to_master.fire(client_id=self.client_id, data=data)
+            self.send(Message("stats", data, self.client_id))
+            await asyncio.sleep(SLAVE_REPORT_INTERVAL)
+
+    async def heartbeat_sender(self):
+        """ Let the master know that this node is alive, and how loaded it is """
+        usage = ResourceUsage()
+        while True:
+            cpu_usage, memory_usage = usage.sample()
+            self.send(Message("heartbeat", {"state": self.state, "cpu_usage": cpu_usage, "memory_usage": memory_usage, "cores": self.cores}, self.client_id))
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def monitor_loop(self):
+        """ asyncio version of :py:meth:`LoopMonitor.run() <locust.monitor.LoopMonitor.run>` """
+        interval = self.loop_monitor.interval
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(interval)
+            self.loop_monitor.record(self.loop.time() - start - interval)
+
+    async def run(self):
+        """
+        Connect to the master, and run the jobs that it sends until it tells this node to quit
+        """
+        await self.client.connect()
+        self.send(Message("client_ready", None, self.client_id))
+        tasks = [asyncio.ensure_future(coro) for coro in (self.sender(), self.stats_reporter(), self.heartbeat_sender(), self.monitor_loop())]
+        worker = asyncio.ensure_future(self.worker())
+        try:
+            done, _ = await asyncio.wait([worker] + tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logger.error("Connection lost to master server: %r" % task.exception())
+        finally:
+            worker.cancel()
+            await self.stop()
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait([worker] + tasks)
+            try:
+                await self.client.send(Message("quit", None, self.client_id))
+            except Exception:
+                pass
+
+    def run_until_quit(self):
+        """
+        Run the event loop until the master tells this node to quit, or SIGTERM is received
+        """
+        main = asyncio.ensure_future(self.run())
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, main.cancel)
+        except NotImplementedError:
+            # signal handlers aren't supported on Windows
+            pass
+        try:
+            self.loop.run_until_complete(main)
+        except asyncio.CancelledError:
+            logger.info("Got SIGTERM signal")
+        finally:
+            self.client.close()
@@ -0,0 +1,99 @@
+import random
+from time import time
+
+from . import timerwheel
+
+ARRIVAL_DISTRIBUTIONS = ("fixed", "poisson")
+"""
+How the start times of the tasks are spread out. With *fixed*, tasks are started at exactly
+1/rate seconds apart. With *poisson*, the time between two tasks is exponentially distributed
+with a mean of 1/rate seconds, which is how independent users arrive in the real world.
+"""
+
+MAX_ARRIVAL_BACKLOG = 1.0
+"""
+Number of seconds worth of task starts that are saved up when no locust user is free to
+start a task at its scheduled time. Task starts that are further behind than this are dropped,
+so that the locusts don't run a burst of tasks to catch up once they're free again.
+"""
+
+
+class ArrivalScheduler(object):
+    """
+    Shared token bucket that paces the start of tasks at a constant arrival rate (an open
+    workload model), instead of each locust user waiting between *min_wait* and *max_wait*
+    milliseconds after a task has finished (a closed workload model).
+
+    Each call to :py:meth:`wait() <locust.arrival.ArrivalScheduler.wait>` takes the next
+    scheduled start time, and sleeps until it. When all locust users are busy, the tasks are
+    started late, and the difference between the scheduled and the actual start time is
+    recorded as the schedule lag. A lag that keeps growing means that there aren't enough
+    locust users to keep up with the arrival rate.
+    """
+
+    def __init__(self, rate, distribution="fixed", max_backlog=MAX_ARRIVAL_BACKLOG):
+        if rate <= 0:
+            raise ValueError("Invalid arrival rate: %r. Should be larger than 0" % (rate,))
+        if distribution not in ARRIVAL_DISTRIBUTIONS:
+            raise ValueError("Invalid arrival distribution: %r. Should be one of: %s" % (distribution, ", ".join(ARRIVAL_DISTRIBUTIONS)))
+        self.rate = rate
+        self.distribution = distribution
+        self.max_backlog = max_backlog
+        self.reset()
+
+    def reset(self):
+        self.next_arrival = time()
+        self.waiting = 0
+        self.num_arrivals = 0
+        self.num_dropped = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+    def interval(self):
+        """
+        Return the number of seconds until the next task should be started
+        """
+        if self.distribution == "poisson":
+            return random.expovariate(self.rate)
+        return 1.0 / self.rate
+
+    def wait(self):
+        """
+        Sleep until the next scheduled task start, and return the schedule lag in seconds
+        """
+        now = time()
+        scheduled = self.next_arrival
+        if now - scheduled > self.max_backlog:
+            # drop the task starts that we're too far behind on
+            self.num_dropped += int((now - scheduled - self.max_backlog) * self.rate)
+            scheduled = now - self.max_backlog
+        self.next_arrival = scheduled + self.interval()
+
+        if scheduled > now:
+            self.waiting += 1
+            try:
+                timerwheel.sleep(scheduled - now)
+            finally:
+                self.waiting -= 1
+            now = time()
+
+        lag = max(now - scheduled, 0.0)
+        self.num_arrivals += 1
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        return lag
+
+    @property
+    def avg_lag(self):
+        if not self.num_arrivals:
+            return 0.0
+        return self.total_lag / self.num_arrivals
+
+    def pop_lag(self):
+        """
+        Return the maximum schedule lag since the last call, and start measuring it anew
+        """
+        lag = self.max_lag
+        self.max_lag = 0.0
+        return lag
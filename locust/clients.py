@@ -133,18 +133,18 @@ class HttpSession(requests.Session):
             try:
                 response.raise_for_status()
             except RequestException as e:
-                events.request_failure.fire(
-                    request_type=request_meta["method"], 
-                    name=request_meta["name"], 
-                    response_time=request_meta["response_time"], 
-                    exception=e, 
+                events.request_failure.fire_fast(
+                    request_meta["method"],
+                    request_meta["name"],
+                    request_meta["response_time"],
+                    e,
                 )
             else:
-                events.request_success.fire(
-                    request_type=request_meta["method"],
-                    name=request_meta["name"],
-                    response_time=request_meta["response_time"],
-                    response_length=request_meta["content_size"],
+                events.request_success.fire_fast(
+                    request_meta["method"],
+                    request_meta["name"],
+                    request_meta["response_time"],
+                    request_meta["content_size"],
                 )
             return response
     
@@ -215,11 +215,11 @@ class ResponseContextManager(LocustResponse):
                 if response.status_code == 404:
                     response.success()
         """
-        events.request_success.fire(
-            request_type=self.locust_request_meta["method"],
-            name=self.locust_request_meta["name"],
-            response_time=self.locust_request_meta["response_time"],
-            response_length=self.locust_request_meta["content_size"],
+        events.request_success.fire_fast(
+            self.locust_request_meta["method"],
+            self.locust_request_meta["name"],
+            self.locust_request_meta["response_time"],
+            self.locust_request_meta["content_size"],
         )
         self._is_reported = True
     
@@ -239,10 +239,10 @@ class ResponseContextManager(LocustResponse):
         if isinstance(exc, six.string_types):
             exc = CatchResponseError(exc)
         
-        events.request_failure.fire(
-            request_type=self.locust_request_meta["method"],
-            name=self.locust_request_meta["name"],
-            response_time=self.locust_request_meta["response_time"],
-            exception=exc,
+        events.request_failure.fire_fast(
+            self.locust_request_meta["method"],
+            self.locust_request_meta["name"],
+            self.locust_request_meta["response_time"],
+            exc,
         )
         self._is_reported = True
@@ -1,19 +1,28 @@
+import os
+
 import gevent
 from gevent import monkey, GreenletExit
 import six
 from six.moves import xrange
 
-monkey.patch_all(thread=False)
+# the monkey patching can be turned off with LOCUST_NO_MONKEY_PATCH=1, for the asyncio backend 
+# (see locust.aio), since asyncio client libraries don't work with gevent's patched modules
+MONKEY_PATCHED = not os.environ.get("LOCUST_NO_MONKEY_PATCH")
+if MONKEY_PATCHED:
+    monkey.patch_all(thread=False)
 
 from time import time
 import sys
 import random
 import warnings
+from copy import copy
+from bisect import bisect_right
+from collections import deque
 import traceback
 import logging
 
 from .clients import HttpSession
-from . import events
+from . import events, timerwheel
 
 from .exception import LocustError, InterruptTaskSet, RescheduleTask, RescheduleTaskImmediately, StopLocust
 
@@ -84,6 +93,13 @@ class Locust(object):
     max_wait = 1000
     """Maximum waiting time between the execution of locust tasks"""
     
+    pacing = None
+    """
+    Number of milliseconds between the start of each task. If set, the time that a task took 
+    to execute is subtracted from the wait, so that the locust keeps a constant throughput 
+    no matter how long the tasks take. min_wait and max_wait are then ignored.
+    """
+    
     task_set = None
     """TaskSet class that defines the execution behaviour of this locust"""
     
@@ -92,15 +108,28 @@ class Locust(object):
 
     weight = 10
     """Probability of locust being chosen. The higher the weight, the greater is the chance of it being chosen."""
+    
+    arrival_scheduler = None
+    """
+    :py:class:`ArrivalScheduler <locust.arrival.ArrivalScheduler>` that paces the start of 
+    the tasks, instead of min_wait and max_wait. Set by the runner when Locust is run with 
+    the --arrival-rate option.
+    """
         
     client = NoClientWarningRaiser()
     _catch_exceptions = True
+    # set by the runner to make the locust exit once its current task is done
+    _stopping = False
+    # whether the locust is waiting between tasks (rather than executing one)
+    _waiting = False
     
     def __init__(self):
         super(Locust, self).__init__()
     
     def run(self):
         try:
+            if self.arrival_scheduler is not None:
+                self.arrival_scheduler.wait()
             self.task_set(self).run()
         except StopLocust:
             pass
@@ -133,37 +162,156 @@ class HttpLocust(Locust):
         self.client = HttpSession(base_url=self.host)
 
 
+class WeightedTaskTable(object):
+    """
+    Cumulative weight table that tasks are picked from, built once for each TaskSet class.
+    
+    Each task is only stored once no matter how large its weight is, weights can be floats, 
+    and picking a task is a binary search over the cumulative weights, i.e. O(log n) in the 
+    number of distinct tasks.
+    """
+    
+    def __init__(self, weighted_tasks=()):
+        self.tasks = []
+        self.weights = []
+        index = {}
+        for task, weight in weighted_tasks:
+            if weight <= 0:
+                continue
+            if task in index:
+                self.weights[index[task]] += weight
+            else:
+                index[task] = len(self.tasks)
+                self.tasks.append(task)
+                self.weights.append(weight)
+        self.cumulative_weights = []
+        self.total_weight = 0
+        for weight in self.weights:
+            self.total_weight += weight
+            self.cumulative_weights.append(self.total_weight)
+        # the tasks list that the table was built for, and a copy of its content, see is_stale()
+        self.source = None
+        self.source_content = None
+    
+    @classmethod
+    def from_tasks(cls, tasks):
+        """
+        Build a table from a list of tasks (each with a weight of 1), a list of (task, weight) 
+        two-tuples, a {task: weight} dict, or a mix of tasks and two-tuples
+        """
+        if isinstance(tasks, dict):
+            tasks = six.iteritems(tasks)
+        return cls((task if isinstance(task, tuple) else (task, 1)) for task in tasks)
+    
+    def track(self, tasks):
+        """
+        Record that this table was built for the *tasks* list, and return the table
+        """
+        self.source = tasks
+        self.source_content = copy(tasks)
+        return self
+    
+    def is_stale(self, tasks):
+        """
+        Return True if the table wasn't built for the *tasks* list, or if the list has been 
+        changed since
+        """
+        return tasks is not self.source or tasks != self.source_content
+    
+    def rebuild(self, tasks):
+        """
+        Return a new table for *tasks*, which has been changed since this table was built. The 
+        tasks that were already in this table keep their weights, and tasks that have been 
+        added get a weight of 1.
+        """
+        if isinstance(tasks, dict):
+            return WeightedTaskTable.from_tasks(tasks).track(tasks)
+        weights = dict(self.items())
+        weighted_tasks = []
+        for task in tasks:
+            if isinstance(task, tuple):
+                weighted_tasks.append(task)
+            else:
+                # a task that appears more than once only keeps its weight once
+                weighted_tasks.append((task, weights.pop(task, 1)))
+        return WeightedTaskTable(weighted_tasks).track(tasks)
+    
+    def extend(self, other):
+        """
+        Return a new table with the tasks of this table followed by the tasks of *other*
+        """
+        return WeightedTaskTable(list(self.items()) + list(other.items()))
+    
+    def items(self):
+        """
+        Return a list of (task, weight) two-tuples
+        """
+        return list(zip(self.tasks, self.weights))
+    
+    def ratios(self):
+        """
+        Return a list of (task, ratio) two-tuples, where the ratios add up to 1.0
+        """
+        return [(task, float(weight) / self.total_weight) for task, weight in self.items()]
+    
+    def choose(self):
+        """
+        Pick a random task according to the weights
+        """
+        if not self.tasks:
+            raise LocustError("Can't pick a task from a TaskSet without any tasks")
+        i = bisect_right(self.cumulative_weights, random.random() * self.total_weight)
+        # guard against random() * total_weight being rounded up to total_weight
+        return self.tasks[min(i, len(self.tasks) - 1)]
+    
+    def __len__(self):
+        return len(self.tasks)
+    
+    def __iter__(self):
+        return iter(self.tasks)
+
+
+class ScheduledTask(object):
+    """
+    Entry in a TaskSet's task execution queue
+    """
+    __slots__ = ("callable", "args", "kwargs")
+    
+    def __init__(self, callable, args, kwargs):
+        self.callable = callable
+        self.args = args
+        self.kwargs = kwargs
+
+_NO_ARGS = ()
+_NO_KWARGS = {}
+
+
 class TaskSetMeta(type):
     """
     Meta class for the main Locust class. It's used to allow Locust classes to specify task execution 
-    ratio using an {task:int} dict, or a [(task0,int), ..., (taskN,int)] list.
+    ratio using an {task:weight} dict, or a [(task0,weight), ..., (taskN,weight)] list.
+    
+    The tasks and their weights are collected in a :py:class:`WeightedTaskTable` that is stored 
+    in the *task_table* attribute of the class, while *tasks* is set to a list with each of the 
+    tasks once.
     """
     
     def __new__(mcs, classname, bases, classDict):
-        new_tasks = []
+        table = WeightedTaskTable()
         for base in bases:
-            if hasattr(base, "tasks") and base.tasks:
-                new_tasks += base.tasks
+            if getattr(base, "task_table", None):
+                table = table.extend(base.task_table)
         
         if "tasks" in classDict and classDict["tasks"] is not None:
-            tasks = classDict["tasks"]
-            if isinstance(tasks, dict):
-                tasks = six.iteritems(tasks)
-            
-            for task in tasks:
-                if isinstance(task, tuple):
-                    task, count = task
-                    for i in xrange(0, count):
-                        new_tasks.append(task)
-                else:
-                    new_tasks.append(task)
+            table = table.extend(WeightedTaskTable.from_tasks(classDict["tasks"]))
         
         for item in six.itervalues(classDict):
             if hasattr(item, "locust_task_weight"):
-                for i in xrange(0, item.locust_task_weight):
-                    new_tasks.append(item)
+                table = table.extend(WeightedTaskTable([(item, item.locust_task_weight)]))
         
-        classDict["tasks"] = new_tasks
+        # tasks is a copy, so that changes to it can be told apart from the table
+        classDict["tasks"] = list(table.tasks)
+        classDict["task_table"] = table.track(classDict["tasks"])
         
         return type.__new__(mcs, classname, bases, classDict)
 
@@ -199,6 +347,14 @@ class TaskSet(object):
 
         class ForumPage(TaskSet):
             tasks = {ThreadPage:15, write_post:1}
+    
+    Weights can also be floats. When the class is created, *tasks* is replaced with a list 
+    that holds each task once, and the weights are kept in *task_table*.
+    """
+    
+    task_table = WeightedTaskTable()
+    """
+    :py:class:`WeightedTaskTable` with the tasks and their weights, that tasks are picked from
     """
     
     min_wait = None
@@ -215,6 +371,13 @@ class TaskSet(object):
     TaskSet.
     """
     
+    pacing = None
+    """
+    Number of milliseconds between the start of each task, instead of waiting between 
+    min_wait and max_wait after it. Can be used to override the pacing defined in the root 
+    Locust class, which will be used if not set on the TaskSet.
+    """
+    
     locust = None
     """Will refer to the root Locust class instance when the TaskSet has been instantiated"""
 
@@ -225,8 +388,9 @@ class TaskSet(object):
     """
 
     def __init__(self, parent):
-        self._task_queue = []
+        self._task_queue = deque()
         self._time_start = time()
+        self._task_start = self._time_start
         
         if isinstance(parent, TaskSet):
             self.locust = parent.locust
@@ -242,6 +406,8 @@ class TaskSet(object):
             self.min_wait = self.locust.min_wait
         if not self.max_wait:
             self.max_wait = self.locust.max_wait
+        if not self.pacing:
+            self.pacing = self.locust.pacing
 
     def run(self, *args, **kwargs):
         self.args = args
@@ -260,10 +426,13 @@ class TaskSet(object):
             try:
                 if self.locust.stop_timeout is not None and time() - self._time_start > self.locust.stop_timeout:
                     return
+                if self.locust._stopping:
+                    raise StopLocust()
         
                 if not self._task_queue:
                     self.schedule_task(self.get_next_task())
                 
+                self._task_start = time()
                 try:
                     self.execute_next_task()
                 except RescheduleTaskImmediately:
@@ -290,8 +459,8 @@ class TaskSet(object):
                     raise
     
     def execute_next_task(self):
-        task = self._task_queue.pop(0)
-        self.execute_task(task["callable"], *task["args"], **task["kwargs"])
+        task = self._task_queue.popleft()
+        self.execute_task(task.callable, *task.args, **task.kwargs)
     
     def execute_task(self, task, *args, **kwargs):
         # check if the function is a method bound to the current locust, and if so, don't pass self as first argument
@@ -316,22 +485,45 @@ class TaskSet(object):
         * kwargs: Dict of keyword arguments that will be passed to the task callable.
         * first: Optional keyword argument. If True, the task will be put first in the queue.
         """
-        task = {"callable":task_callable, "args":args or [], "kwargs":kwargs or {}}
+        # tasks without arguments share the same (never modified) empty args and kwargs
+        task = ScheduledTask(task_callable, args or _NO_ARGS, kwargs or _NO_KWARGS)
         if first:
-            self._task_queue.insert(0, task)
+            self._task_queue.appendleft(task)
         else:
             self._task_queue.append(task)
     
     def get_next_task(self):
-        return random.choice(self.tasks)
+        table = self.task_table
+        if table.is_stale(self.tasks):
+            # the tasks have been changed after the class was created, so rebuild the table. 
+            # It's stored where the tasks are, so that other instances can use it as well
+            table = table.rebuild(self.tasks)
+            if "tasks" in self.__dict__:
+                self.task_table = table
+            else:
+                type(self).task_table = table
+        return table.choose()
     
     def wait(self):
-        millis = random.randint(self.min_wait, self.max_wait)
-        seconds = millis / 1000.0
-        self._sleep(seconds)
+        locust = self.locust
+        if locust._stopping:
+            raise StopLocust()
+        locust._waiting = True
+        try:
+            if locust.arrival_scheduler is not None:
+                # the time until the next task is decided by the arrival rate
+                locust.arrival_scheduler.wait()
+            elif self.pacing:
+                # wait for what's left of the pacing interval, or not at all if the task took longer
+                self._sleep(max(self.pacing / 1000.0 - (time() - self._task_start), 0))
+            else:
+                millis = random.randint(self.min_wait, self.max_wait)
+                self._sleep(millis / 1000.0)
+        finally:
+            locust._waiting = False
 
     def _sleep(self, seconds):
-        gevent.sleep(seconds)
+        timerwheel.sleep(seconds)
     
     def interrupt(self, reschedule=True):
         """
@@ -1,3 +1,26 @@
+from timeit import default_timer
+
+
+class _FastListener(object):
+    """
+    Wraps a listener that should be called with positional arguments. Compares equal to the
+    wrapped function, so that it can be removed from an EventHook just like other listeners.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+    
+    def __eq__(self, other):
+        if isinstance(other, _FastListener):
+            other = other.handler
+        return self.handler == other
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    def __hash__(self):
+        return hash(self.handler)
+
+
 class EventHook(object):
     """
     Simple event class used to provide hooks for different types of events in Locust.
@@ -9,24 +32,146 @@ class EventHook(object):
             print "Event was fired with arguments: %s, %s" % (a, b)
         my_event += on_my_event
         my_event.fire(a="foo", b="bar")
+    
+    Hooks that are given a list of *arg_names* also support "fast" listeners, that are 
+    added with :py:meth:`add_fast_listener`, and are called with the arguments as positional 
+    arguments in that order, which avoids building a keyword argument dict for each call. 
+    Such hooks can also be fired with positional arguments, using :py:meth:`fire_fast`.
     """
 
-    def __init__(self):
+    def __init__(self, arg_names=None):
+        self.arg_names = arg_names
+        self.timings = None
         self._handlers = []
+    
+    @property
+    def _handlers(self):
+        return self._handler_list
+    
+    @_handlers.setter
+    def _handlers(self, handlers):
+        self._handler_list = handlers
+        self._update_dispatch()
+    
+    def _update_dispatch(self):
+        """
+        Precompute the (handler, positional) tuple that the hook is fired with, so that firing 
+        the hook doesn't have to look at the kind of each listener
+        """
+        dispatch = []
+        for handler in self._handler_list:
+            positional = isinstance(handler, _FastListener)
+            if positional:
+                handler = handler.handler
+            if self.timings is not None:
+                handler = self._timed(handler)
+            dispatch.append((handler, positional))
+        self._dispatch = tuple(dispatch)
+        self._has_keyword_listeners = any(not positional for handler, positional in dispatch)
+        self._has_fast_listeners = any(positional for handler, positional in dispatch)
+    
+    def _timed(self, handler):
+        counter = self.timings.setdefault(_handler_name(handler), [0, 0.0])
+        def timed_handler(*args, **kwargs):
+            start = default_timer()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                counter[0] += 1
+                counter[1] += default_timer() - start
+        return timed_handler
+    
+    @property
+    def has_listeners(self):
+        return bool(self._dispatch)
 
     def __iadd__(self, handler):
-        self._handlers.append(handler)
+        self._handlers = self._handler_list + [handler]
         return self
 
     def __isub__(self, handler):
-        self._handlers.remove(handler)
+        handlers = list(self._handler_list)
+        handlers.remove(handler)
+        self._handlers = handlers
         return self
-
+    
+    def add_fast_listener(self, handler):
+        """
+        Add a listener that is called with the arguments of the event as positional arguments, 
+        in the order of the hook's *arg_names*
+        """
+        if self.arg_names is None:
+            raise ValueError("Fast listeners can only be added to event hooks with a list of argument names")
+        self._handlers = self._handler_list + [_FastListener(handler)]
+    
     def fire(self, **kwargs):
-        for handler in self._handlers:
-            handler(**kwargs)
+        if not self._dispatch:
+            return
+        if self._has_fast_listeners:
+            args = tuple([kwargs[name] for name in self.arg_names])
+        for handler, positional in self._dispatch:
+            if positional:
+                handler(*args)
+            else:
+                handler(**kwargs)
+    
+    def fire_fast(self, *args):
+        """
+        Fire the event with the arguments given positionally, in the order of the hook's 
+        *arg_names*
+        """
+        if not self._dispatch:
+            return
+        if self._has_keyword_listeners:
+            kwargs = dict(zip(self.arg_names, args))
+        for handler, positional in self._dispatch:
+            if positional:
+                handler(*args)
+            else:
+                handler(**kwargs)
+    
+    def enable_timing(self):
+        """
+        Start measuring the number of calls to, and the time spent in, each listener. The 
+        results are kept in the *timings* dict, as [calls, seconds] lists keyed by the name 
+        of the listener.
+        """
+        if self.timings is None:
+            self.timings = {}
+            self._update_dispatch()
+    
+    def disable_timing(self):
+        self.timings = None
+        self._update_dispatch()
+
+
+def _handler_name(handler):
+    module = getattr(handler, "__module__", None)
+    name = getattr(handler, "__qualname__", None) or getattr(handler, "__name__", None) or repr(handler)
+    return "%s.%s" % (module, name) if module else name
+
+
+def _event_hooks():
+    return [(name, hook) for name, hook in sorted(globals().items()) if isinstance(hook, EventHook)]
+
+def enable_timing():
+    """
+    Start measuring the time spent in the listeners of all of Locust's event hooks
+    """
+    for name, hook in _event_hooks():
+        hook.enable_timing()
+
+def get_timings():
+    """
+    Return a {hook_name: {listener_name: (calls, seconds)}} dict with the timings of the 
+    listeners of the event hooks that timing has been enabled for
+    """
+    return dict(
+        (name, dict((listener, tuple(counter)) for listener, counter in hook.timings.items()))
+        for name, hook in _event_hooks() if hook.timings is not None
+    )
 
-request_success = EventHook()
+request_success = EventHook(("request_type", "name", "response_time", "response_length"))
 """
 *request_success* is fired when a request is completed successfully.
 
@@ -38,7 +183,7 @@ Listeners should take the following arguments:
 * *response_length*: Content-length of the response
 """
 
-request_failure = EventHook()
+request_failure = EventHook(("request_type", "name", "response_time", "exception"))
 """
 *request_failure* is fired when a request fails
 
@@ -50,7 +195,7 @@ Event is fired with the following arguments:
 * *exception*: Exception instance that was thrown
 """
 
-locust_error = EventHook()
+locust_error = EventHook(("locust_instance", "exception", "tb"))
 """
 *locust_error* is fired when an exception occurs inside the execution of a Locust class.
 
@@ -61,7 +206,7 @@ Event is fired with the following arguments:
 * *tb*: Traceback object (from sys.exc_info()[2])
 """
 
-report_to_master = EventHook()
+report_to_master = EventHook(("client_id", "data"))
 """
 *report_to_master* is used when Locust is running in --slave mode. It can be used to attach
 data to the dicts that are regularly sent to the master. It's fired regularly when a report
@@ -75,7 +220,7 @@ Event is fired with the following arguments:
 * *data*: Data dict that can be modified in order to attach data that should be sent to the master.
 """
 
-slave_report = EventHook()
+slave_report = EventHook(("client_id", "data"))
 """
 *slave_report* is used when Locust is running in --master mode and is fired when the master
 server receives a report from a Locust slave server.
@@ -88,7 +233,7 @@ Event is fired with following arguments:
 * *data*: Data dict with the data from the slave node
 """
 
-hatch_complete = EventHook()
+hatch_complete = EventHook(("user_count",))
 """
 *hatch_complete* is fired when all locust users has been spawned.
 
@@ -97,7 +242,7 @@ Event is fire with the following arguments:
 * *user_count*: Number of users that was hatched
 """
 
-quitting = EventHook()
+quitting = EventHook(())
 """
 *quitting* is fired when the locust process in exiting
 """
@@ -0,0 +1,575 @@
+import re
+import ssl
+import json
+import time
+import zlib
+import socket
+from base64 import b64encode
+
+import six
+from six.moves.urllib.parse import urlparse, urlunparse, urljoin, urlencode
+from requests.structures import CaseInsensitiveDict
+
+from . import events
+from .core import Locust
+from .exception import CatchResponseError, LocustError, ResponseError
+
+absolute_http_url_regexp = re.compile(r"^https?://", re.I)
+
+MAX_REDIRECTS = 5
+"""Maximum number of redirects that are followed for a single request"""
+
+MAX_IDLE_CONNECTIONS = 10
+"""Maximum number of idle keep-alive connections that are kept open for each host"""
+
+
+class FastHttpError(Exception):
+    pass
+
+
+class HTTPStatusError(FastHttpError):
+    """Raised by raise_for_status() for responses with a 4xx or 5xx status code"""
+    pass
+
+
+class ProtocolError(FastHttpError):
+    """Raised when the server sends something that isn't a valid HTTP response"""
+    pass
+
+
+class _Connection(object):
+    """
+    Keep-alive connection to a host, with a buffered file object that the response is
+    parsed from
+    """
+
+    def __init__(self, host, port, use_ssl, timeout):
+        sock = socket.create_connection((host, port), timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if use_ssl:
+            context = ssl.create_default_context()
+            # load tests commonly target hosts with self-signed certificates
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=host)
+        self.sock = sock
+        self.file = sock.makefile("rb")
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+class FastResponse(object):
+    """
+    Response to a request made with a :py:class:`FastHttpSession`
+    """
+
+    status_code = 0
+    """HTTP status code of the response. 0 if the request failed due to a connection error."""
+
+    reason = ""
+    """Status text of the response, e.g. "OK" or "Not Found"."""
+
+    headers = None
+    """Case-insensitive dict with the response headers"""
+
+    content = None
+    """Body of the response, as bytes"""
+
+    url = None
+    """URL of the request that this is the response to (the last one, if redirects were followed)"""
+
+    error = None
+    """The exception that occurred if the request failed"""
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.headers = CaseInsensitiveDict()
+
+    @property
+    def encoding(self):
+        content_type = self.headers.get("content-type", "")
+        match = re.search(r"charset=([\w-]+)", content_type, re.I)
+        return match.group(1) if match else "utf-8"
+
+    @property
+    def text(self):
+        """Body of the response, decoded using the charset in the content-type header"""
+        if self.content is None:
+            return None
+        return self.content.decode(self.encoding, "replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.error:
+            raise self.error
+        if 400 <= self.status_code < 600:
+            raise HTTPStatusError("%i %s for url: %s" % (self.status_code, self.reason, self.url))
+
+
+class FastResponseContextManager(FastResponse):
+    """
+    A FastResponse that also acts as a context manager, that makes it possible to manually
+    control if a request should be marked as successful or as a failure in Locust's statistics.
+    It works just like :py:class:`ResponseContextManager <locust.clients.ResponseContextManager>`.
+    """
+
+    _is_reported = False
+
+    def __init__(self, response):
+        # copy data from response to this object
+        self.__dict__ = response.__dict__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc, value, traceback):
+        if self._is_reported:
+            # if the user has already manually marked this response as failure or success
+            # we can ignore the default haviour of letting the response code determine the outcome
+            return exc is None
+
+        if exc:
+            if isinstance(value, ResponseError):
+                self.failure(value)
+            else:
+                return False
+        else:
+            try:
+                self.raise_for_status()
+            except Exception as e:
+                self.failure(e)
+            else:
+                self.success()
+        return True
+
+    def success(self):
+        """
+        Report the response as successful
+        """
+        events.request_success.fire_fast(
+            self.locust_request_meta["method"],
+            self.locust_request_meta["name"],
+            self.locust_request_meta["response_time"],
+            self.locust_request_meta["content_size"],
+        )
+        self._is_reported = True
+
+    def failure(self, exc):
+        """
+        Report the response as a failure.
+
+        exc can be either a python exception, or a string in which case it will
+        be wrapped inside a CatchResponseError.
+        """
+        if isinstance(exc, six.string_types):
+            exc = CatchResponseError(exc)
+
+        events.request_failure.fire_fast(
+            self.locust_request_meta["method"],
+            self.locust_request_meta["name"],
+            self.locust_request_meta["response_time"],
+            exc,
+        )
+        self._is_reported = True
+
+
+class FastHttpSession(object):
+    """
+    HTTP client that talks to the tested system directly over gevent sockets, instead of
+    going through python-requests and urllib3. It has a lot less overhead per request than
+    :py:class:`HttpSession <locust.clients.HttpSession>`, which makes it possible to
+    generate a lot more load from each core, but only supports the basic features of HTTP/1.1:
+
+    * Keep-alive connections, that are pooled per host
+    * Content-Length, chunked and connection close delimited response bodies, which are
+      decoded if they're gzip or deflate encoded
+    * Session cookies (only their names and values, any attributes are ignored)
+    * Redirects, and basic authentication from the URL or the *auth* argument
+
+    The request methods take the same *name* and *catch_response* arguments as the methods
+    of :py:class:`HttpSession <locust.clients.HttpSession>`, and the requests are reported
+    to Locust's statistics in the same way.
+    """
+
+    connection_timeout = 60.0
+    """Number of seconds to wait for a connection to the host to be established"""
+
+    network_timeout = 60.0
+    """Number of seconds to wait for the host to send data, before the request is failed"""
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        self.headers = {}
+        self.cookies = {}
+        self.auth_header = None
+        self._pool = {}
+
+        parsed_url = urlparse(self.base_url)
+        if parsed_url.username and parsed_url.password:
+            netloc = parsed_url.hostname
+            if parsed_url.port:
+                netloc += ":%d" % parsed_url.port
+            # remove username and password from the base_url
+            self.base_url = urlunparse((parsed_url.scheme, netloc, parsed_url.path, parsed_url.params, parsed_url.query, parsed_url.fragment))
+            self.auth_header = _basic_auth_header(parsed_url.username, parsed_url.password)
+
+        for key, value in six.iteritems(kwargs):
+            setattr(self, key, value)
+
+    def _build_url(self, path):
+        """ prepend url with hostname unless it's already an absolute URL """
+        if absolute_http_url_regexp.match(path):
+            return path
+        else:
+            return "%s%s" % (self.base_url, path)
+
+    def request(self, method, url, name=None, catch_response=False, params=None, data=None, json=None,
+                headers=None, auth=None, allow_redirects=True, **kwargs):
+        """
+        Send an HTTP request, and return a :py:class:`FastResponse`.
+
+        :param method: method of the request, e.g. "GET" or "POST"
+        :param url: URL of the request, or just the path, in which case it's prepended with the base_url of the session
+        :param name: (optional) An argument that can be specified to use as label in Locust's statistics instead of the URL path.
+          This can be used to group different URL's that are requested into a single entry in Locust's statistics.
+        :param catch_response: (optional) Boolean argument that, if set, can be used to make a request return a context manager
+          to work as argument to a with statement. This will allow the request to be marked as a fail based on the content of the
+          response, even if the response code is ok (2xx). The opposite also works, one can use catch_response to catch a request
+          and then mark it as successful even if the response code was not (i.e 500 or 404).
+        :param params: (optional) Dictionary or bytes to be sent in the query string
+        :param data: (optional) Dictionary (sent form encoded), string or bytes to send in the body of the request
+        :param json: (optional) Object that is sent JSON encoded in the body of the request
+        :param headers: (optional) Dictionary of HTTP Headers to send with the request
+        :param auth: (optional) (username, password) tuple for basic authentication
+        :param allow_redirects: (optional) Set to True by default
+        """
+        url = self._build_url(url)
+        if params:
+            url += ("&" if "?" in url else "?") + (params if isinstance(params, six.string_types) else urlencode(params))
+
+        # store meta data that is used when reporting the request to locust's statistics
+        request_meta = {}
+        request_meta["method"] = method
+        request_meta["start_time"] = time.time()
+        request_meta["name"] = name or _path_url(urlparse(url))
+
+        body, headers = self._encode_body(data, json, headers)
+        if auth:
+            headers["Authorization"] = _basic_auth_header(*auth)
+
+        response = self._send_request_safe_mode(method, url, body, headers, allow_redirects)
+
+        # record the consumed time
+        request_meta["response_time"] = int((time.time() - request_meta["start_time"]) * 1000)
+        request_meta["content_size"] = len(response.content or b"")
+
+        if catch_response:
+            response.locust_request_meta = request_meta
+            return FastResponseContextManager(response)
+        else:
+            try:
+                response.raise_for_status()
+            except Exception as e:
+                events.request_failure.fire_fast(
+                    request_meta["method"],
+                    request_meta["name"],
+                    request_meta["response_time"],
+                    e,
+                )
+            else:
+                events.request_success.fire_fast(
+                    request_meta["method"],
+                    request_meta["name"],
+                    request_meta["response_time"],
+                    request_meta["content_size"],
+                )
+            return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, data=None, **kwargs):
+        return self.request("POST", path, data=data, **kwargs)
+
+    def put(self, path, data=None, **kwargs):
+        return self.request("PUT", path, data=data, **kwargs)
+
+    def patch(self, path, data=None, **kwargs):
+        return self.request("PATCH", path, data=data, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def head(self, path, **kwargs):
+        return self.request("HEAD", path, **kwargs)
+
+    def options(self, path, **kwargs):
+        return self.request("OPTIONS", path, **kwargs)
+
+    def _encode_body(self, data, json_data, headers):
+        headers = dict(headers or {})
+        if json_data is not None:
+            data = json.dumps(json_data)
+            headers.setdefault("Content-Type", "application/json")
+        elif isinstance(data, dict):
+            data = urlencode(data)
+            headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+        if isinstance(data, six.text_type):
+            data = data.encode("utf-8")
+        return data, headers
+
+    def _send_request_safe_mode(self, method, url, body, headers, allow_redirects):
+        """
+        Send the request, following any redirects, and catch any exception that might occur
+        due to connection problems.
+        """
+        response = None
+        try:
+            for i in range(MAX_REDIRECTS + 1):
+                response = self._send_request(method, url, body, headers)
+                if not allow_redirects or response.status_code not in (301, 302, 303, 307, 308) or "location" not in response.headers:
+                    return response
+                url = urljoin(url, response.headers["location"])
+                if response.status_code in (301, 302, 303) and method != "HEAD":
+                    method, body = "GET", None
+            raise FastHttpError("Exceeded %i redirects" % MAX_REDIRECTS)
+        except (socket.error, socket.timeout, ssl.SSLError, FastHttpError) as e:
+            response = FastResponse(method, url)
+            response.error = e
+            return response
+
+    def _send_request(self, method, url, body, headers):
+        parsed_url = urlparse(url)
+        if parsed_url.scheme not in ("http", "https"):
+            raise LocustError("Invalid URL scheme for FastHttpSession: %r" % url)
+        use_ssl = parsed_url.scheme == "https"
+        host = parsed_url.hostname
+        port = parsed_url.port or (443 if use_ssl else 80)
+        key = (host, port, use_ssl)
+
+        request_data = self._build_request(method, parsed_url, body, headers)
+        idle = self._pool.setdefault(key, [])
+        while True:
+            # a pooled connection may have been closed by the server since it was last used,
+            # in which case the request is retried on the next one (or on a new connection)
+            reused = bool(idle)
+            conn = idle.pop() if reused else _Connection(host, port, use_ssl, self.connection_timeout)
+            try:
+                conn.settimeout(self.network_timeout)
+                conn.sendall(request_data)
+                response, keep_alive = self._read_response(conn, method, url)
+            except Exception as e:
+                conn.close()
+                if reused and isinstance(e, (socket.error, _ConnectionClosed)):
+                    continue
+                if isinstance(e, _ConnectionClosed):
+                    raise ProtocolError("Connection closed by the server without a response")
+                raise
+
+            if keep_alive and len(idle) < MAX_IDLE_CONNECTIONS:
+                idle.append(conn)
+            else:
+                conn.close()
+            return response
+
+    def _build_request(self, method, parsed_url, body, headers):
+        default_port = 443 if parsed_url.scheme == "https" else 80
+        host_header = parsed_url.hostname
+        if parsed_url.port and parsed_url.port != default_port:
+            host_header += ":%d" % parsed_url.port
+
+        all_headers = CaseInsensitiveDict()
+        all_headers["Host"] = host_header
+        all_headers["User-Agent"] = "locust"
+        all_headers["Accept"] = "*/*"
+        all_headers["Accept-Encoding"] = "gzip, deflate"
+        if self.auth_header:
+            all_headers["Authorization"] = self.auth_header
+        if self.cookies:
+            all_headers["Cookie"] = "; ".join("%s=%s" % item for item in six.iteritems(self.cookies))
+        all_headers.update(self.headers)
+        all_headers.update(headers)
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            all_headers["Content-Length"] = str(len(body or b""))
+
+        lines = ["%s %s HTTP/1.1" % (method, _path_url(parsed_url))]
+        lines.extend("%s: %s" % item for item in six.iteritems(all_headers))
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+        if body:
+            data += body
+        return data
+
+    def _read_response(self, conn, method, url):
+        """
+        Parse a response from *conn*. Returns a (response, keep_alive) two-tuple, where
+        keep_alive tells if the connection can be used for another request.
+        """
+        response = FastResponse(method, url)
+        while True:
+            status_line = conn.file.readline()
+            if not status_line:
+                raise _ConnectionClosed()
+            parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+            if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+                raise ProtocolError("Invalid status line: %r" % status_line)
+            version = parts[0]
+            try:
+                response.status_code = int(parts[1])
+            except ValueError:
+                raise ProtocolError("Invalid status line: %r" % status_line)
+            response.reason = parts[2] if len(parts) > 2 else ""
+            self._read_headers(conn, response)
+            # skip interim responses, e.g. 100 Continue
+            if not 100 <= response.status_code < 200:
+                break
+            response.headers = CaseInsensitiveDict()
+
+        connection = response.headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+
+        if method == "HEAD" or response.status_code in (204, 304):
+            content = b""
+        elif "chunked" in response.headers.get("transfer-encoding", "").lower():
+            content = self._read_chunked(conn)
+        elif "content-length" in response.headers:
+            try:
+                length = int(response.headers["content-length"])
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise ProtocolError("Invalid Content-Length header: %r" % response.headers["content-length"])
+            content = conn.file.read(length)
+            if len(content) < length:
+                raise ProtocolError("Connection closed before the whole response body was received")
+        else:
+            # the body is delimited by the server closing the connection
+            content = conn.file.read()
+            keep_alive = False
+
+        response.content = self._decode_content(content, response.headers.get("content-encoding", "").lower())
+        return response, keep_alive
+
+    def _decode_content(self, content, encoding):
+        try:
+            if encoding == "gzip":
+                return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+            elif encoding == "deflate":
+                try:
+                    return zlib.decompress(content)
+                except zlib.error:
+                    # some servers send raw deflate data without the zlib header
+                    return zlib.decompress(content, -zlib.MAX_WBITS)
+        except zlib.error as e:
+            raise ProtocolError("Failed to decode %s encoded response body: %s" % (encoding, e))
+        return content
+
+    def _read_headers(self, conn, response):
+        while True:
+            line = conn.file.readline()
+            if not line:
+                raise ProtocolError("Connection closed while reading the response headers")
+            line = line.decode("latin-1").rstrip("\r\n")
+            if not line:
+                return
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise ProtocolError("Invalid header line: %r" % line)
+            name, value = name.strip(), value.strip()
+            if name.lower() == "set-cookie":
+                self._store_cookie(value)
+            if name in response.headers:
+                response.headers[name] += ", " + value
+            else:
+                response.headers[name] = value
+
+    def _read_chunked(self, conn):
+        chunks = []
+        while True:
+            line = conn.file.readline()
+            if not line:
+                raise ProtocolError("Connection closed while reading a chunked response body")
+            try:
+                size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                size = -1
+            if size < 0:
+                raise ProtocolError("Invalid chunk size line: %r" % line)
+            if size == 0:
+                # skip any trailers
+                while conn.file.readline().strip():
+                    pass
+                return b"".join(chunks)
+            chunk = conn.file.read(size)
+            if len(chunk) < size:
+                raise ProtocolError("Connection closed while reading a chunked response body")
+            chunks.append(chunk)
+            conn.file.readline()
+
+    def _store_cookie(self, header):
+        cookie, _, attributes = header.partition(";")
+        name, sep, value = cookie.partition("=")
+        if not sep:
+            return
+        name, value = name.strip(), value.strip()
+        if value and "max-age=0" not in attributes.replace(" ", "").lower():
+            self.cookies[name] = value
+        else:
+            self.cookies.pop(name, None)
+
+
+class _ConnectionClosed(Exception):
+    """Raised when a connection is closed before the status line of the response is received"""
+    pass
+
+
+def _path_url(parsed_url):
+    path = parsed_url.path or "/"
+    if parsed_url.query:
+        path += "?" + parsed_url.query
+    return path
+
+
+def _basic_auth_header(username, password):
+    credentials = ("%s:%s" % (username, password)).encode("utf-8")
+    return "Basic " + b64encode(credentials).decode("ascii")
+
+
+class FastHttpLocust(Locust):
+    """
+    Represents an HTTP "user" which is to be hatched and attack the system that is to be load tested.
+
+    The behaviour of this user is defined by the task_set attribute, which should point to a
+    :py:class:`TaskSet <locust.core.TaskSet>` class.
+
+    This class creates a *client* attribute on instantiation, which is a
+    :py:class:`FastHttpSession <locust.fasthttp.FastHttpSession>`. It works just like
+    :py:class:`HttpLocust <locust.core.HttpLocust>`, but is able to generate a lot more load,
+    at the cost of only supporting a subset of the features of HttpSession.
+    """
+
+    client = None
+    """
+    Instance of FastHttpSession that is created upon instantiation of Locust.
+    The client support cookies, and therefore keeps the session between HTTP requests.
+    """
+
+    def __init__(self):
+        super(FastHttpLocust, self).__init__()
+        if self.host is None:
+            raise LocustError("You must specify the base host. Either in the host attribute in the Locust class, or on the command line using the --host option.")
+
+        self.client = FastHttpSession(base_url=self.host)
@@ -0,0 +1,310 @@
+import math
+from array import array
+from operator import add
+
+import six
+from six.moves import xrange
+
+DEFAULT_SIGNIFICANT_DIGITS = 2
+"""
+Number of significant decimal digits that values are recorded with. Two digits means that
+the value reported for a bucket is never more than 1% off from the actual recorded value.
+"""
+
+DEFAULT_HIGHEST_TRACKABLE_VALUE = 3600000
+"""
+Highest value (one hour, in milliseconds) that can be told apart from other values. Larger
+values are recorded in the last bucket.
+"""
+
+
+class HistogramMismatchError(Exception):
+    pass
+
+
+class Histogram(object):
+    """
+    Fixed size, array backed, log-linear histogram (in the style of HdrHistogram) that is
+    used to store the response time distribution for a stats entry.
+
+    Values below *sub_bucket_count* are stored exactly. Above that, each power of two range
+    is split into *sub_bucket_count / 2* linear buckets, which keeps the relative error
+    within the configured number of significant digits. Recording a value is O(1), and
+    calculating percentiles is O(number of buckets) and doesn't require any sorting.
+    """
+
+    def __init__(self, significant_digits=DEFAULT_SIGNIFICANT_DIGITS, highest_trackable_value=DEFAULT_HIGHEST_TRACKABLE_VALUE):
+        self.significant_digits = significant_digits
+        self.highest_trackable_value = highest_trackable_value
+
+        self.sub_bucket_bits = int(math.ceil(math.log(2 * 10 ** significant_digits, 2)))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+        self.bucket_count = self._index_for(highest_trackable_value, clamp=False) + 1
+        self.reset()
+
+    def reset(self):
+        self.counts = array("L", [0]) * self.bucket_count
+        self.total_count = 0
+        # the range of buckets that has been written to, used to avoid scanning empty buckets
+        self.min_index = self.bucket_count
+        self.max_index = -1
+
+    def clear(self):
+        """
+        Zero the buckets that have been written to, without allocating a new bucket array
+        """
+        if self.max_index >= 0:
+            self.counts[self.min_index:self.max_index + 1] = array("L", [0]) * (self.max_index - self.min_index + 1)
+        self.total_count = 0
+        self.min_index = self.bucket_count
+        self.max_index = -1
+
+    def _index_for(self, value, clamp=True):
+        value = int(value)
+        if value < 0:
+            value = 0
+        # math.frexp gives us the bit length of the value (int.bit_length needs python 2.7)
+        shift = max(math.frexp(value)[1] - self.sub_bucket_bits, 0)
+        index = self.sub_bucket_half_count * shift + (value >> shift)
+        if clamp and index >= self.bucket_count:
+            return self.bucket_count - 1
+        return index
+
+    def index_for(self, value):
+        """
+        Return the index of the bucket that *value* is recorded in
+        """
+        return self._index_for(value)
+
+    def value_at_index(self, index):
+        """
+        Return the lowest value that is recorded in the bucket at *index*
+        """
+        if index < self.sub_bucket_count:
+            return index
+        shift = (index - self.sub_bucket_count) // self.sub_bucket_half_count + 1
+        return (index - self.sub_bucket_half_count * shift) << shift
+
+    def record(self, value, count=1):
+        self.add_at_index(self._index_for(value), count)
+
+    def add_at_index(self, index, count):
+        self.counts[index] += count
+        self.total_count += count
+        if index < self.min_index:
+            self.min_index = index
+        if index > self.max_index:
+            self.max_index = index
+
+    def is_compatible_with(self, other):
+        return self.sub_bucket_bits == other.sub_bucket_bits and self.bucket_count == other.bucket_count
+
+    def merge(self, other):
+        """
+        Add all the recorded values of *other* to this histogram. The buckets are added
+        slice-wise, so the cost doesn't depend on the number of recorded values.
+        """
+        if not other.total_count:
+            return
+        if not self.is_compatible_with(other):
+            raise HistogramMismatchError("Can't merge histograms with different bucket layouts")
+        lo, hi = other.min_index, other.max_index + 1
+        self.counts[lo:hi] = array("L", map(add, self.counts[lo:hi], other.counts[lo:hi]))
+        self.total_count += other.total_count
+        self.min_index = min(self.min_index, other.min_index)
+        self.max_index = max(self.max_index, other.max_index)
+
+    def iter_nonzero(self):
+        """
+        Yield (index, count) two-tuples for each bucket that holds any recorded values
+        """
+        counts = self.counts
+        for index in xrange(self.min_index, self.max_index + 1):
+            if counts[index]:
+                yield index, counts[index]
+
+    def get_value_at_percentile(self, percent):
+        """
+        Get the value that a certain number of percent of the recorded values
+        are lower than, or equal to.
+
+        Percent specified in range: 0.0 - 1.0
+        """
+        return self.get_values_at_percentiles([percent])[0]
+
+    def get_values_at_percentiles(self, percents):
+        """
+        Calculate multiple percentiles (in range 0.0 - 1.0) in a single pass over the buckets
+        """
+        if not self.total_count:
+            return [0 for p in percents]
+
+        # walk the buckets from the top, and resolve the highest percentiles first
+        order = sorted(xrange(len(percents)), key=lambda i: percents[i], reverse=True)
+        thresholds = [self.total_count - int(self.total_count * percents[i]) for i in order]
+        result = [0] * len(percents)
+
+        counts = self.counts
+        pos = 0
+        processed_count = 0
+        for index in xrange(self.max_index, self.min_index - 1, -1):
+            count = counts[index]
+            if not count:
+                continue
+            processed_count += count
+            while pos < len(order) and processed_count >= thresholds[pos]:
+                result[order[pos]] = self.value_at_index(index)
+                pos += 1
+            if pos == len(order):
+                break
+        return result
+
+    @property
+    def median(self):
+        if not self.total_count:
+            return 0
+        pos = (self.total_count - 1) / 2.0
+        counts = self.counts
+        for index in xrange(self.min_index, self.max_index + 1):
+            if pos < counts[index]:
+                return self.value_at_index(index)
+            pos -= counts[index]
+
+    def to_dict(self):
+        """
+        Return a {value: count} dict with the lowest value of each non-empty bucket as key
+        """
+        return dict((self.value_at_index(index), count) for index, count in self.iter_nonzero())
+
+    def update(self, values):
+        """
+        Record the values of a {value: count} dict
+        """
+        for value, count in six.iteritems(values):
+            self.record(value, count)
+
+    @classmethod
+    def from_dict(cls, values, **kwargs):
+        obj = cls(**kwargs)
+        obj.update(values)
+        return obj
+
+    def __len__(self):
+        return self.total_count
+
+    def __bool__(self):
+        return self.total_count > 0
+    __nonzero__ = __bool__
+
+
+_scratch_histograms = {}
+"""
+Histograms that the RollingHistogram instances use to calculate percentiles, keyed by their
+(significant_digits, highest_trackable_value) bucket layout
+"""
+
+
+class RollingHistogram(object):
+    """
+    Ring buffer of per-second histograms, used to calculate percentiles for the values
+    recorded during the last *window* seconds.
+
+    Each second only stores the buckets that were actually written to, so an idle or
+    lightly loaded window is cheap to keep around. Calculating a percentile is
+    O(window * buckets used per second).
+    """
+
+    def __init__(self, window, significant_digits=DEFAULT_SIGNIFICANT_DIGITS, highest_trackable_value=DEFAULT_HIGHEST_TRACKABLE_VALUE):
+        self.window = window
+        # used for the bucket layout, and as a scratch area when calculating percentiles. It's
+        # shared by all rolling histograms with the same layout, since it's only used briefly
+        layout = (significant_digits, highest_trackable_value)
+        if layout not in _scratch_histograms:
+            _scratch_histograms[layout] = Histogram(significant_digits, highest_trackable_value)
+        self._histogram = _scratch_histograms[layout]
+        self.reset()
+
+    def reset(self):
+        self.seconds = [None] * self.window
+        self.slots = [None] * self.window
+
+    def _slot(self, second):
+        """
+        Return the {index: count} dict for *second*, or None if the slot for that second
+        already holds newer data
+        """
+        i = second % self.window
+        if self.seconds[i] != second:
+            if self.seconds[i] is not None and self.seconds[i] > second:
+                return None
+            self.seconds[i] = second
+            self.slots[i] = {}
+        return self.slots[i]
+
+    def record(self, value, second, count=1):
+        self.add_at_index(self._histogram.index_for(value), second, count)
+
+    def add_at_index(self, index, second, count):
+        slot = self._slot(second)
+        if slot is None:
+            return
+        slot[index] = slot.get(index, 0) + count
+
+    def iter_seconds(self, now=None):
+        """
+        Yield (second, {index: count}) two-tuples for the seconds that are stored in the
+        ring buffer. If *now* is given, only seconds within the window ending at *now* are
+        included.
+        """
+        for second, slot in zip(self.seconds, self.slots):
+            if second is None:
+                continue
+            if now is not None and not (now - self.window < second <= now):
+                continue
+            yield second, slot
+
+    def merge(self, other):
+        if not self._histogram.is_compatible_with(other._histogram):
+            raise HistogramMismatchError("Can't merge histograms with different bucket layouts")
+        for second, other_slot in other.iter_seconds():
+            slot = self._slot(second)
+            if slot is None:
+                continue
+            for index, count in six.iteritems(other_slot):
+                slot[index] = slot.get(index, 0) + count
+
+    def get_histogram(self, now):
+        """
+        Return a Histogram with all the values recorded during the window ending at *now*.
+
+        The returned histogram is reused between calls, and shared with the other rolling 
+        histograms that have the same bucket layout, so it's only valid until the next call.
+        """
+        histogram = self._histogram
+        histogram.clear()
+        for second, slot in self.iter_seconds(now):
+            for index, count in six.iteritems(slot):
+                histogram.add_at_index(index, count)
+        return histogram
+
+    def get_values_at_percentiles(self, percents, now):
+        return self.get_histogram(now).get_values_at_percentiles(percents)
+
+    def to_dict(self):
+        """
+        Return a {second: {value: count}} dict with the content of the ring buffer
+        """
+        value_at_index = self._histogram.value_at_index
+        return dict(
+            (second, dict((value_at_index(index), count) for index, count in six.iteritems(slot)))
+            for second, slot in self.iter_seconds()
+        )
+
+    def update(self, data):
+        """
+        Record the values of a {second: {value: count}} dict
+        """
+        for second, values in six.iteritems(data):
+            for value, count in six.iteritems(values):
+                self.record(value, second, count)
@@ -1,7 +1,7 @@
 import inspect
 import six
 
-from .core import Locust, TaskSet
+from .core import Locust, TaskSet, WeightedTaskTable
 from .log import console_logger
 
 def print_task_ratio(locusts, total=False, level=0, parent_ratio=1.0):
@@ -20,27 +20,26 @@ def _print_task_ratio(x, level=0):
 def get_task_ratio_dict(tasks, total=False, parent_ratio=1.0):
     """
     Return a dict containing task execution ratio info
+
+    *tasks* is either a list of Locust classes, a TaskSet's *task_table*, or a list of tasks 
+    that are all equally likely to be picked
     """
-    if hasattr(tasks[0], 'weight'):
-        divisor = sum(t.weight for t in tasks)
+    if isinstance(tasks, WeightedTaskTable):
+        table = tasks
+    elif hasattr(tasks[0], 'weight'):
+        table = WeightedTaskTable((t, t.weight) for t in tasks)
     else:
-        divisor = len(tasks) / parent_ratio
-    ratio = {}
-    for task in tasks:
-        ratio.setdefault(task, 0)
-        ratio[task] += task.weight if hasattr(task, 'weight') else 1
-
-    # get percentage
-    ratio_percent = dict((k, float(v) / divisor) for k, v in six.iteritems(ratio))
+        table = WeightedTaskTable.from_tasks(tasks)
 
     task_dict = {}
-    for locust, ratio in six.iteritems(ratio_percent):
+    for locust, ratio in table.ratios():
+        ratio *= parent_ratio
         d = {"ratio":ratio}
         if inspect.isclass(locust):
             if issubclass(locust, Locust):
-                T = locust.task_set.tasks
+                T = locust.task_set.task_table
             elif issubclass(locust, TaskSet):
-                T = locust.tasks
+                T = locust.task_table
             if total:
                 d["tasks"] = get_task_ratio_dict(T, total, ratio)
             else:
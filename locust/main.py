@@ -1,5 +1,5 @@
 import locust
-from . import runners
+from . import runners, core
 
 import gevent
 import sys
@@ -12,10 +12,15 @@ from optparse import OptionParser
 
 from . import web
 from .log import setup_logging, console_logger
-from .stats import stats_printer, print_percentile_stats, print_error_report, print_stats
+from .stats import stats_printer, print_percentile_stats, print_error_report, print_stats, enable_request_buffer
 from .inspectlocust import print_task_ratio, get_task_ratio_dict
 from .core import Locust, HttpLocust
-from .runners import MasterLocustRunner, SlaveLocustRunner, LocalLocustRunner
+from .runners import MasterLocustRunner, SlaveLocustRunner, LocalLocustRunner, RelayLocustRunner, ParallelLocalLocustRunner, LocalWorkerLocustRunner
+from .sharedstats import SharedReportArea
+from .arrival import ARRIVAL_DISTRIBUTIONS
+from .shape import LoadShape, parse_load_shape
+from .timerwheel import enable_timer_wheel
+from .processes import ProcessSupervisor, fork_workers, get_process_count
 from . import events
 
 _internals = [Locust, HttpLocust]
@@ -77,6 +82,15 @@ def parse_options():
         default=False,
         help="Set locust to run in distributed mode with this process as slave"
     )
+
+    # if locust should be run in distributed mode as relay between the master and a group of slaves
+    parser.add_option(
+        '--relay',
+        action='store_true',
+        dest='relay',
+        default=False,
+        help="Set locust to run in distributed mode with this process as relay. The relay connects to the master like a slave (see --master-host and --master-port), accepts slaves like a master (see --master-bind-host and --master-bind-port), and sends one combined stats report for all its slaves to the master."
+    )
     
     # master host options
     parser.add_option(
@@ -115,6 +129,25 @@ def parse_options():
         help="Port that locust master should bind to. Only used when running with --master. Defaults to 5557. Note that Locust will also use this port + 1, so by default the master node will bind to 5557 and 5558."
     )
 
+    parser.add_option(
+        '--processes',
+        action='store',
+        type='str',
+        dest='processes',
+        default='1',
+        help="Number of processes to run locust users in on this machine, or 'auto' to start one per CPU core. With --slave, each process connects to the master as a separate slave node, and is restarted if it crashes. Without --master or --slave, the processes report their stats to this process, which aggregates them just like a master node would. Defaults to 1."
+    )
+
+    parser.add_option(
+        '--stats-encoding',
+        action='store',
+        type='choice',
+        choices=['delta', 'columnar'],
+        dest='stats_encoding',
+        default='delta',
+        help="Format of the stats reports that are sent to the master: 'delta' or 'columnar'. The columnar format is more compact and faster for the master to process, but requires Python 3. Only used when running with --slave. Defaults to delta."
+    )
+
     # if we should print stats in the console
     parser.add_option(
         '--no-web',
@@ -144,6 +177,54 @@ def parse_options():
         help="The rate per second in which clients are spawned. Only used together with --no-web"
     )
     
+    # Task arrival rate
+    parser.add_option(
+        '--arrival-rate',
+        action='store',
+        type='float',
+        dest='arrival_rate',
+        default=None,
+        help="Start tasks at a constant rate per second (in total, for all clients), instead of letting each client wait between min_wait and max_wait after each task. More clients are added when the ones running can't keep up with the rate."
+    )
+    
+    parser.add_option(
+        '--arrival-distribution',
+        action='store',
+        type='choice',
+        choices=ARRIVAL_DISTRIBUTIONS,
+        dest='arrival_distribution',
+        default='fixed',
+        help="How the task start times are spread out when running with --arrival-rate. Either 'fixed' (evenly spaced) or 'poisson' (exponentially distributed, like independent users arriving). Default is fixed."
+    )
+    
+    parser.add_option(
+        '--max-clients',
+        action='store',
+        type='int',
+        dest='max_clients',
+        default=None,
+        help="Maximum number of clients that may be added to keep up with the --arrival-rate. Default is no limit."
+    )
+    
+    # let locusts finish their current task when the number of clients is lowered
+    parser.add_option(
+        '--graceful-scale-down',
+        action='store_true',
+        dest='graceful_scale_down',
+        default=False,
+        help="When the number of clients is lowered, let the clients that are in the middle of a task finish it before they are stopped, instead of killing them right away."
+    )
+    
+    # load shape preset
+    parser.add_option(
+        '--load-shape',
+        action='store',
+        type='str',
+        dest='load_shape',
+        default=None,
+        help="Change the number of clients over time according to a load shape, instead of running a fixed number of clients. One of step:CLIENTS,SECONDS[,MAX_CLIENTS[,TIME_LIMIT]] (add CLIENTS clients every SECONDS seconds), ramp:START,END,SECONDS[,TIME_LIMIT] (go from START to END clients over SECONDS seconds) or spike:BASE,PEAK,START,SECONDS[,TIME_LIMIT] (run PEAK instead of BASE clients for SECONDS seconds, starting at START). Clients are hatched at the --hatch-rate. Overrides any LoadShape class in the locustfile."
+    )
+    
     # Number of requests
     parser.add_option(
         '-n', '--num-request',
@@ -191,6 +272,33 @@ def parse_options():
        default=False,
        help='Only print the summary stats'
     )
+
+    # record requests in a buffer that's applied to the stats in batches
+    parser.add_option(
+        '--buffered-stats',
+        action='store_true',
+        dest='buffered_stats',
+        default=False,
+        help="Record requests in a buffer that is applied to the stats in batches by a separate greenlet, instead of updating the stats from within each request. Reduces the overhead per request, at the cost of the stats lagging behind by up to a tenth of a second."
+    )
+    
+    # let the locusts sleep on a shared timer wheel
+    parser.add_option(
+        '--timer-wheel',
+        action='store_true',
+        dest='timer_wheel',
+        default=False,
+        help="Let the waiting clients sleep on a shared timer wheel with millisecond ticks, instead of each client having its own timer in the event loop. Reduces the overhead of waiting when running tens of thousands of clients per process."
+    )
+    
+    # run the locusts on an asyncio event loop
+    parser.add_option(
+        '--asyncio',
+        action='store_true',
+        dest='asyncio',
+        default=False,
+        help="Run the locusts on an asyncio event loop instead of gevent, for locustfiles with AsyncLocust classes that use asyncio client libraries. Uses uvloop if it's installed. Only used together with --slave, requires Python 3, and requires the LOCUST_NO_MONKEY_PATCH=1 environment variable to be set so that gevent doesn't monkey patch the standard library."
+    )
     
     # List locust commands found in loaded locust files/source files
     parser.add_option(
@@ -290,13 +398,28 @@ def is_locust(tup):
     )
 
 
+def is_load_shape(tup):
+    """
+    Takes (name, object) tuple, returns True if it's a public LoadShape subclass that has 
+    been defined in a locustfile.
+    """
+    name, item = tup
+    return bool(
+        inspect.isclass(item)
+        and issubclass(item, LoadShape)
+        and item.__module__ != LoadShape.__module__
+        and not name.startswith('_')
+    )
+
+
 def load_locustfile(path):
     """
-    Import given locustfile path and return (docstring, callables).
+    Import given locustfile path and return (docstring, callables, load_shape).
 
-    Specifically, the locustfile's ``__doc__`` attribute (a string) and a
+    Specifically, the locustfile's ``__doc__`` attribute (a string), a
     dictionary of ``{'name': callable}`` containing all callables which pass
-    the "is a Locust" test.
+    the "is a Locust" test, and the LoadShape subclass defined in the
+    locustfile (or None).
     """
     # Get directory and locustfile name
     directory, locustfile = os.path.split(path)
@@ -326,9 +449,12 @@ def load_locustfile(path):
     if index is not None:
         sys.path.insert(index + 1, directory)
         del sys.path[0]
-    # Return our two-tuple
+    # Return our three-tuple
     locusts = dict(filter(is_locust, vars(imported).items()))
-    return imported.__doc__, locusts
+    shapes = [item for name, item in filter(is_load_shape, vars(imported).items())]
+    if len(shapes) > 1:
+        raise ValueError("Found more than one LoadShape class in the locustfile: %s" % ", ".join(sorted(shape.__name__ for shape in shapes)))
+    return imported.__doc__, locusts, shapes[0] if shapes else None
 
 def main():
     parser, options, arguments = parse_options()
@@ -346,7 +472,11 @@ def main():
         logger.error("Could not find any locustfile! Ensure file ends in '.py' and see --help for available options.")
         sys.exit(1)
 
-    docstring, locusts = load_locustfile(locustfile)
+    try:
+        docstring, locusts, shape_class = load_locustfile(locustfile)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
 
     if options.list_commands:
         console_logger.info("Available Locusts:")
@@ -392,28 +522,122 @@ def main():
         logger.error("Locust can not run distributed with the web interface disabled (do not use --no-web and --master together)")
         sys.exit(0)
 
-    if not options.no_web and not options.slave:
+    if options.relay and (options.master or options.slave):
+        logger.error("A relay can not run as master or slave at the same time (do not use --relay together with --master or --slave)")
+        sys.exit(1)
+
+    if options.asyncio:
+        if sys.version_info < (3, 5):
+            logger.error("The asyncio backend (--asyncio) requires Python 3.5 or later")
+            sys.exit(1)
+        if not options.slave:
+            logger.error("The asyncio backend can only be used on slave nodes (use --asyncio together with --slave)")
+            sys.exit(1)
+        if core.MONKEY_PATCHED:
+            logger.error("Set the LOCUST_NO_MONKEY_PATCH=1 environment variable when running with --asyncio, since asyncio client libraries don't work with gevent's monkey patching")
+            sys.exit(1)
+        from . import aio
+        not_async = [locust.__name__ for locust in locust_classes if not aio.is_async_locust(locust)]
+        if not_async:
+            logger.error("Only AsyncLocust classes with an AsyncTaskSet can be run with --asyncio, these are not: %s" % ", ".join(not_async))
+            sys.exit(1)
+
+    if options.arrival_rate is not None and options.arrival_rate <= 0:
+        logger.error("Invalid arrival rate: %g. Should be larger than 0" % options.arrival_rate)
+        sys.exit(1)
+
+    load_shape = None
+    if options.load_shape:
+        try:
+            load_shape = parse_load_shape(options.load_shape, options.hatch_rate)
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
+    elif shape_class is not None:
+        load_shape = shape_class()
+
+    if options.buffered_stats:
+        enable_request_buffer()
+
+    if options.timer_wheel:
+        enable_timer_wheel()
+
+    try:
+        process_count = get_process_count(options.processes)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    worker_sockets = None
+    shared_reports = None
+    worker_index = 0
+    if process_count > 1:
+        if options.master or options.relay:
+            logger.error("Running multiple processes (--processes) is not supported together with --master or --relay")
+            sys.exit(1)
+        elif options.slave:
+            # fork the slave processes. Only the forked processes return from run(), and continue 
+            # as ordinary slave nodes, while this process supervises them until they're done
+            shared_reports = SharedReportArea(process_count)
+            worker_index = ProcessSupervisor(process_count).run()
+            logger.info("Running as slave process %i of %i" % (worker_index, process_count))
+        else:
+            # fork the worker processes before any greenlets are spawned, since the forked 
+            # processes would otherwise inherit them
+            def run_worker(index, sock):
+                runners.locust_runner = LocalWorkerLocustRunner(locust_classes, options, sock)
+                runners.locust_runner.greenlet.join()
+            worker_sockets = fork_workers(process_count, run_worker)
+
+    if not options.no_web and not options.slave and not options.relay:
         # spawn web greenlet
         logger.info("Starting web monitor at %s:%s" % (options.web_host or "*", options.port))
         main_greenlet = gevent.spawn(web.start, locust_classes, options)
     
-    if not options.master and not options.slave:
+    if worker_sockets:
+        runners.locust_runner = ParallelLocalLocustRunner(locust_classes, options, worker_sockets)
+        runners.locust_runner.load_shape = load_shape
+        if options.no_web:
+            if not runners.locust_runner.wait_for_workers():
+                logger.error("Timed out waiting for the worker processes to start")
+                sys.exit(1)
+            if load_shape is not None:
+                main_greenlet = runners.locust_runner.start_shape()
+            else:
+                runners.locust_runner.start_hatching(options.num_clients, options.hatch_rate)
+                main_greenlet = gevent.spawn(runners.locust_runner.wait_until_done)
+    elif not options.master and not options.slave and not options.relay:
         runners.locust_runner = LocalLocustRunner(locust_classes, options)
+        runners.locust_runner.load_shape = load_shape
         # spawn client spawning/hatching greenlet
         if options.no_web:
-            runners.locust_runner.start_hatching(wait=True)
-            main_greenlet = runners.locust_runner.greenlet
+            if load_shape is not None:
+                main_greenlet = runners.locust_runner.start_shape()
+            else:
+                runners.locust_runner.start_hatching(wait=True)
+                main_greenlet = runners.locust_runner.greenlet
     elif options.master:
         runners.locust_runner = MasterLocustRunner(locust_classes, options)
+        runners.locust_runner.load_shape = load_shape
+    elif options.relay:
+        try:
+            runners.locust_runner = RelayLocustRunner(locust_classes, options)
+            main_greenlet = runners.locust_runner.greenlet
+        except socket.error as e:
+            logger.error("Failed to connect to the Locust master: %s", e)
+            sys.exit(-1)
+    elif options.slave and options.asyncio:
+        if aio.install_uvloop():
+            logger.info("Using the uvloop event loop")
+        runners.locust_runner = aio.AsyncSlaveLocustRunner(locust_classes, options)
     elif options.slave:
         try:
-            runners.locust_runner = SlaveLocustRunner(locust_classes, options)
+            runners.locust_runner = SlaveLocustRunner(locust_classes, options, shared_reports=shared_reports, worker_index=worker_index)
             main_greenlet = runners.locust_runner.greenlet
         except socket.error as e:
             logger.error("Failed to connect to the Locust master: %s", e)
             sys.exit(-1)
     
-    if not options.only_summary and (options.print_stats or (options.no_web and not options.slave)):
+    if not options.only_summary and (options.print_stats or (options.no_web and not options.slave and not options.relay)):
         # spawn stats printing greenlet
         gevent.spawn(stats_printer)
     
@@ -438,7 +662,14 @@ def main():
     
     try:
         logger.info("Starting Locust %s" % version)
-        main_greenlet.join()
+        if options.asyncio:
+            try:
+                runners.locust_runner.run_until_quit()
+            except socket.error as e:
+                logger.error("Failed to connect to the Locust master: %s", e)
+                sys.exit(-1)
+        else:
+            main_greenlet.join()
         code = 0
         if len(runners.locust_runner.errors):
             code = 1
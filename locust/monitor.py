@@ -0,0 +1,82 @@
+import logging
+from collections import deque
+from time import time
+
+import gevent
+
+from .usage import ResourceUsage
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_INTERVAL = 0.1
+"""Number of seconds between each time the monitor checks how late the event loop is"""
+
+LOOP_LAG_WINDOW = 3.0
+"""Number of seconds that the reported loop lag is the maximum over"""
+
+LOOP_LAG_WARNING_THRESHOLD = 0.05
+"""Number of seconds that the event loop can be late before a warning is logged"""
+
+LOOP_LAG_WARNING_INTERVAL = 30.0
+"""Minimum number of seconds between two warnings about the loop lag"""
+
+CPU_SAMPLE_INTERVAL = 1.0
+"""Number of seconds between each time the CPU usage is measured"""
+
+
+class LoopMonitor(object):
+    """
+    Measures how saturated the event loop of a load generator is.
+
+    The monitor repeatedly sleeps for a short interval, and measures how much later than
+    requested it wakes up. When the CPU is saturated, or a greenlet blocks without yielding,
+    the loop lag goes up, and the response times that are measured at the same time include
+    the time that the locusts spent waiting to be scheduled, rather than just the time that
+    the system under test took to respond. The monitor also keeps track of the CPU usage of
+    the process, and logs a warning when the lag is above LOOP_LAG_WARNING_THRESHOLD.
+    """
+
+    def __init__(self, interval=LOOP_MONITOR_INTERVAL):
+        self.interval = interval
+        self.lags = deque(maxlen=max(int(LOOP_LAG_WINDOW / interval), 1))
+        self.usage = ResourceUsage()
+        self.cpu_usage = 0.0
+        self.last_cpu_sample = time()
+        self.last_warning = 0
+        self.greenlet = None
+
+    @property
+    def lag(self):
+        """The maximum loop lag, in seconds, over the last LOOP_LAG_WINDOW seconds"""
+        return max(self.lags) if self.lags else 0.0
+
+    def start(self):
+        if self.greenlet is None or self.greenlet.ready():
+            self.greenlet = gevent.spawn(self.run)
+        return self.greenlet
+
+    def stop(self):
+        if self.greenlet is not None:
+            self.greenlet.kill(block=True)
+            self.greenlet = None
+
+    def run(self):
+        while True:
+            start = time()
+            gevent.sleep(self.interval)
+            self.record(time() - start - self.interval)
+
+    def record(self, lag):
+        """
+        Record that the event loop woke the monitor up *lag* seconds too late. Used by
+        run(), and by event loops that run their own monitor task.
+        """
+        now = time()
+        lag = max(lag, 0.0)
+        self.lags.append(lag)
+        if now - self.last_cpu_sample >= CPU_SAMPLE_INTERVAL:
+            self.cpu_usage, _ = self.usage.sample()
+            self.last_cpu_sample = now
+        if lag > LOOP_LAG_WARNING_THRESHOLD and now - self.last_warning > LOOP_LAG_WARNING_INTERVAL:
+            self.last_warning = now
+            logger.warning("The event loop is running %.0f ms behind (CPU usage: %.0f%%). The response times include the time that the locusts spent waiting to be scheduled, so this machine is probably the bottleneck. Run fewer clients per process, or more processes." % (lag * 1000, self.cpu_usage))
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import random
+import signal
+import socket
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY = 1.0
+"""Number of seconds to wait before a crashed worker process is restarted"""
+
+
+def get_process_count(value):
+    """
+    Parse the value of the --processes command line option, which is either a number of
+    processes, or "auto" for one process per CPU core.
+    """
+    if value == "auto":
+        return multiprocessing.cpu_count()
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid number of processes: %r. Should be a number or 'auto'" % (value,))
+    if count < 1:
+        raise ValueError("Invalid number of processes: %r. Should be at least 1" % (value,))
+    return count
+
+
+class ProcessSupervisor(object):
+    """
+    Forks a number of worker processes, and supervises them from the parent process.
+
+    Only the worker processes return from :py:meth:`run() <locust.processes.ProcessSupervisor.run>`
+    (with their worker index), and continue to run Locust as usual. The parent process waits
+    for the workers, restarts the ones that crash, and exits when all of them have finished
+    (or when it's told to stop).
+    """
+
+    def __init__(self, count, restart=True):
+        self.count = count
+        self.restart = restart
+        self.workers = {}
+        self.stopping = False
+
+    def run(self):
+        for index in range(self.count):
+            if self._fork(index):
+                return index
+
+        signal.signal(signal.SIGTERM, self._on_signal)
+        try:
+            return self._supervise()
+        except KeyboardInterrupt:
+            self.stop(signal.SIGINT)
+            self._supervise()
+
+    def _fork(self, index):
+        """
+        Fork a worker process with the given index. Returns True in the worker process.
+        """
+        pid = os.fork()
+        if pid == 0:
+            self.workers = {}
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # make sure the workers don't share the random state of the parent
+            random.seed()
+            return True
+        self.workers[pid] = index
+        logger.info("Started worker process %i (pid %i)" % (index, pid))
+        return False
+
+    def _supervise(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except OSError:
+                break
+            index = self.workers.pop(pid, None)
+            if index is None:
+                continue
+
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+                logger.info("Worker process %i (pid %i) finished" % (index, pid))
+            elif self.stopping or not self.restart:
+                logger.info("Worker process %i (pid %i) exited with status %i" % (index, pid, status))
+            else:
+                logger.warning("Worker process %i (pid %i) died with status %i, restarting it" % (index, pid, status))
+                time.sleep(RESTART_DELAY)
+                if self._fork(index):
+                    return index
+        sys.exit(0)
+
+    def _on_signal(self, signum, frame):
+        logger.info("Got signal %i, stopping worker processes" % signum)
+        self.stop(signum)
+
+    def stop(self, signum=signal.SIGTERM):
+        """
+        Send *signum* to all the worker processes. They won't be restarted when they exit.
+        """
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+
+
+def fork_workers(count, target):
+    """
+    Fork *count* worker processes, that are connected to this process through socket pairs.
+
+    Each worker process calls ``target(index, sock)``, where *sock* is its end of the
+    socket pair, and exits when it returns. Worker processes ignore SIGINT, since it's up
+    to the parent process to tell them to stop. In the parent process, a list of the
+    sockets connected to the workers is returned.
+    """
+    sockets = []
+    for index in range(count):
+        parent_sock, child_sock = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            parent_sock.close()
+            for sock in sockets:
+                sock.close()
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            random.seed()
+            status = 0
+            try:
+                target(index, child_sock)
+            except Exception:
+                logger.exception("Worker process %i failed" % index)
+                status = 1
+            finally:
+                os._exit(status)
+        child_sock.close()
+        sockets.append(parent_sock)
+        logger.info("Started worker process %i (pid %i)" % (index, pid))
+    return sockets
@@ -0,0 +1,73 @@
+import asyncio
+import struct
+
+from .protocol import Message
+
+try:
+    import zmq
+    import zmq.asyncio
+except ImportError:
+    zmq = None
+
+
+class SocketClient(object):
+    """
+    asyncio version of :py:class:`locust.rpc.socketrpc.Client`, for slaves that run on an
+    asyncio event loop
+    """
+    def __init__(self, host, port, identity=None):
+        # the server learns the client's node id from the messages that it sends
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def send(self, msg):
+        data = msg.serialize()
+        self.writer.write(struct.pack('!i', len(data)) + data)
+        await self.writer.drain()
+
+    async def recv(self):
+        length, = struct.unpack('!i', await self.reader.readexactly(4))
+        return Message.unserialize(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ZmqClient(object):
+    """
+    asyncio version of :py:class:`locust.rpc.zmqrpc.Client`. Commands are received on a
+    DEALER socket with the node id as its identity, so that the master can address them
+    to this node.
+    """
+    def __init__(self, host, port, identity=None):
+        self.context = zmq.asyncio.Context()
+        self.receiver = self.context.socket(zmq.DEALER)
+        if identity is not None:
+            self.receiver.setsockopt(zmq.IDENTITY, identity.encode("utf-8"))
+        self.receiver.connect("tcp://%s:%i" % (host, port+1))
+
+        self.sender = self.context.socket(zmq.PUSH)
+        self.sender.connect("tcp://%s:%i" % (host, port))
+
+    async def connect(self):
+        # zmq connects in the background
+        pass
+
+    async def send(self, msg):
+        await self.sender.send(msg.serialize())
+
+    async def recv(self):
+        return Message.unserialize(await self.receiver.recv())
+
+    def close(self):
+        self.context.destroy(linger=0)
+
+
+# like for the gevent based slaves, zmq is used when it's installed (see locust.rpc)
+Client = ZmqClient if zmq is not None else SocketClient
@@ -0,0 +1,80 @@
+import logging
+
+import gevent
+from gevent import queue
+
+from .protocol import Message
+from .socketrpc import _send_obj, _send_packed, _pack_obj, _recv_obj
+
+logger = logging.getLogger(__name__)
+
+
+class Client(object):
+    """
+    RPC client that talks to a parent process over an already connected socket (one end of
+    a socket pair), instead of connecting to a master over the network.
+
+    If the connection is lost, a quit message is queued so that the worker shuts down
+    instead of waiting for commands forever.
+    """
+    def __init__(self, sock):
+        self.socket = sock
+        self.command_queue = queue.Queue()
+        gevent.spawn(self._handle)
+
+    def _handle(self):
+        try:
+            while True:
+                self.command_queue.put_nowait(_recv_obj(self.socket))
+        except Exception:
+            logger.info("Connection to the parent process lost")
+            self.command_queue.put_nowait(Message("quit", None, None))
+
+    def send(self, msg):
+        _send_obj(self.socket, msg)
+
+    def recv(self):
+        return self.command_queue.get()
+
+
+class Server(object):
+    """
+    RPC server for worker processes connected through socket pairs. Like the socket and
+    zmq based servers, it sends commands to a worker by its node id, which it learns from
+    the messages that the worker sends.
+    """
+    def __init__(self, sockets):
+        self.sockets = list(sockets)
+        self.nodes = {}
+        self.event_queue = queue.Queue()
+        for sock in self.sockets:
+            gevent.spawn(self._handle, sock)
+
+    def _handle(self, sock):
+        try:
+            while True:
+                msg = _recv_obj(sock)
+                if msg.node_id is not None:
+                    self.nodes[msg.node_id] = sock
+                self.event_queue.put_nowait(msg)
+        except Exception:
+            logger.info("Worker process disconnected")
+            self.sockets.remove(sock)
+            for node_id, node_sock in list(self.nodes.items()):
+                if node_sock is sock:
+                    del self.nodes[node_id]
+
+    def send_to(self, node_id, msg):
+        sock = self.nodes.get(node_id)
+        if sock is None:
+            logger.warning("Can't send %s message to unknown worker %s" % (msg.type, node_id))
+            return
+        _send_obj(sock, msg)
+
+    def broadcast(self, msg):
+        packed = _pack_obj(msg)
+        for sock in list(self.sockets):
+            _send_packed(sock, packed)
+
+    def recv(self):
+        return self.event_queue.get()
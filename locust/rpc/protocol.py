@@ -1,4 +1,107 @@
+import sys
+from array import array
+
 import msgpack
+import six
+
+STATS_REPORT_VERSION = 2
+"""
+Version of the format of the "stats" list in the reports that slave nodes send to the master.
+
+* Version 1 (reports without a "stats_version" key) is a list of serialized StatsEntry dicts, 
+  as returned by :py:meth:`StatsEntry.serialize() <locust.stats.StatsEntry.serialize>`.
+* Version 2 is a list of deltas, one for each stats entry that has changed since the last 
+  report. Each delta is a list with the fields in STATS_DELTA_FIELDS order. The reports also 
+  hold a "histogram_layout" key with the [significant_digits, highest_trackable_value] of the 
+  slave's response time histograms, which the bucket indexes in the deltas refer to.
+* Version 3 (STATS_REPORT_COLUMNAR_VERSION) holds the same deltas, but in a columnar layout 
+  where each field is a packed little-endian array (see COLUMNAR_STATS_COLUMNS). Each 
+  stats entry is identified by an integer id, and the "names" key maps new ids to their 
+  [name, method]. The name of an entry is only sent in the first report that the entry is 
+  part of.
+"""
+
+STATS_REPORT_COLUMNAR_VERSION = 3
+
+STATS_DELTA_FIELDS = (
+    "name",
+    "method",
+    "start_time",
+    "last_request_timestamp",
+    "num_requests",
+    "num_failures",
+    "total_response_time",
+    "min_response_time",
+    "max_response_time",
+    "total_content_length",
+    "response_times",           # flat list of bucket_index, count pairs
+    "num_reqs_per_sec",         # flat list of second, count pairs
+    "current_response_times",   # flat list of second, bucket_index, count triples
+)
+"""Field order of a stats entry delta in a version 2 report"""
+
+
+
+def _find_typecode(size, candidates):
+    for typecode in candidates:
+        try:
+            if array(typecode).itemsize == size:
+                return typecode
+        except ValueError:
+            # typecode not supported by this python version
+            pass
+    return None
+
+UINT32 = _find_typecode(4, "IL")
+UINT64 = _find_typecode(8, "QL")
+FLOAT64 = "d"
+
+COLUMNAR_STATS_COLUMNS = (
+    ("ids", UINT32),
+    ("start_time", FLOAT64),
+    ("last_request_timestamp", UINT64),
+    ("num_requests", UINT64),
+    ("num_failures", UINT64),
+    ("total_response_time", FLOAT64),
+    ("min_response_time", FLOAT64),        # NaN when there's no min response time
+    ("max_response_time", FLOAT64),
+    ("total_content_length", UINT64),
+    ("response_times_lengths", UINT32),    # number of items in response_times for each entry
+    ("response_times", UINT64),            # bucket_index, count pairs for all entries
+    ("num_reqs_per_sec_lengths", UINT32),
+    ("num_reqs_per_sec", UINT64),          # second, count pairs for all entries
+    ("current_response_times_lengths", UINT32),
+    ("current_response_times", UINT64),    # second, bucket_index, count triples for all entries
+)
+"""Column names and array typecodes of the version 3 (columnar) stats report"""
+
+# the columnar report needs unsigned 64 bit arrays and a msgpack bin type that can be told
+# apart from strings, which we don't get with python 2's str
+COLUMNAR_STATS_SUPPORTED = UINT64 is not None and six.PY3
+
+
+def pack_array(typecode, values):
+    """
+    Return the values packed as a little-endian byte string
+    """
+    a = array(typecode, values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes() if hasattr(a, "tobytes") else a.tostring()
+
+def unpack_array(typecode, data):
+    """
+    Return an array of the values in a byte string created by pack_array()
+    """
+    a = array(typecode)
+    if hasattr(a, "frombytes"):
+        a.frombytes(data)
+    else:
+        a.fromstring(data)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
 
 class Message(object):
     def __init__(self, message_type, data, node_id):
@@ -7,7 +110,7 @@ class Message(object):
         self.node_id = node_id
     
     def serialize(self):
-        return msgpack.dumps((self.type, self.data, self.node_id))
+        return msgpack.dumps((self.type, self.data, self.node_id), use_bin_type=six.PY3)
     
     @classmethod
     def unserialize(cls, data):
@@ -11,7 +11,7 @@ from .protocol import Message
 logger = logging.getLogger(__name__)
 
 def _recv_bytes(sock, bytes):
-    data = ""
+    data = b""
     while bytes:
         temp = sock.recv(bytes)
         if not temp:
@@ -20,9 +20,14 @@ def _recv_bytes(sock, bytes):
         data += temp
     return data
 
-def _send_obj(sock, msg):
+def _pack_obj(msg):
     data = msg.serialize()
-    packed = struct.pack('!i', len(data)) + data
+    return struct.pack('!i', len(data)) + data
+
+def _send_obj(sock, msg):
+    _send_packed(sock, _pack_obj(msg))
+
+def _send_packed(sock, packed):
     try:
         sock.sendall(packed)
     except Exception as e:
@@ -40,7 +45,8 @@ def _recv_obj(sock):
     return Message.unserialize(data)
 
 class Client(object):
-    def __init__(self, host, port):
+    def __init__(self, host, port, identity=None):
+        # the server learns the client's node id from the messages that it sends
         self.host = host
         self.port = port
         self.command_queue = gevent.queue.Queue()
@@ -72,10 +78,21 @@ class Server(object):
         self.host = "0.0.0.0" if host == "*" else host
         self.port = port
         self.event_queue = gevent.queue.Queue()
-        self.command_dispatcher = self._listen()
-
-    def send(self, msg):
-        self.command_dispatcher(msg)
+        # node id -> socket of each slave that has sent us a message
+        self.nodes = {}
+        self._listen()
+
+    def send_to(self, node_id, msg):
+        sock = self.nodes.get(node_id)
+        if sock is None:
+            logger.warning("Can't send %s message to unknown slave %s" % (msg.type, node_id))
+            return
+        _send_obj(sock, msg)
+
+    def broadcast(self, msg):
+        packed = _pack_obj(msg)
+        for sock in set(self.nodes.values()):
+            _send_packed(sock, packed)
 
     def recv(self):
         return self.event_queue.get()
@@ -85,25 +102,19 @@ class Server(object):
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         sock.bind((self.host, self.port))
         sock.listen(256)
-        self.slave_index = 0
-        slaves = []
-
-        def dispatch_command(cmd):
-
-            _send_obj(slaves[self.slave_index], cmd)
-            self.slave_index += 1
-            if self.slave_index == len(slaves):
-                self.slave_index = 0
 
         def handle_slave(sock):
             try:
                 while True:
-                    self.event_queue.put_nowait(_recv_obj(sock))
+                    msg = _recv_obj(sock)
+                    if msg.node_id is not None:
+                        self.nodes[msg.node_id] = sock
+                    self.event_queue.put_nowait(msg)
             except Exception as e:
                 logger.info("Slave disconnected")
-                slaves.remove(sock)
-                if self.slave_index == len(slaves) and len(slaves) > 0:
-                    self.slave_index -= 1
+                for node_id, node_sock in list(self.nodes.items()):
+                    if node_sock is sock:
+                        del self.nodes[node_id]
 
                 try:
                     sock.close()
@@ -114,8 +125,6 @@ class Server(object):
             while True:
                 _socket, _addr = sock.accept()
                 logger.info("Slave connected")
-                slaves.append(_socket)
-                gevent.spawn(lambda: handle_slave(_socket))
+                gevent.spawn(handle_slave, _socket)
 
         gevent.spawn(listener)
-        return dispatch_command
@@ -1,31 +1,55 @@
 import zmq.green as zmq
 from .protocol import Message
 
+def _identity(node_id):
+    return node_id if isinstance(node_id, bytes) else node_id.encode("utf-8")
+
 class BaseSocket(object):
 
     def send(self, msg):
         self.sender.send(msg.serialize())
-    
+
     def recv(self):
         data = self.receiver.recv()
         return Message.unserialize(data)
 
 
 class Server(BaseSocket):
+    """
+    Commands are sent through a ROUTER socket, which can address each client by the
+    identity that its DEALER socket was given (the client's node id).
+    """
     def __init__(self, host, port):
         context = zmq.Context()
         self.receiver = context.socket(zmq.PULL)
         self.receiver.bind("tcp://%s:%i" % (host, port))
-        
-        self.sender = context.socket(zmq.PUSH)
+
+        self.sender = context.socket(zmq.ROUTER)
         self.sender.bind("tcp://%s:%i" % (host, port+1))
-    
+        self.node_ids = set()
+
+    def recv(self):
+        msg = super(Server, self).recv()
+        if msg.node_id is not None:
+            self.node_ids.add(msg.node_id)
+        return msg
+
+    def send_to(self, node_id, msg):
+        self.sender.send_multipart([_identity(node_id), msg.serialize()])
+
+    def broadcast(self, msg):
+        data = msg.serialize()
+        for node_id in self.node_ids:
+            self.sender.send_multipart([_identity(node_id), data])
+
 
 class Client(BaseSocket):
-    def __init__(self, host, port):
+    def __init__(self, host, port, identity=None):
         context = zmq.Context()
-        self.receiver = context.socket(zmq.PULL)
+        self.receiver = context.socket(zmq.DEALER)
+        if identity is not None:
+            self.receiver.setsockopt(zmq.IDENTITY, _identity(identity))
         self.receiver.connect("tcp://%s:%i" % (host, port+1))
-        
+
         self.sender = context.socket(zmq.PUSH)
         self.sender.connect("tcp://%s:%i" % (host, port))
@@ -2,8 +2,10 @@
 import socket
 import traceback
 import warnings
+import math
 import random
 import logging
+import multiprocessing
 from time import time
 from hashlib import md5
 
@@ -13,10 +15,17 @@ from gevent.pool import Group
 import six
 from six.moves import xrange
 
-from . import events
+from . import events, stats
 from .stats import global_stats
+from .arrival import ArrivalScheduler
+from .shape import SHAPE_TICK_INTERVAL
+from .usage import ResourceUsage
+from .monitor import LoopMonitor, LOOP_LAG_WARNING_THRESHOLD
+from .processes import get_process_count
+from .core import WeightedTaskTable
 
-from .rpc import rpc, Message
+from .rpc import rpc, piperpc, Message
+from .rpc.protocol import COLUMNAR_STATS_SUPPORTED
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +33,19 @@ logger = logging.getLogger(__name__)
 locust_runner = None
 
 STATE_INIT, STATE_HATCHING, STATE_RUNNING, STATE_STOPPED = ["ready", "hatching", "running", "stopped"]
+STATE_MISSING = "missing"
 SLAVE_REPORT_INTERVAL = 3.0
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_LIVENESS = 5
+MISSING_NODE_TIMEOUT = 60.0
+MIN_MEASURED_CPU_USAGE = 10.0
+CPU_SATURATION_THRESHOLD = 90.0
+LOAD_REBALANCE_INTERVAL = 30.0
+WORKER_READY_TIMEOUT = 30.0
+WORKER_DONE_CHECK_INTERVAL = 1.0
+HATCH_MIN_INTERVAL = 0.01
+ARRIVAL_CHECK_INTERVAL = 1.0
+ARRIVAL_LAG_THRESHOLD = 0.1
 
 
 class LocustRunner(object):
@@ -34,15 +55,37 @@ class LocustRunner(object):
         self.num_clients = options.num_clients
         self.num_requests = options.num_requests
         self.host = options.host
+        self.arrival_rate = options.arrival_rate
+        self.arrival_distribution = options.arrival_distribution
+        self.max_clients = options.max_clients
+        self.graceful_scale_down = options.graceful_scale_down
+        self.arrival_scheduler = None
+        self.arrival_greenlet = None
+        self.schedule_lag = 0.0
+        self.achieved_hatch_rate = 0.0
+        # measures how far behind the event loop is, which skews the measured response times
+        self.loop_monitor = LoopMonitor()
         self.locusts = Group()
+        # the live locust greenlets of each locust class, for picking the ones to kill
+        self.live_locusts = {}
         self.state = STATE_INIT
         self.hatching_greenlet = None
+        self.load_shape = None
+        self.shape_greenlet = None
+        # set while the clients of a running test are being redistributed between the slaves
+        self.rebalancing = False
         self.exceptions = {}
         self.stats = global_stats
         
         # register listener that resets stats when hatching is complete
         def on_hatch_complete(user_count):
             self.state = STATE_RUNNING
+            if self.load_shape is not None:
+                # the stats of a load shape test cover all of its stages
+                return
+            if self.rebalancing:
+                # moving clients between slaves doesn't start a new test
+                return
             logger.info("Resetting stats\n")
             self.stats.reset_all()
         events.hatch_complete += on_hatch_complete
@@ -59,6 +102,10 @@ class LocustRunner(object):
     def user_count(self):
         return len(self.locusts)
 
+    @property
+    def loop_lag(self):
+        return self.loop_monitor.lag
+
     def weight_locusts(self, amount, stop_timeout = None):
         """
         Distributes the amount of locusts for each WebLocust-class according to it's weight
@@ -75,6 +122,7 @@ class LocustRunner(object):
                 locust.host = self.host
             if stop_timeout is not None:
                 locust.stop_timeout = stop_timeout
+            locust.arrival_scheduler = self.arrival_scheduler
 
             # create locusts depending on weight
             percent = locust.weight / float(weight_sum)
@@ -89,6 +137,7 @@ class LocustRunner(object):
         if self.num_requests is not None:
             self.stats.max_requests = self.num_requests
 
+        self.update_arrival_scheduler()
         bucket = self.weight_locusts(spawn_count, stop_timeout)
         spawn_count = len(bucket)
         if self.state == STATE_INIT or self.state == STATE_STOPPED:
@@ -101,47 +150,122 @@ class LocustRunner(object):
         occurence_count = dict([(l.__name__, 0) for l in self.locust_classes])
         
         def hatch():
-            sleep_time = 1.0 / self.hatch_rate
-            while True:
-                if not bucket:
-                    logger.info("All locusts hatched: %s" % ", ".join(["%s: %d" % (name, count) for name, count in six.iteritems(occurence_count)]))
-                    events.hatch_complete.fire(user_count=self.num_clients)
-                    return
-
-                locust = bucket.pop(random.randint(0, len(bucket)-1))
-                occurence_count[locust.__name__] += 1
-                def start_locust(_):
-                    try:
-                        locust().run()
-                    except GreenletExit:
-                        pass
-                new_locust = self.locusts.spawn(start_locust, locust)
-                if len(self.locusts) % 10 == 0:
-                    logger.debug("%i locusts hatched" % len(self.locusts))
-                gevent.sleep(sleep_time)
+            # shuffle once, so that picking the next locust is just a pop from the end
+            random.shuffle(bucket)
+            total = len(bucket)
+            spawned = 0
+            start = time()
+            while bucket:
+                # spawn all the locusts that are due by now according to the wall clock, so 
+                # that sleeps that overshoot, and the time spent spawning, don't add up
+                due = min(int((time() - start) * self.hatch_rate) + 1, total)
+                while spawned < due:
+                    locust = bucket.pop()
+                    occurence_count[locust.__name__] += 1
+                    self.spawn_locust(locust)
+                    spawned += 1
+                logger.debug("%i locusts hatched" % len(self.locusts))
+                if bucket:
+                    gevent.sleep(max(start + float(spawned) / self.hatch_rate - time(), HATCH_MIN_INTERVAL))
+            
+            elapsed = time() - start
+            if spawned > 1 and elapsed > 0:
+                self.achieved_hatch_rate = (spawned - 1) / elapsed
+            else:
+                self.achieved_hatch_rate = float(self.hatch_rate)
+            logger.info("All locusts hatched: %s" % ", ".join(["%s: %d" % (name, count) for name, count in six.iteritems(occurence_count)]))
+            logger.info("Achieved hatch rate: %.2f clients/s (requested: %g clients/s)" % (self.achieved_hatch_rate, self.hatch_rate))
+            events.hatch_complete.fire(user_count=self.num_clients)
         
         hatch()
+        if self.arrival_scheduler is not None and (self.arrival_greenlet is None or self.arrival_greenlet.ready()):
+            self.arrival_greenlet = gevent.spawn(self.arrival_controller)
         if wait:
             self.locusts.join()
             logger.info("All locusts dead\n")
 
-    def kill_locusts(self, kill_count):
+    def spawn_locust(self, locust):
+        def start_locust(_):
+            try:
+                greenlet.locust_instance = locust()
+                greenlet.locust_instance.run()
+            except GreenletExit:
+                pass
+        greenlet = self.locusts.spawn(start_locust, locust)
+        greenlet.locust_instance = None
+        live = self.live_locusts.setdefault(locust, set())
+        live.add(greenlet)
+        greenlet.rawlink(live.discard)
+        return greenlet
+
+    def update_arrival_scheduler(self):
+        """
+        Create, update or remove the ArrivalScheduler that paces the locusts' tasks, 
+        depending on the current arrival rate
+        """
+        if not self.arrival_rate:
+            self.arrival_scheduler = None
+        elif self.arrival_scheduler is None:
+            self.arrival_scheduler = ArrivalScheduler(self.arrival_rate, self.arrival_distribution)
+        else:
+            self.arrival_scheduler.rate = self.arrival_rate
+            self.arrival_scheduler.distribution = self.arrival_distribution
+
+    def arrival_controller(self):
+        """
+        Keep track of the schedule lag when running with an arrival rate, and add locusts 
+        when all of them are busy and the tasks are being started too late
+        """
+        table = WeightedTaskTable((locust, locust.weight) for locust in self.locust_classes if locust.task_set)
+        while self.arrival_scheduler is not None:
+            gevent.sleep(ARRIVAL_CHECK_INTERVAL)
+            scheduler = self.arrival_scheduler
+            if scheduler is None:
+                break
+            self.schedule_lag = scheduler.pop_lag()
+            if scheduler.waiting or self.schedule_lag < ARRIVAL_LAG_THRESHOLD:
+                continue
+            
+            # enough locusts to start the tasks that are behind schedule, but never more than double
+            count = min(int(math.ceil(self.schedule_lag * scheduler.rate)), max(len(self.locusts), 1))
+            if self.max_clients is not None:
+                count = min(count, self.max_clients - self.num_clients)
+            if count <= 0:
+                logger.warning("Can't keep up with the arrival rate of %g tasks/s (schedule lag: %.2fs), and the maximum number of clients (%i) is already running" % (scheduler.rate, self.schedule_lag, self.max_clients))
+                continue
+            
+            logger.info("Adding %i locusts to keep up with the arrival rate of %g tasks/s (schedule lag: %.2fs)" % (count, scheduler.rate, self.schedule_lag))
+            self.num_clients += count
+            for i in xrange(count):
+                self.spawn_locust(table.choose())
+
+    def kill_locusts(self, kill_count, graceful=None):
         """
         Kill a kill_count of weighted locusts from the Group() object in self.locusts
+
+        If *graceful* is True (defaults to the --graceful-scale-down option), locusts that are 
+        in the middle of a task are left to finish it, and exit before their next task.
         """
+        if graceful is None:
+            graceful = self.graceful_scale_down
         bucket = self.weight_locusts(kill_count)
         kill_count = len(bucket)
         self.num_clients -= kill_count
         logger.info("Killing %i locusts" % kill_count)
         dying = []
-        for g in self.locusts:
-            for l in bucket:
-                if l == g.args[0]:
-                    dying.append(g)
-                    bucket.remove(l)
-                    break
+        for locust in bucket:
+            live = self.live_locusts.get(locust)
+            if not live:
+                continue
+            g = live.pop()
+            if graceful and g.locust_instance is not None and not g.locust_instance._waiting:
+                # the locust is executing a task, and will exit before it starts the next one
+                g.locust_instance._stopping = True
+            else:
+                dying.append(g)
+        gevent.killall(dying, block=True)
         for g in dying:
-            self.locusts.killone(g)
+            self.locusts.discard(g)
         events.hatch_complete.fire(user_count=self.num_clients)
 
     def start_hatching(self, locust_count=None, hatch_rate=None, wait=False):
@@ -174,10 +298,46 @@ class LocustRunner(object):
             else:
                 self.spawn_locusts(wait=wait)
 
+    def start_shape(self):
+        """
+        Start a greenlet that follows the runner's load_shape, and return it
+        """
+        self.stop_shape()
+        self.shape_greenlet = gevent.spawn(self.shape_worker)
+        return self.shape_greenlet
+
+    def stop_shape(self):
+        if self.shape_greenlet is not None and self.shape_greenlet is not gevent.getcurrent():
+            self.shape_greenlet.kill(block=True)
+        self.shape_greenlet = None
+
+    def shape_worker(self):
+        start = time()
+        while True:
+            target = self.load_shape.tick(time() - start)
+            if target is None:
+                logger.info("The load shape has ended, stopping the test")
+                self.shape_greenlet = None
+                self.stop()
+                return
+            
+            num_clients, hatch_rate = target
+            # changes are held back while hatching, since they would race with the ongoing hatch
+            if self.state != STATE_HATCHING and (num_clients != self.num_clients or self.state in (STATE_INIT, STATE_STOPPED)):
+                logger.info("Load shape: changing to %i clients at a hatch rate of %g clients/s" % (num_clients, hatch_rate))
+                self.start_hatching(num_clients, hatch_rate)
+            gevent.sleep(SHAPE_TICK_INTERVAL)
+
     def stop(self):
+        self.stop_shape()
         # if we are currently hatching locusts we need to kill the hatching greenlet first
         if self.hatching_greenlet and not self.hatching_greenlet.ready():
             self.hatching_greenlet.kill(block=True)
+        if self.arrival_greenlet is not None:
+            self.arrival_greenlet.kill(block=True)
+            self.arrival_greenlet = None
+        if self.arrival_scheduler is not None:
+            self.arrival_scheduler.reset()
         self.locusts.kill(block=True)
         self.state = STATE_STOPPED
         events.locust_stop_hatching.fire()
@@ -200,9 +360,14 @@ class LocalLocustRunner(LocustRunner):
         events.locust_error += on_locust_error
 
     def start_hatching(self, locust_count=None, hatch_rate=None, wait=False):
+        self.loop_monitor.start()
         self.hatching_greenlet = gevent.spawn(lambda: super(LocalLocustRunner, self).start_hatching(locust_count, hatch_rate, wait=wait))
         self.greenlet = self.hatching_greenlet
 
+    def stop(self):
+        super(LocalLocustRunner, self).stop()
+        self.loop_monitor.stop()
+
 class DistributedLocustRunner(LocustRunner):
     def __init__(self, locust_classes, options):
         super(DistributedLocustRunner, self).__init__(locust_classes, options)
@@ -210,18 +375,75 @@ class DistributedLocustRunner(LocustRunner):
         self.master_port = options.master_port
         self.master_bind_host = options.master_bind_host
         self.master_bind_port = options.master_bind_port
+        self.stats_encoding = options.stats_encoding
+        # a slave process runs on a single core, which it may have to share with other processes
+        self.cores = min(multiprocessing.cpu_count() / float(get_process_count(options.processes)), 1.0)
     
     def noop(self, *args, **kwargs):
         """ Used to link() greenlets to in order to be compatible with gevent 1.0 """
         pass
+    
+    def setup_report_encoder(self):
+        """ Set up the encoding of the stats reports that this node sends to the master """
+        if self.stats_encoding == "columnar":
+            if COLUMNAR_STATS_SUPPORTED:
+                stats.report_encoder = stats.ColumnarReportEncoder()
+            else:
+                logger.warning("The columnar stats encoding isn't supported on this Python version, falling back to the delta encoding")
+    
+    def heartbeat_sender(self):
+        """ Let the master know that this node is alive, and how loaded it is """
+        usage = ResourceUsage()
+        while True:
+            try:
+                self.client.send(Message("heartbeat", self.heartbeat_data(usage), self.client_id))
+            except:
+                logger.error("Connection lost to master server. Stopping heartbeats...")
+                break
+            gevent.sleep(HEARTBEAT_INTERVAL)
+    
+    def heartbeat_data(self, usage):
+        cpu_usage, memory_usage = usage.sample()
+        return {"state": self.state, "cpu_usage": cpu_usage, "memory_usage": memory_usage, "cores": self.cores}
+
+def distribute_clients(count, capacities):
+    """
+    Split *count* clients between nodes in proportion to their capacities (a {node_id: capacity}
+    dict). Returns a {node_id: num_clients} dict that adds up to *count*.
+    """
+    if not capacities:
+        return {}
+    total = float(sum(six.itervalues(capacities)))
+    if total <= 0:
+        capacities = dict((node_id, 1.0) for node_id in capacities)
+        total = float(len(capacities))
+    shares = dict((node_id, count * capacity / total) for node_id, capacity in six.iteritems(capacities))
+    result = dict((node_id, int(share)) for node_id, share in six.iteritems(shares))
+    # hand out the clients that are left to the nodes with the largest remainders
+    remaining = count - sum(six.itervalues(result))
+    for node_id in sorted(shares, key=lambda node_id: (result[node_id] - shares[node_id], node_id))[:remaining]:
+        result[node_id] += 1
+    return result
 
 class SlaveNode(object):
     def __init__(self, id, state=STATE_INIT):
         self.id = id
         self.state = state
         self.user_count = 0
+        self.schedule_lag = 0.0
+        self.hatch_rate = 0.0
+        self.last_seen = time()
+        self.cpu_usage = 0.0
+        self.memory_usage = 0
+        self.cores = 1.0
+        self.loop_lag = 0.0
+        # the number of clients that the node was last told to run
+        self.num_clients = 0
 
 class MasterLocustRunner(DistributedLocustRunner):
+    # each slave runs num_requests requests, unless this is set
+    split_num_requests = False
+    
     def __init__(self, *args, **kwargs):
         super(MasterLocustRunner, self).__init__(*args, **kwargs)
         
@@ -240,11 +462,21 @@ class MasterLocustRunner(DistributedLocustRunner):
             @property
             def running(self):
                 return self.get_by_state(STATE_RUNNING)
+            
+            @property
+            def missing(self):
+                return self.get_by_state(STATE_MISSING)
+            
+            @property
+            def active(self):
+                return [c for c in six.itervalues(self) if c.state in (STATE_INIT, STATE_HATCHING, STATE_RUNNING)]
         
         self.clients = SlaveNodesDict()
-        self.server = rpc.Server(self.master_bind_host, self.master_bind_port)
+        self.last_rebalance = 0
+        self.server = self.create_server()
         self.greenlet = Group()
         self.greenlet.spawn(self.client_listener).link_exception(callback=self.noop)
+        self.greenlet.spawn(self.heartbeat_checker).link_exception(callback=self.noop)
         
         # listener that gathers info on how many locust users the slaves has spawned
         def on_slave_report(client_id, data):
@@ -253,6 +485,18 @@ class MasterLocustRunner(DistributedLocustRunner):
                 return
 
             self.clients[client_id].user_count = data["user_count"]
+            self.clients[client_id].schedule_lag = data.get("schedule_lag", 0.0)
+            self.schedule_lag = max(c.schedule_lag for c in six.itervalues(self.clients))
+            if "cpu_usage" in data:
+                self.clients[client_id].cpu_usage = data["cpu_usage"]
+            self.update_loop_lag(client_id, data.get("loop_lag", 0.0))
+            # reports that have been pre-merged on the slave machine hold the user counts of the other processes
+            for node_id, user_count in six.iteritems(data.get("node_user_counts", {})):
+                if node_id in self.clients:
+                    self.clients[node_id].user_count = user_count
+            for node_id, loop_lag in six.iteritems(data.get("node_loop_lags", {})):
+                if node_id in self.clients:
+                    self.update_loop_lag(node_id, loop_lag)
         events.slave_report += on_slave_report
         
         # register listener that sends quit message to slave nodes
@@ -260,60 +504,145 @@ class MasterLocustRunner(DistributedLocustRunner):
             self.quit()
         events.quitting += on_quitting
     
+    def create_server(self):
+        return rpc.Server(self.master_bind_host, self.master_bind_port)
+    
     @property
     def user_count(self):
-        return sum([c.user_count for c in six.itervalues(self.clients)])
+        return sum([c.user_count for c in six.itervalues(self.clients) if c.state != STATE_MISSING])
+    
+    @property
+    def loop_lag(self):
+        return max([c.loop_lag for c in self.clients.active] or [0.0])
+    
+    def update_loop_lag(self, client_id, loop_lag):
+        client = self.clients[client_id]
+        # only warn when the lag goes above the threshold, the slave logs a warning of its own while it stays there
+        if loop_lag > LOOP_LAG_WARNING_THRESHOLD >= client.loop_lag:
+            logger.warning("The event loop of slave %s is running %.0f ms behind, so the response times that it reports are skewed" % (client_id, loop_lag * 1000))
+        client.loop_lag = loop_lag
     
-    def start_hatching(self, locust_count, hatch_rate):
-        num_slaves = len(self.clients.ready) + len(self.clients.running)
+    def start_hatching(self, locust_count, hatch_rate, changed_only=False, rebalance=False):
+        """
+        Send each active slave a hatch job with its share of *locust_count* clients. If 
+        *changed_only* is True, slaves whose share hasn't changed are left alone. If *rebalance* 
+        is True, the clients of the running test are only being redistributed, so the stats 
+        aren't reset when the hatching is complete.
+        """
+        num_slaves = len(self.clients.active)
         if not num_slaves:
             logger.warning("You are running in distributed mode but have no slave servers connected. "
                            "Please connect slaves prior to swarming.")
             return
 
         self.num_clients = locust_count
-        slave_num_clients = locust_count // (num_slaves or 1)
-        slave_hatch_rate = float(hatch_rate) / (num_slaves or 1)
-        remaining = locust_count % num_slaves
+        self.hatch_rate = hatch_rate
+        self.last_rebalance = time()
+        # slaves get a share of the clients that matches their capacity
+        counts = distribute_clients(locust_count, self.get_capacities(self.clients.active))
+        if self.split_num_requests and self.num_requests is not None:
+            num_requests = distribute_clients(self.num_requests, counts)
+        else:
+            num_requests = dict((c.id, self.num_requests) for c in self.clients.active)
+        clients = [c for c in self.clients.active if not changed_only or c.num_clients != counts[c.id]]
+        if not clients:
+            return
 
-        logger.info("Sending hatch jobs to %d ready clients", num_slaves)
+        logger.info("Sending hatch jobs to %d ready clients", len(clients))
+        self.rebalancing = rebalance
 
         if self.state != STATE_RUNNING and self.state != STATE_HATCHING:
             self.stats.clear_all()
             self.exceptions = {}
             events.master_start_hatching.fire()
         
-        for client in six.itervalues(self.clients):
+        for client in clients:
+            client.num_clients = counts[client.id]
+            share = float(client.num_clients) / locust_count if locust_count else 1.0 / num_slaves
             data = {
-                "hatch_rate":slave_hatch_rate,
-                "num_clients":slave_num_clients,
-                "num_requests": self.num_requests,
+                "hatch_rate":hatch_rate * share,
+                "num_clients":client.num_clients,
+                "num_requests": num_requests[client.id],
                 "host":self.host,
-                "stop_timeout":None
+                "stop_timeout":None,
+                "arrival_rate":self.arrival_rate * share if self.arrival_rate else None,
+                "arrival_distribution":self.arrival_distribution,
+                "graceful_scale_down":self.graceful_scale_down,
+                "rebalance":rebalance,
             }
-
-            if remaining > 0:
-                data["num_clients"] += 1
-                remaining -= 1
-
-            self.server.send(Message("hatch", data, None))
+            self.server.send_to(client.id, Message("hatch", data, None))
         
         self.stats.start_time = time()
         self.state = STATE_HATCHING
 
+    def get_capacities(self, clients):
+        """
+        Return a {node_id: capacity} dict with the relative number of clients that each of 
+        *clients* can run.
+
+        The capacity is the number of cores that a slave can use, divided by the CPU usage 
+        per client that it reported in its last heartbeat, so slaves on faster machines get 
+        more clients. Slaves that haven't run enough clients to tell are assumed to use as 
+        much CPU per client as the average slave.
+        """
+        costs = [c.cpu_usage / c.user_count if c.user_count and c.cpu_usage >= MIN_MEASURED_CPU_USAGE else None for c in clients]
+        measured = [cost for cost in costs if cost is not None]
+        default_cost = sum(measured) / len(measured) if measured else 1.0
+        return dict((c.id, c.cores / (cost if cost is not None else default_cost)) for c, cost in zip(clients, costs))
+    
+    def is_saturated(self, client):
+        return client.cpu_usage > CPU_SATURATION_THRESHOLD * client.cores
+    
     def stop(self):
+        self.stop_shape()
         for client in self.clients.hatching + self.clients.running:
-            self.server.send(Message("stop", None, None))
+            self.server.send_to(client.id, Message("stop", None, None))
         events.master_stop_hatching.fire()
     
     def quit(self):
-        for client in six.itervalues(self.clients):
-            self.server.send(Message("quit", None, None))
+        self.server.broadcast(Message("quit", None, None))
         self.greenlet.kill(block=True)
     
+    def heartbeat_checker(self):
+        """
+        Mark the slaves that haven't been heard from in a while as missing, and move their 
+        clients to the other slaves. Missing slaves that don't come back are removed.
+        """
+        while True:
+            gevent.sleep(HEARTBEAT_INTERVAL)
+            now = time()
+            lost = False
+            for client in list(six.itervalues(self.clients)):
+                if client.state == STATE_MISSING:
+                    if now - client.last_seen > MISSING_NODE_TIMEOUT:
+                        logger.warning("Removing slave %s, which has been missing for %i seconds" % (client.id, now - client.last_seen))
+                        del self.clients[client.id]
+                elif now - client.last_seen > HEARTBEAT_INTERVAL * HEARTBEAT_LIVENESS:
+                    logger.warning("Slave %s hasn't sent a heartbeat in %.1f seconds, marking it as missing" % (client.id, now - client.last_seen))
+                    lost = lost or client.state in (STATE_HATCHING, STATE_RUNNING)
+                    client.state = STATE_MISSING
+            if lost:
+                self.rebalance()
+    
+    def rebalance(self):
+        """
+        Spread the clients of a running test over the slaves that are currently active. Only 
+        the slaves whose share of the clients changes are sent new hatch jobs.
+        """
+        if self.state not in (STATE_HATCHING, STATE_RUNNING):
+            return
+        if not self.clients.active:
+            logger.warning("All slaves are missing, can't redistribute the %i clients" % self.num_clients)
+            return
+        logger.info("Redistributing %i clients over %i slaves" % (self.num_clients, len(self.clients.active)))
+        self.start_hatching(self.num_clients, self.hatch_rate, changed_only=True, rebalance=True)
+    
     def client_listener(self):
         while True:
             msg = self.server.recv()
+            if msg.node_id in self.clients:
+                self.clients[msg.node_id].last_seen = time()
+            
             if msg.type == "client_ready":
                 id = msg.node_id
                 self.clients[id] = SlaveNode(id)
@@ -321,6 +650,9 @@ class MasterLocustRunner(DistributedLocustRunner):
                 ## emit a warning if the slave's clock seem to be out of sync with our clock
                 #if abs(time() - msg.data["time"]) > 5.0:
                 #    warnings.warn("The slave node's clock seem to be out of sync. For the statistics to be correct the different locust servers need to have synchronized clocks.")
+            elif msg.type in ("client_stopped", "hatching", "hatch_complete") and msg.node_id not in self.clients:
+                # a late message from a slave that was removed after going missing
+                logger.info("Discarded %s message from unrecognized slave %s" % (msg.type, msg.node_id))
             elif msg.type == "client_stopped":
                 del self.clients[msg.node_id]
                 if len(self.clients.hatching + self.clients.running) == 0:
@@ -331,10 +663,14 @@ class MasterLocustRunner(DistributedLocustRunner):
             elif msg.type == "hatching":
                 self.clients[msg.node_id].state = STATE_HATCHING
             elif msg.type == "hatch_complete":
-                self.clients[msg.node_id].state = STATE_RUNNING
-                self.clients[msg.node_id].user_count = msg.data["count"]
+                client = self.clients[msg.node_id]
+                client.state = STATE_RUNNING
+                client.user_count = msg.data["count"]
+                client.hatch_rate = msg.data.get("hatch_rate", 0.0)
                 if len(self.clients.hatching) == 0:
-                    count = sum(c.user_count for c in six.itervalues(self.clients))
+                    count = self.user_count
+                    self.achieved_hatch_rate = sum(c.hatch_rate for c in self.clients.active)
+                    logger.info("Achieved hatch rate: %.2f clients/s (requested: %g clients/s)" % (self.achieved_hatch_rate, self.hatch_rate))
                     events.hatch_complete.fire(user_count=count)
             elif msg.type == "quit":
                 if msg.node_id in self.clients:
@@ -342,31 +678,63 @@ class MasterLocustRunner(DistributedLocustRunner):
                     logger.info("Client %r quit. Currently %i clients connected." % (msg.node_id, len(self.clients.ready)))
             elif msg.type == "exception":
                 self.log_exception(msg.node_id, msg.data["msg"], msg.data["traceback"])
+            elif msg.type == "heartbeat":
+                client = self.clients.get(msg.node_id)
+                if client is None:
+                    # a slave that had been removed after going missing
+                    client = self.clients[msg.node_id] = SlaveNode(msg.node_id, msg.data["state"])
+                    logger.info("Slave %s is back, and has been added again" % msg.node_id)
+                    self.rebalance()
+                elif client.state == STATE_MISSING:
+                    client.state = msg.data["state"]
+                    logger.info("Slave %s is back, after being missing" % msg.node_id)
+                    self.rebalance()
+                client.cpu_usage = msg.data["cpu_usage"]
+                client.memory_usage = msg.data["memory_usage"]
+                client.cores = msg.data.get("cores", 1.0)
+                # the timings of a slave with a saturated CPU are skewed, so move clients from it 
+                # to slaves that can take them
+                if (self.state == STATE_RUNNING and client.state == STATE_RUNNING and self.is_saturated(client) 
+                        and time() - self.last_rebalance > LOAD_REBALANCE_INTERVAL 
+                        and [c for c in self.clients.active if not self.is_saturated(c)]):
+                    logger.warning("Slave %s is using %.0f%% CPU, moving clients to less loaded slaves" % (client.id, client.cpu_usage))
+                    self.rebalance()
 
     @property
     def slave_count(self):
         return len(self.clients.ready) + len(self.clients.hatching) + len(self.clients.running)
 
 class SlaveLocustRunner(DistributedLocustRunner):
-    def __init__(self, *args, **kwargs):
-        super(SlaveLocustRunner, self).__init__(*args, **kwargs)
-        self.client_id = socket.gethostname() + "_" + md5(str(time() + random.randint(0,10000))).hexdigest()
+    def __init__(self, locust_classes, options, shared_reports=None, worker_index=0):
+        super(SlaveLocustRunner, self).__init__(locust_classes, options)
+        # when running multiple processes on the same machine, they pre-merge their stats 
+        # reports through a SharedReportArea, and the first process sends them to the master
+        self.shared_reports = shared_reports
+        self.worker_index = worker_index
+        self.client_id = socket.gethostname() + "_" + md5(str(time() + random.randint(0,10000)).encode("utf-8")).hexdigest()
         
-        self.client = rpc.Client(self.master_host, self.master_port)
+        self.setup_report_encoder()
+        self.client = self.create_client()
         self.greenlet = Group()
 
         self.greenlet.spawn(self.worker).link_exception(callback=self.noop)
         self.client.send(Message("client_ready", None, self.client_id))
         self.greenlet.spawn(self.stats_reporter).link_exception(callback=self.noop)
+        self.greenlet.spawn(self.heartbeat_sender).link_exception(callback=self.noop)
+        self.greenlet.spawn(self.loop_monitor.run).link_exception(callback=self.noop)
         
         # register listener for when all locust users have hatched, and report it to the master node
         def on_hatch_complete(user_count):
-            self.client.send(Message("hatch_complete", {"count":user_count}, self.client_id))
+            self.client.send(Message("hatch_complete", {"count":user_count, "hatch_rate":self.achieved_hatch_rate}, self.client_id))
         events.hatch_complete += on_hatch_complete
         
         # register listener that adds the current number of spawned locusts to the report that is sent to the master node 
         def on_report_to_master(client_id, data):
             data["user_count"] = self.user_count
+            data["loop_lag"] = self.loop_lag
+            data["cpu_usage"] = self.loop_monitor.cpu_usage
+            if self.arrival_scheduler is not None:
+                data["schedule_lag"] = self.schedule_lag
         events.report_to_master += on_report_to_master
         
         # register listener that sends quit message to master
@@ -380,6 +748,9 @@ class SlaveLocustRunner(DistributedLocustRunner):
             self.client.send(Message("exception", {"msg" : str(exception), "traceback" : formatted_tb}, self.client_id))
         events.locust_error += on_locust_error
 
+    def create_client(self):
+        return rpc.Client(self.master_host, self.master_port, identity=self.client_id)
+
     def worker(self):
         while True:
             msg = self.client.recv()
@@ -390,6 +761,10 @@ class SlaveLocustRunner(DistributedLocustRunner):
                 #self.num_clients = job["num_clients"]
                 self.num_requests = job["num_requests"]
                 self.host = job["host"]
+                self.arrival_rate = job.get("arrival_rate")
+                self.arrival_distribution = job.get("arrival_distribution", "fixed")
+                self.graceful_scale_down = job.get("graceful_scale_down", False)
+                self.rebalancing = job.get("rebalance", False)
                 self.hatching_greenlet = gevent.spawn(lambda: self.start_hatching(locust_count=job["num_clients"], hatch_rate=job["hatch_rate"]))
             elif msg.type == "stop":
                 self.stop()
@@ -400,6 +775,138 @@ class SlaveLocustRunner(DistributedLocustRunner):
                 self.stop()
                 self.greenlet.kill(block=True)
 
+    @property
+    def is_report_aggregator(self):
+        return self.shared_reports is not None and self.worker_index == 0
+
+    def stats_reporter(self):
+        while True:
+            try:
+                self.report_stats()
+            except:
+                logger.error("Connection lost to master server. Aborting...")
+                break
+            
+            gevent.sleep(SLAVE_REPORT_INTERVAL)
+
+    def report_stats(self):
+        node_user_counts = {}
+        node_loop_lags = {}
+        if self.is_report_aggregator:
+            for msg in self.shared_reports.collect(exclude=self.worker_index):
+                stats.on_slave_report(client_id=msg.node_id, data=msg.data)
+                node_user_counts[msg.node_id] = msg.data["user_count"]
+                node_loop_lags[msg.node_id] = msg.data.get("loop_lag", 0.0)
+        
+        data = {}
+        events.report_to_master.fire(client_id=self.client_id, data=data)
+        if node_user_counts:
+            data["node_user_counts"] = node_user_counts
+            data["node_loop_lags"] = node_loop_lags
+        msg = Message("stats", data, self.client_id)
+        
+        # fall back to sending the report directly, if the aggregator hasn't collected our previous one
+        if self.shared_reports is not None and not self.is_report_aggregator:
+            # the aggregator and the master decode columnar reports with separate name tables, 
+            # so each of them is sent the entry names that it hasn't got yet
+            encoder = stats.report_encoder if "columns" in data else None
+            if encoder is not None:
+                encoder.add_names(data, "aggregator")
+            if self.shared_reports.publish(self.worker_index, msg):
+                if encoder is not None:
+                    encoder.mark_sent(data, "aggregator")
+                return
+            if encoder is not None:
+                encoder.add_names(data, "master")
+            self.client.send(msg)
+            if encoder is not None:
+                encoder.mark_sent(data, "master")
+            return
+        self.client.send(msg)
+
+
+class RelayLocustRunner(MasterLocustRunner):
+    """
+    Node that sits between the master and a group of slaves, to spread the work of 
+    aggregating the stats reports over more than one machine.
+
+    The slaves connect to the relay just like they would connect to a master, and their 
+    reports are merged into the relay's stats. The relay itself connects to the master as 
+    a single slave node, and sends one report with the combined stats of all its slaves. 
+    Hatch and stop commands from the master are passed on to the slaves.
+    """
+    def __init__(self, locust_classes, options):
+        super(RelayLocustRunner, self).__init__(locust_classes, options)
+        self.client_id = socket.gethostname() + "_relay_" + md5(str(time() + random.randint(0,10000)).encode("utf-8")).hexdigest()
+        
+        self.setup_report_encoder()
+        self.client = self.create_client()
+        self.greenlet.spawn(self.upstream_listener).link_exception(callback=self.noop)
+        self.client.send(Message("client_ready", None, self.client_id))
+        self.greenlet.spawn(self.stats_reporter).link_exception(callback=self.noop)
+        self.greenlet.spawn(self.heartbeat_sender).link_exception(callback=self.noop)
+        
+        # register listener for when all the slaves have hatched, and report it to the master node
+        def on_hatch_complete(user_count):
+            self.client.send(Message("hatch_complete", {"count":user_count, "hatch_rate":self.achieved_hatch_rate}, self.client_id))
+        events.hatch_complete += on_hatch_complete
+        
+        # register listener that adds the number of locusts spawned by our slaves to the report that is sent to the master node 
+        def on_report_to_master(client_id, data):
+            data["user_count"] = self.user_count
+            # the relay doesn't run any locusts itself, so report the lag of its most loaded slave
+            data["loop_lag"] = self.loop_lag
+            if self.arrival_rate:
+                data["schedule_lag"] = self.schedule_lag
+        events.report_to_master += on_report_to_master
+        
+        # register listener that sends quit message to master
+        def on_quitting():
+            self.client.send(Message("quit", None, self.client_id))
+        events.quitting += on_quitting
+    
+    def heartbeat_data(self, usage):
+        # the relay stands in for all its slaves, so report their combined load
+        data = super(RelayLocustRunner, self).heartbeat_data(usage)
+        slaves = self.clients.active
+        if slaves:
+            data["cpu_usage"] = sum(c.cpu_usage for c in slaves)
+            data["cores"] = sum(c.cores for c in slaves)
+        return data
+    
+    def create_client(self):
+        return rpc.Client(self.master_host, self.master_port, identity=self.client_id)
+    
+    def log_exception(self, node_id, msg, formatted_tb):
+        super(RelayLocustRunner, self).log_exception(node_id, msg, formatted_tb)
+        self.client.send(Message("exception", {"msg" : msg, "traceback" : formatted_tb}, self.client_id))
+    
+    def upstream_listener(self):
+        while True:
+            msg = self.client.recv()
+            if msg.type == "hatch":
+                self.client.send(Message("hatching", None, self.client_id))
+                job = msg.data
+                self.num_requests = job["num_requests"]
+                self.host = job["host"]
+                self.arrival_rate = job.get("arrival_rate")
+                self.arrival_distribution = job.get("arrival_distribution", "fixed")
+                self.graceful_scale_down = job.get("graceful_scale_down", False)
+                if not self.clients.active:
+                    # there's nothing to hatch, so let the master know straight away, rather 
+                    # than leaving it waiting for us to finish hatching
+                    logger.warning("Got a hatch job from the master, but no slaves are connected to this relay")
+                    self.client.send(Message("hatch_complete", {"count":0, "hatch_rate":0.0}, self.client_id))
+                    continue
+                self.start_hatching(job["num_clients"], job["hatch_rate"], rebalance=job.get("rebalance", False))
+            elif msg.type == "stop":
+                self.stop()
+                self.client.send(Message("client_stopped", None, self.client_id))
+                self.client.send(Message("client_ready", None, self.client_id))
+            elif msg.type == "quit":
+                logger.info("Got quit message from master, shutting down...")
+                self.quit()
+    
     def stats_reporter(self):
         while True:
             data = {}
@@ -411,3 +918,54 @@ class SlaveLocustRunner(DistributedLocustRunner):
                 break
             
             gevent.sleep(SLAVE_REPORT_INTERVAL)
+
+
+class ParallelLocalLocustRunner(MasterLocustRunner):
+    """
+    Runs Locust on all the cores of a single machine, without a separate master and slaves.
+
+    The locust users are run by worker processes that have been forked from this process
+    (see :py:func:`locust.processes.fork_workers`). The workers report their stats to this
+    runner over socket pairs, rather than over the network.
+    """
+    # like a LocalLocustRunner, the workers make num_requests requests between them
+    split_num_requests = True
+    
+    def __init__(self, locust_classes, options, worker_sockets):
+        self.worker_sockets = worker_sockets
+        super(ParallelLocalLocustRunner, self).__init__(locust_classes, options)
+    
+    def create_server(self):
+        return piperpc.Server(self.worker_sockets)
+    
+    def wait_for_workers(self, timeout=WORKER_READY_TIMEOUT):
+        """
+        Wait until all the worker processes have reported as ready. Returns False if they 
+        didn't do so within *timeout* seconds.
+        """
+        deadline = time() + timeout
+        while len(self.clients.ready) < len(self.worker_sockets):
+            if time() > deadline:
+                return False
+            gevent.sleep(0.1)
+        return True
+    
+    def wait_until_done(self):
+        """
+        Wait until the workers have hatched, and all their locusts have finished (for example 
+        because num_requests has been reached). Used instead of the hatching greenlet of a 
+        LocalLocustRunner when running without the web UI.
+        """
+        while not (self.state == STATE_RUNNING and self.user_count == 0):
+            gevent.sleep(WORKER_DONE_CHECK_INTERVAL)
+
+class LocalWorkerLocustRunner(SlaveLocustRunner):
+    """
+    Runner for the worker processes of a :py:class:`ParallelLocalLocustRunner`
+    """
+    def __init__(self, locust_classes, options, sock):
+        self.sock = sock
+        super(LocalWorkerLocustRunner, self).__init__(locust_classes, options)
+    
+    def create_client(self):
+        return piperpc.Client(self.sock)
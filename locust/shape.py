@@ -0,0 +1,129 @@
+SHAPE_TICK_INTERVAL = 1.0
+"""Number of seconds between each time the runner asks the load shape for the number of clients"""
+
+
+class LoadShape(object):
+    """
+    Describes how the number of clients should change over the course of a test.
+
+    Subclass it in the locustfile, and implement :py:meth:`tick() <locust.shape.LoadShape.tick>`,
+    and Locust will follow the shape instead of running a fixed number of clients. The
+    runner calls tick() every second, and starts or kills clients when the number that it
+    returns changes. Example::
+
+        class DoubleWave(LoadShape):
+            def tick(self, run_time):
+                if run_time > 600:
+                    return None
+                if run_time % 300 < 150:
+                    return (100, 10)
+                return (500, 50)
+    """
+
+    hatch_rate = 10
+    """Number of clients per second to start, when the shape doesn't say otherwise"""
+
+    time_limit = None
+    """Number of seconds after which the test is stopped. If None, it runs until it's stopped."""
+
+    def __init__(self, **kwargs):
+        for name, value in kwargs.items():
+            if not hasattr(self, name):
+                raise TypeError("%s has no attribute %r" % (type(self).__name__, name))
+            setattr(self, name, value)
+
+    def tick(self, run_time):
+        """
+        Return a (num_clients, hatch_rate) two-tuple for *run_time* seconds into the test,
+        or None when the test should be stopped.
+        """
+        if self.time_limit is not None and run_time >= self.time_limit:
+            return None
+        return (self.get_clients(run_time), self.hatch_rate)
+
+    def get_clients(self, run_time):
+        """
+        Return the number of clients that should be running *run_time* seconds into the test.
+        Used by the default tick() implementation.
+        """
+        raise NotImplementedError()
+
+
+class StepLoadShape(LoadShape):
+    """
+    Adds *step_clients* clients every *step_time* seconds, up to *max_clients*
+    """
+    step_clients = 10
+    step_time = 60
+    max_clients = None
+
+    def get_clients(self, run_time):
+        clients = self.step_clients * (int(run_time // self.step_time) + 1)
+        if self.max_clients is not None:
+            clients = min(clients, self.max_clients)
+        return clients
+
+
+class RampLoadShape(LoadShape):
+    """
+    Goes from *start_clients* to *end_clients* in a straight line over *ramp_time* seconds,
+    and stays at *end_clients* after that
+    """
+    start_clients = 0
+    end_clients = 100
+    ramp_time = 60
+
+    def get_clients(self, run_time):
+        if run_time >= self.ramp_time:
+            return self.end_clients
+        return int(round(self.start_clients + (self.end_clients - self.start_clients) * float(run_time) / self.ramp_time))
+
+
+class SpikeLoadShape(LoadShape):
+    """
+    Runs *base_clients* clients, except for *spike_time* seconds starting at *spike_start*,
+    when it runs *spike_clients* clients
+    """
+    base_clients = 10
+    spike_clients = 100
+    spike_start = 60
+    spike_time = 30
+
+    def get_clients(self, run_time):
+        if self.spike_start <= run_time < self.spike_start + self.spike_time:
+            return self.spike_clients
+        return self.base_clients
+
+
+LOAD_SHAPE_PRESETS = {
+    "step": (StepLoadShape, ("step_clients", "step_time", "max_clients", "time_limit")),
+    "ramp": (RampLoadShape, ("start_clients", "end_clients", "ramp_time", "time_limit")),
+    "spike": (SpikeLoadShape, ("base_clients", "spike_clients", "spike_start", "spike_time", "time_limit")),
+}
+"""
+The load shapes that can be used with the --load-shape command line option, and the
+attributes that the comma separated values after the shape's name are assigned to
+"""
+
+
+def parse_load_shape(spec, hatch_rate=None):
+    """
+    Create a load shape from a --load-shape value, such as ``step:10,60,100`` (add 10 clients
+    every 60 seconds, up to 100 clients). Raises ValueError if *spec* isn't valid.
+    """
+    name, _, values = spec.partition(":")
+    if name not in LOAD_SHAPE_PRESETS:
+        raise ValueError("Unknown load shape: %r. Should be one of: %s" % (name, ", ".join(sorted(LOAD_SHAPE_PRESETS))))
+    shape_class, attributes = LOAD_SHAPE_PRESETS[name]
+    values = [v for v in values.split(",") if v.strip()]
+    if len(values) > len(attributes):
+        raise ValueError("Too many values for the %s load shape. Expected: %s" % (name, ",".join(attributes)))
+    kwargs = {}
+    for attribute, value in zip(attributes, values):
+        try:
+            kwargs[attribute] = int(value) if attribute.endswith("_clients") else float(value)
+        except ValueError:
+            raise ValueError("Invalid %s for the %s load shape: %r" % (attribute, name, value))
+    if hatch_rate:
+        kwargs["hatch_rate"] = hatch_rate
+    return shape_class(**kwargs)
@@ -0,0 +1,75 @@
+import mmap
+import struct
+
+from .rpc import Message
+
+SHARED_REPORT_SLOT_SIZE = 4 * 1024 * 1024
+"""
+Size in bytes of the area that each process can write its stats report to. Reports that
+don't fit are sent directly to the master instead.
+"""
+
+_SLOT_HEADER = struct.Struct("<QQI")
+
+
+class SharedReportArea(object):
+    """
+    Memory mapped area that is shared between the slave processes that run on the same
+    machine (see the --processes command line option), and that is used to pre-merge their
+    stats before they are sent to the master.
+
+    The area has to be created before the processes are forked. It's split into one slot
+    per process, and each process writes its stats reports to its own slot instead of
+    sending them to the master. One of the processes (the aggregator) collects the reports
+    from all the other slots, merges them into its own stats, and sends a single report for
+    the whole machine.
+
+    Each slot starts with a header that holds the sequence number of the last written report,
+    the sequence number of the last report that has been collected, and the length of the
+    report. A slot is only written to when the previous report in it has been collected, and
+    only read from when it holds a report that hasn't been collected yet, so there's only
+    ever one process accessing a slot's report at a time, and no locking is needed.
+    """
+
+    def __init__(self, slots, slot_size=SHARED_REPORT_SLOT_SIZE):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.mmap = mmap.mmap(-1, slots * slot_size)
+
+    def _header(self, index):
+        return _SLOT_HEADER.unpack_from(self.mmap, index * self.slot_size)
+
+    def publish(self, index, msg):
+        """
+        Write *msg* to the slot at *index*. Returns False if the slot still holds a report
+        that hasn't been collected yet, or if the message is too large for the slot.
+        """
+        written, read, length = self._header(index)
+        if written != read:
+            return False
+        payload = msg.serialize()
+        if _SLOT_HEADER.size + len(payload) > self.slot_size:
+            return False
+        offset = index * self.slot_size
+        self.mmap[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + len(payload)] = payload
+        # the sequence number is written last, since that's what makes the report visible
+        struct.pack_into("<I", self.mmap, offset + 16, len(payload))
+        struct.pack_into("<Q", self.mmap, offset, written + 1)
+        return True
+
+    def collect(self, exclude=None):
+        """
+        Return a list of the Messages that have been published since the last call, from
+        all slots except the one at *exclude*.
+        """
+        messages = []
+        for index in range(self.slots):
+            if index == exclude:
+                continue
+            written, read, length = self._header(index)
+            if written == read:
+                continue
+            offset = index * self.slot_size + _SLOT_HEADER.size
+            messages.append(Message.unserialize(self.mmap[offset:offset + length]))
+            struct.pack_into("<Q", self.mmap, index * self.slot_size + 8, written)
+        return messages
@@ -43,6 +43,7 @@ $("ul.tabs").tabs("div.panes > div");
 var stats_tpl = $('#stats-template');
 var errors_tpl = $('#errors-template');
 var exceptions_tpl = $('#exceptions-template');
+var slaves_tpl = $('#slaves-template');
 
 $('#swarm_form').submit(function(event) {
     event.preventDefault();
@@ -120,6 +121,11 @@ function updateStats() {
         if (typeof report.slave_count !== "undefined")
             $("#slaveCount").html(report.slave_count)
 
+        if (typeof report.schedule_lag !== "undefined")
+            $("#schedule_lag").html(Math.round(report.schedule_lag*100)/100)
+
+        $("#loop_lag").html(Math.round(report.loop_lag*1000))
+
         $('#stats tbody').empty();
         $('#errors tbody').empty();
 
@@ -131,6 +137,12 @@ function updateStats() {
         $('#stats tbody').jqoteapp(stats_tpl, sortedStats);
         alternate = false;
         $('#errors tbody').jqoteapp(errors_tpl, (report.errors).sort(sortBy(sortAttribute, desc)));
+
+        if (typeof report.slaves !== "undefined") {
+            $('#slaves tbody').empty();
+            alternate = false;
+            $('#slaves tbody').jqoteapp(slaves_tpl, (report.slaves).sort(sortBy("id", false)));
+        }
         setTimeout(updateStats, 2000);
     });
 }
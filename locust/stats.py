@@ -1,15 +1,44 @@
 import time
 import gevent
 import hashlib
+import logging
+from array import array
 import six
 from six.moves import xrange
 
 from . import events
 from .exception import StopLocust
+from .histogram import Histogram, RollingHistogram, DEFAULT_SIGNIFICANT_DIGITS, DEFAULT_HIGHEST_TRACKABLE_VALUE
+from .rpc.protocol import (STATS_REPORT_VERSION, STATS_REPORT_COLUMNAR_VERSION, COLUMNAR_STATS_COLUMNS, 
+    pack_array, unpack_array)
 from .log import console_logger
 
+logger = logging.getLogger(__name__)
+
 STATS_NAME_WIDTH = 60
 
+PERCENTILES_TO_REPORT = [0.5, 0.66, 0.75, 0.80, 0.90, 0.95, 0.98, 0.99]
+
+CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW = 10
+"""Number of seconds that the "current" response time percentiles are calculated over"""
+
+REQUESTS_PER_SEC_HISTORY = 60
+"""Number of seconds that the number of requests per second is kept for"""
+
+REQUEST_BUFFER_SIZE = 65536
+"""Number of requests that the buffer used by --buffered-stats can hold before it has to be flushed"""
+
+REQUEST_BUFFER_FLUSH_INTERVAL = 0.1
+"""Number of seconds between each time the requests in the buffer are applied to the stats"""
+
+REQUESTS_PER_SEC_ARCHIVE_TIERS = []
+"""
+List of (resolution, capacity) two-tuples that describe an optional, downsampled archive of 
+the number of requests per second. For example [(10, 360), (60, 2880)] would keep 10 second 
+totals for the last hour and 60 second totals for the last 48 hours, after the per second 
+counts have been overwritten. Empty by default, which means that no archive is kept.
+"""
+
 class RequestStatsAdditionError(Exception):
     pass
 
@@ -67,6 +96,103 @@ class RequestStats(object):
         self.start_time = None
         
 
+class CircularCounter(object):
+    """
+    Fixed capacity counter of events per time period.
+    
+    Holds the counts for the last *capacity* periods of *resolution* seconds each. The memory 
+    usage and the cost of merging is constant no matter for how long the test runs. When a 
+    period is overwritten its count is handed over to the *archive* counter, if there is one, 
+    which makes it possible to keep downsampled history for a long time.
+    """
+    
+    def __init__(self, capacity, resolution=1, archive=None):
+        self.capacity = capacity
+        self.resolution = resolution
+        self.archive = archive
+        self.reset()
+    
+    @classmethod
+    def with_archive(cls, capacity, tiers):
+        """
+        Create a per second counter with an archive counter for each (resolution, capacity) 
+        two-tuple in *tiers*
+        """
+        archive = None
+        for resolution, tier_capacity in reversed(tiers):
+            archive = cls(tier_capacity, resolution, archive)
+        return cls(capacity, 1, archive)
+    
+    def reset(self):
+        self.periods = array("l", [-1]) * self.capacity
+        self.counts = array("L", [0]) * self.capacity
+        if self.archive is not None:
+            self.archive.reset()
+    
+    def increment(self, t, count=1):
+        t = int(t)
+        period = t - t % self.resolution
+        i = (period // self.resolution) % self.capacity
+        if self.periods[i] != period:
+            if self.periods[i] > period:
+                # the slot has already been reused for a later period
+                if self.archive is not None:
+                    self.archive.increment(period, count)
+                return
+            if self.periods[i] != -1 and self.archive is not None:
+                self.archive.increment(self.periods[i], self.counts[i])
+            self.periods[i] = period
+            self.counts[i] = 0
+        self.counts[i] += count
+    
+    def get(self, t, default=0):
+        period = t - t % self.resolution
+        i = (period // self.resolution) % self.capacity
+        if self.periods[i] == period:
+            return self.counts[i]
+        return default
+    
+    def __getitem__(self, t):
+        if t not in self:
+            raise KeyError(t)
+        return self.get(t)
+    
+    def __contains__(self, t):
+        period = t - t % self.resolution
+        return self.periods[(period // self.resolution) % self.capacity] == period
+    
+    def items(self):
+        return [(period, count) for period, count in zip(self.periods, self.counts) if period != -1]
+    
+    def __len__(self):
+        return len(self.items())
+    
+    def history(self):
+        """
+        Return a time sorted list of (period start, resolution, count) three-tuples, from this 
+        counter and all its archive tiers
+        """
+        result = [(period, self.resolution, count) for period, count in self.items()]
+        if self.archive is not None:
+            result.extend(self.archive.history())
+        return sorted(result)
+    
+    def update(self, data):
+        """
+        Add the counts of a {time: count} dict
+        """
+        for t, count in six.iteritems(data):
+            self.increment(t, count)
+    
+    def merge(self, other, since=None):
+        for period, count in other.items():
+            if since is None or period >= since:
+                self.increment(period, count)
+    
+    def to_dict(self):
+        return dict(self.items())
+
+
 class StatsEntry(object):
     """
     Represents a single stats entry (name and method)
@@ -94,17 +220,27 @@ class StatsEntry(object):
     """ Maximum response time """
     
     num_reqs_per_sec = None
-    """ A {second => request_count} dict that holds the number of requests made per second """
+    """
+    A :py:class:`CircularCounter <locust.stats.CircularCounter>` that holds the number of 
+    requests made per second, for the last REQUESTS_PER_SEC_HISTORY seconds
+    """
     
     response_times = None
     """
-    A {response_time => count} dict that holds the response time distribution of all
-    the requests.
+    A :py:class:`Histogram <locust.histogram.Histogram>` that holds the response time 
+    distribution of all the requests.
     
-    The keys (the response time in ms) are rounded to store 1, 2, ... 9, 10, 20. .. 90, 
-    100, 200 .. 900, 1000, 2000 ... 9000, in order to save memory.
+    The response times (in ms) are stored in fixed size log-linear buckets, with a precision 
+    of two significant digits, in order to save memory.
+    
+    The histogram is used to calculate the median and percentile response times.
+    """
     
-    This dict is used to calculate the median and percentile response times.
+    current_response_times = None
+    """
+    A :py:class:`RollingHistogram <locust.histogram.RollingHistogram>` that holds the 
+    response time distribution of the requests made during the last 
+    CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW seconds.
     """
     
     total_content_length = None
@@ -127,26 +263,34 @@ class StatsEntry(object):
         self.num_requests = 0
         self.num_failures = 0
         self.total_response_time = 0
-        self.response_times = {}
         self.min_response_time = None
         self.max_response_time = 0
         self.last_request_timestamp = int(time.time())
-        self.num_reqs_per_sec = {}
         self.total_content_length = 0
+        
+        # reuse the preallocated arrays, since slave nodes reset their entries after each report
+        if self.response_times is None:
+            self.response_times = Histogram()
+            self.current_response_times = RollingHistogram(CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW)
+            self.num_reqs_per_sec = CircularCounter.with_archive(REQUESTS_PER_SEC_HISTORY, REQUESTS_PER_SEC_ARCHIVE_TIERS)
+        else:
+            self.response_times.clear()
+            self.current_response_times.reset()
+            self.num_reqs_per_sec.reset()
     
-    def log(self, response_time, content_length):
+    def log(self, response_time, content_length, timestamp=None):
         self.stats.num_requests += 1
         self.num_requests += 1
 
-        self._log_time_of_request()
+        self._log_time_of_request(timestamp)
         self._log_response_time(response_time)
 
         # increase total content-length
         self.total_content_length += content_length
 
-    def _log_time_of_request(self):
-        t = int(time.time())
-        self.num_reqs_per_sec[t] = self.num_reqs_per_sec.setdefault(t, 0) + 1
+    def _log_time_of_request(self, timestamp=None):
+        t = int(timestamp or time.time())
+        self.num_reqs_per_sec.increment(t)
         self.last_request_timestamp = t
         self.stats.last_request_timestamp = t
 
@@ -159,21 +303,8 @@ class StatsEntry(object):
         self.min_response_time = min(self.min_response_time, response_time)
         self.max_response_time = max(self.max_response_time, response_time)
 
-        # to avoid to much data that has to be transfered to the master node when
-        # running in distributed mode, we save the response time rounded in a dict
-        # so that 147 becomes 150, 3432 becomes 3400 and 58760 becomes 59000
-        if response_time < 100:
-            rounded_response_time = response_time
-        elif response_time < 1000:
-            rounded_response_time = int(round(response_time, -1))
-        elif response_time < 10000:
-            rounded_response_time = int(round(response_time, -2))
-        else:
-            rounded_response_time = int(round(response_time, -3))
-
-        # increase request count for the rounded key in response time dict
-        self.response_times.setdefault(rounded_response_time, 0)
-        self.response_times[rounded_response_time] += 1
+        self.response_times.record(response_time)
+        self.current_response_times.record(response_time, self.last_request_timestamp)
 
     def log_error(self, error):
         self.num_failures += 1
@@ -205,10 +336,7 @@ class StatsEntry(object):
 
     @property
     def median_response_time(self):
-        if not self.response_times:
-            return 0
-
-        return median_from_dict(self.num_requests, self.response_times)
+        return self.response_times.median
 
     @property
     def current_rps(self):
@@ -253,17 +381,14 @@ class StatsEntry(object):
         self.max_response_time = max(self.max_response_time, other.max_response_time)
         self.min_response_time = min(self.min_response_time or 0, other.min_response_time or 0) or other.min_response_time
         self.total_content_length = self.total_content_length + other.total_content_length
+        self.current_response_times.merge(other.current_response_times)
 
         if full_request_history:
-            for key in other.response_times:
-                self.response_times[key] = self.response_times.get(key, 0) + other.response_times[key]
-            for key in other.num_reqs_per_sec:
-                self.num_reqs_per_sec[key] = self.num_reqs_per_sec.get(key, 0) +  other.num_reqs_per_sec[key]
+            self.response_times.merge(other.response_times)
+            self.num_reqs_per_sec.merge(other.num_reqs_per_sec)
         else:
             # still add the number of reqs per seconds the last 20 seconds
-            for i in xrange(other.last_request_timestamp-20, other.last_request_timestamp+1):
-                if i in other.num_reqs_per_sec:
-                    self.num_reqs_per_sec[i] = self.num_reqs_per_sec.get(i, 0) + other.num_reqs_per_sec[i]
+            self.num_reqs_per_sec.merge(other.num_reqs_per_sec, since=other.last_request_timestamp-20)
     
     def serialize(self):
         return {
@@ -277,8 +402,9 @@ class StatsEntry(object):
             "max_response_time": self.max_response_time,
             "min_response_time": self.min_response_time,
             "total_content_length": self.total_content_length,
-            "response_times": self.response_times,
-            "num_reqs_per_sec": self.num_reqs_per_sec,
+            "response_times": self.response_times.to_dict(),
+            "current_response_times": self.current_response_times.to_dict(),
+            "num_reqs_per_sec": self.num_reqs_per_sec.to_dict(),
         }
     
     @classmethod
@@ -293,10 +419,11 @@ class StatsEntry(object):
             "max_response_time",
             "min_response_time",
             "total_content_length",
-            "response_times",
-            "num_reqs_per_sec",
         ]:
             setattr(obj, key, data[key])
+        obj.response_times.update(data["response_times"])
+        obj.num_reqs_per_sec.update(data["num_reqs_per_sec"])
+        obj.current_response_times.update(data.get("current_response_times", {}))
         return obj
     
     def get_stripped_report(self):
@@ -306,6 +433,81 @@ class StatsEntry(object):
         report = self.serialize()
         self.reset()
         return report
+    
+    def get_delta_report(self):
+        """
+        Return the changes to this StatsEntry since the last report (which is everything, 
+        since the entry is cleared after each report), in the STATS_REPORT_VERSION format 
+        described in locust.rpc.protocol. The current stats are then cleared.
+        """
+        response_times = []
+        for index, count in self.response_times.iter_nonzero():
+            response_times.extend((index, count))
+        num_reqs_per_sec = []
+        for second, count in self.num_reqs_per_sec.items():
+            num_reqs_per_sec.extend((second, count))
+        current_response_times = []
+        for second, slot in self.current_response_times.iter_seconds():
+            for index, count in six.iteritems(slot):
+                current_response_times.extend((second, index, count))
+        
+        report = [
+            self.name,
+            self.method,
+            self.start_time,
+            self.last_request_timestamp,
+            self.num_requests,
+            self.num_failures,
+            self.total_response_time,
+            self.min_response_time,
+            self.max_response_time,
+            self.total_content_length,
+            response_times,
+            num_reqs_per_sec,
+            current_response_times,
+        ]
+        self.reset()
+        return report
+    
+    def apply_delta(self, delta, layout=None):
+        """
+        Add the changes from a report created by get_delta_report() to this StatsEntry, in place.
+        
+        *layout* is the [significant_digits, highest_trackable_value] of the histogram that 
+        the delta was created from. If it differs from ours, the bucket indexes are translated 
+        through their values.
+        """
+        (_, _, start_time, last_request_timestamp, num_requests, num_failures, total_response_time, 
+            min_response_time, max_response_time, total_content_length, response_times, 
+            num_reqs_per_sec, current_response_times) = delta
+        
+        self.last_request_timestamp = max(self.last_request_timestamp, last_request_timestamp)
+        self.start_time = min(self.start_time, start_time)
+        self.num_requests += num_requests
+        self.num_failures += num_failures
+        self.total_response_time += total_response_time
+        self.max_response_time = max(self.max_response_time, max_response_time)
+        self.min_response_time = min(self.min_response_time or 0, min_response_time or 0) or min_response_time
+        self.total_content_length += total_content_length
+        
+        if layout is None or tuple(layout) == (self.response_times.significant_digits, self.response_times.highest_trackable_value):
+            translate = None
+        else:
+            value_at_index = Histogram(*layout).value_at_index
+            index_for = self.response_times.index_for
+            translate = lambda index: index_for(value_at_index(index))
+        
+        add_at_index = self.response_times.add_at_index
+        for i in xrange(0, len(response_times), 2):
+            index = response_times[i] if translate is None else translate(response_times[i])
+            add_at_index(index, response_times[i+1])
+        increment = self.num_reqs_per_sec.increment
+        for i in xrange(0, len(num_reqs_per_sec), 2):
+            increment(num_reqs_per_sec[i], num_reqs_per_sec[i+1])
+        add_at_index = self.current_response_times.add_at_index
+        for i in xrange(0, len(current_response_times), 3):
+            index = current_response_times[i+1] if translate is None else translate(current_response_times[i+1])
+            add_at_index(index, current_response_times[i], current_response_times[i+2])
 
     def __str__(self):
         try:
@@ -331,30 +533,27 @@ class StatsEntry(object):
         
         Percent specified in range: 0.0 - 1.0
         """
-        num_of_request = int((self.num_requests * percent))
+        return self.response_times.get_value_at_percentile(percent)
 
-        processed_count = 0
-        for response_time in sorted(six.iterkeys(self.response_times), reverse=True):
-            processed_count += self.response_times[response_time]
-            if((self.num_requests - processed_count) <= num_of_request):
-                return response_time
+    def get_current_response_time_percentiles(self, percents):
+        """
+        Get the response times that a certain number of percent of the requests 
+        made during the last CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW seconds finished within.
+        
+        Percents specified in range: 0.0 - 1.0
+        """
+        if self.stats.last_request_timestamp is None:
+            return [0 for p in percents]
+        return self.current_response_times.get_values_at_percentiles(percents, self.stats.last_request_timestamp)
 
     def percentile(self, tpl=" %-" + str(STATS_NAME_WIDTH) + "s %8d %6d %6d %6d %6d %6d %6d %6d %6d %6d"):
         if not self.num_requests:
             raise ValueError("Can't calculate percentile on url with no successful requests")
         
-        return tpl % (
-            str(self.method) + " " + self.name,
-            self.num_requests,
-            self.get_response_time_percentile(0.5),
-            self.get_response_time_percentile(0.66),
-            self.get_response_time_percentile(0.75),
-            self.get_response_time_percentile(0.80),
-            self.get_response_time_percentile(0.90),
-            self.get_response_time_percentile(0.95),
-            self.get_response_time_percentile(0.98),
-            self.get_response_time_percentile(0.99),
-            self.max_response_time
+        return tpl % tuple(
+            [str(self.method) + " " + self.name, self.num_requests] + 
+            self.response_times.get_values_at_percentiles(PERCENTILES_TO_REPORT) + 
+            [self.max_response_time]
         )
 
 class StatsError(object):
@@ -394,19 +593,130 @@ class StatsError(object):
         )
 
 
-def avg(values):
-    return sum(values, 0.0) / max(len(values), 1)
+class ColumnarReportEncoder(object):
+    """
+    Encodes the stats entries of a slave node into the columnar (version 3) report format 
+    described in locust.rpc.protocol.
+    
+    The encoder keeps track of which entry names it has already sent, so each name is only 
+    sent once. Nodes that send their reports to more than one destination use add_names() 
+    and mark_sent() to make sure that each destination gets the names it needs.
+    """
+    
+    def __init__(self):
+        self.ids = {}
+        self.names = {}
+        # the ids whose names have been sent to each destination, see add_names()
+        self.sent_ids = {}
+    
+    def add_names(self, data, destination):
+        """
+        Add the names of the entries in the report *data* that haven't been sent to 
+        *destination* yet
+        """
+        sent_ids = self.sent_ids.get(destination, ())
+        for entry_id in unpack_array(dict(COLUMNAR_STATS_COLUMNS)["ids"], data["columns"]["ids"]):
+            if entry_id not in sent_ids:
+                data["names"][entry_id] = self.names[entry_id]
+    
+    def mark_sent(self, data, destination):
+        """
+        Record that the names in the report *data* have been sent to *destination*
+        """
+        self.sent_ids.setdefault(destination, set()).update(data["names"])
+    
+    def encode(self, entries):
+        """
+        Return a report dict with the changes of *entries* since the last report, and clear 
+        the entries
+        """
+        names = {}
+        columns = dict((name, []) for name, typecode in COLUMNAR_STATS_COLUMNS)
+        for entry in entries:
+            key = (entry.name, entry.method)
+            entry_id = self.ids.get(key)
+            if entry_id is None:
+                entry_id = self.ids[key] = len(self.ids)
+                names[entry_id] = self.names[entry_id] = [entry.name, entry.method]
+            
+            (_, _, start_time, last_request_timestamp, num_requests, num_failures, total_response_time, 
+                min_response_time, max_response_time, total_content_length, response_times, 
+                num_reqs_per_sec, current_response_times) = entry.get_delta_report()
+            
+            columns["ids"].append(entry_id)
+            columns["start_time"].append(start_time)
+            columns["last_request_timestamp"].append(last_request_timestamp)
+            columns["num_requests"].append(num_requests)
+            columns["num_failures"].append(num_failures)
+            columns["total_response_time"].append(total_response_time)
+            columns["min_response_time"].append(float("nan") if min_response_time is None else min_response_time)
+            columns["max_response_time"].append(max_response_time)
+            columns["total_content_length"].append(total_content_length)
+            columns["response_times_lengths"].append(len(response_times))
+            columns["response_times"].extend(response_times)
+            columns["num_reqs_per_sec_lengths"].append(len(num_reqs_per_sec))
+            columns["num_reqs_per_sec"].extend(num_reqs_per_sec)
+            columns["current_response_times_lengths"].append(len(current_response_times))
+            columns["current_response_times"].extend(current_response_times)
+        
+        return {
+            "stats_version": STATS_REPORT_COLUMNAR_VERSION,
+            "histogram_layout": [DEFAULT_SIGNIFICANT_DIGITS, DEFAULT_HIGHEST_TRACKABLE_VALUE],
+            "names": names,
+            "columns": dict((name, pack_array(typecode, columns[name])) for name, typecode in COLUMNAR_STATS_COLUMNS),
+        }
 
-def median_from_dict(total, count):
+
+class ColumnarReportDecoder(object):
     """
-    total is the number of requests made
-    count is a dict {response_time: count}
+    Applies columnar (version 3) reports from one slave node to a RequestStats instance. 
+    The columns are unpacked into arrays, and applied to the stats entries in place.
     """
-    pos = (total - 1) / 2
-    for k in sorted(six.iterkeys(count)):
-        if pos < count[k]:
-            return k
-        pos -= count[k]
+    
+    def __init__(self):
+        self.names = {}
+    
+    def apply(self, stats, data):
+        self.names.update(data["names"])
+        layout = data.get("histogram_layout")
+        columns = dict((name, unpack_array(typecode, data["columns"][name])) for name, typecode in COLUMNAR_STATS_COLUMNS)
+        
+        response_times_offset = num_reqs_per_sec_offset = current_response_times_offset = 0
+        for i, entry_id in enumerate(columns["ids"]):
+            response_times_end = response_times_offset + columns["response_times_lengths"][i]
+            num_reqs_per_sec_end = num_reqs_per_sec_offset + columns["num_reqs_per_sec_lengths"][i]
+            current_response_times_end = current_response_times_offset + columns["current_response_times_lengths"][i]
+            
+            if entry_id not in self.names:
+                logger.warning("Discarded stats for unknown entry id %s", entry_id)
+            else:
+                name, method = self.names[entry_id]
+                min_response_time = columns["min_response_time"][i]
+                entry = stats.get(name, method)
+                entry.apply_delta((
+                    name,
+                    method,
+                    columns["start_time"][i],
+                    columns["last_request_timestamp"][i],
+                    columns["num_requests"][i],
+                    columns["num_failures"][i],
+                    columns["total_response_time"][i],
+                    None if min_response_time != min_response_time else min_response_time,
+                    columns["max_response_time"][i],
+                    columns["total_content_length"][i],
+                    columns["response_times"][response_times_offset:response_times_end],
+                    columns["num_reqs_per_sec"][num_reqs_per_sec_offset:num_reqs_per_sec_end],
+                    columns["current_response_times"][current_response_times_offset:current_response_times_end],
+                ), layout)
+                stats.last_request_timestamp = max(stats.last_request_timestamp or 0, entry.last_request_timestamp)
+            
+            response_times_offset = response_times_end
+            num_reqs_per_sec_offset = num_reqs_per_sec_end
+            current_response_times_offset = current_response_times_end
+
+
+def avg(values):
+    return sum(values, 0.0) / max(len(values), 1)
 
 
 global_stats = RequestStats()
@@ -414,6 +724,15 @@ global_stats = RequestStats()
 A global instance for holding the statistics. Should be removed eventually.
 """
 
+report_encoder = None
+"""
+Set to a ColumnarReportEncoder instance on slave nodes that should send their stats 
+in the columnar report format
+"""
+
+_report_decoders = {}
+"""ColumnarReportDecoder instances for the slave nodes that send columnar reports"""
+
 def on_request_success(request_type, name, response_time, response_length):
     if global_stats.max_requests is not None and (global_stats.num_requests + global_stats.num_failures) >= global_stats.max_requests:
         raise StopLocust("Maximum number of requests reached")
@@ -424,12 +743,159 @@ def on_request_failure(request_type, name, response_time, exception):
         raise StopLocust("Maximum number of requests reached")
     global_stats.get(name, request_type).log_error(exception)
 
+class RequestEventBuffer(object):
+    """
+    Ring buffer that requests are recorded in, instead of being logged to a RequestStats 
+    instance directly from the request_success and request_failure event listeners.
+
+    Each request is stored as a compact record (the id of its stats entry, the response time, 
+    the content length and the second it was made in) in preallocated arrays. The records are 
+    applied to the stats in batches by :py:meth:`flush`, which is called periodically from 
+    a separate greenlet, and before the stats are read for reports. If the buffer fills up, 
+    it's flushed right away from the listener.
+    """
+    def __init__(self, stats, capacity=REQUEST_BUFFER_SIZE):
+        self.stats = stats
+        self.capacity = capacity
+        self.entry_ids = array("l", [0]) * capacity
+        self.response_times = array("d", [0]) * capacity
+        self.content_lengths = array("d", [0]) * capacity
+        self.seconds = array("l", [0]) * capacity
+        # the exception for failed requests, and None for successful ones
+        self.errors = [None] * capacity
+        # total number of records that have been written and applied
+        self.head = 0
+        self.tail = 0
+        self._ids = {}
+        self._keys = []
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def _entry_id(self, name, method):
+        key = (name, method)
+        entry_id = self._ids.get(key)
+        if entry_id is None:
+            entry_id = self._ids[key] = len(self._keys)
+            self._keys.append(key)
+        return entry_id
+
+    def _append(self, name, method, response_time, content_length, error):
+        if self.head - self.tail >= self.capacity:
+            self.flush()
+        i = self.head % self.capacity
+        self.entry_ids[i] = self._entry_id(name, method)
+        self.response_times[i] = response_time
+        self.content_lengths[i] = content_length
+        self.seconds[i] = int(time.time())
+        self.errors[i] = error
+        self.head += 1
+
+    def _check_max_requests(self):
+        stats = self.stats
+        if stats.max_requests is not None and (stats.num_requests + stats.num_failures + len(self)) >= stats.max_requests:
+            raise StopLocust("Maximum number of requests reached")
+
+    def on_request_success(self, request_type, name, response_time, response_length):
+        self._check_max_requests()
+        self._append(name, request_type, response_time, response_length, None)
+
+    def on_request_failure(self, request_type, name, response_time, exception):
+        self._check_max_requests()
+        self._append(name, request_type, response_time, 0, exception)
+
+    def flush(self):
+        """
+        Apply all the buffered requests to the stats
+        """
+        head, tail = self.head, self.tail
+        if head == tail:
+            return
+        stats_get = self.stats.get
+        keys = self._keys
+        entries = {}
+        entry_ids, response_times, content_lengths, seconds, errors = \
+            self.entry_ids, self.response_times, self.content_lengths, self.seconds, self.errors
+        for n in xrange(tail, head):
+            i = n % self.capacity
+            entry_id = entry_ids[i]
+            entry = entries.get(entry_id)
+            if entry is None:
+                entry = entries[entry_id] = stats_get(*keys[entry_id])
+            error = errors[i]
+            if error is None:
+                response_time = response_times[i]
+                if response_time.is_integer():
+                    response_time = int(response_time)
+                entry.log(response_time, int(content_lengths[i]), seconds[i])
+            else:
+                errors[i] = None
+                entry.log_error(error)
+        self.tail = head
+
+    def consumer(self):
+        while True:
+            gevent.sleep(REQUEST_BUFFER_FLUSH_INTERVAL)
+            self.flush()
+
+
+request_buffer = None
+"""The RequestEventBuffer that requests are recorded in, if buffered stats have been enabled"""
+
+def enable_request_buffer(capacity=REQUEST_BUFFER_SIZE):
+    """
+    Record requests in a RequestEventBuffer, which is applied to global_stats in batches by a 
+    separate greenlet, rather than logging them to global_stats from within the request events.
+    """
+    global request_buffer
+    if request_buffer is not None:
+        return request_buffer
+    request_buffer = RequestEventBuffer(global_stats, capacity)
+    events.request_success -= on_request_success
+    events.request_failure -= on_request_failure
+    events.request_success.add_fast_listener(request_buffer.on_request_success)
+    events.request_failure.add_fast_listener(request_buffer.on_request_failure)
+    # make sure that the stats are up to date when they're reset, and before shutting down
+    events.hatch_complete += lambda user_count: request_buffer.flush()
+    events.quitting += request_buffer.flush
+    gevent.spawn(request_buffer.consumer)
+    return request_buffer
+
 def on_report_to_master(client_id, data):
-    data["stats"] = [global_stats.entries[key].get_stripped_report() for key in six.iterkeys(global_stats.entries) if not (global_stats.entries[key].num_requests == 0 and global_stats.entries[key].num_failures == 0)]
+    if request_buffer is not None:
+        request_buffer.flush()
+    entries = [entry for entry in six.itervalues(global_stats.entries) if not (entry.num_requests == 0 and entry.num_failures == 0)]
+    if report_encoder is not None:
+        data.update(report_encoder.encode(entries))
+    else:
+        data["stats_version"] = STATS_REPORT_VERSION
+        data["histogram_layout"] = [DEFAULT_SIGNIFICANT_DIGITS, DEFAULT_HIGHEST_TRACKABLE_VALUE]
+        data["stats"] = [entry.get_delta_report() for entry in entries]
     data["errors"] =  dict([(k, e.to_dict()) for k, e in six.iteritems(global_stats.errors)])
     global_stats.errors = {}
 
 def on_slave_report(client_id, data):
+    if data.get("stats_version") == STATS_REPORT_VERSION:
+        _apply_delta_report(data)
+    elif data.get("stats_version") == STATS_REPORT_COLUMNAR_VERSION:
+        _report_decoders.setdefault(client_id, ColumnarReportDecoder()).apply(global_stats, data)
+    else:
+        _apply_legacy_report(data)
+
+    for error_key, error in six.iteritems(data["errors"]):
+        if error_key not in global_stats.errors:
+            global_stats.errors[error_key] = StatsError.from_dict(error)
+        else:
+            global_stats.errors[error_key].occurences += error["occurences"]
+
+def _apply_delta_report(data):
+    layout = data.get("histogram_layout")
+    for delta in data["stats"]:
+        entry = global_stats.get(delta[0], delta[1])
+        entry.apply_delta(delta, layout)
+        global_stats.last_request_timestamp = max(global_stats.last_request_timestamp or 0, entry.last_request_timestamp)
+
+def _apply_legacy_report(data):
     for stats_data in data["stats"]:
         entry = StatsEntry.unserialize(stats_data)
         request_key = (entry.name, entry.method)
@@ -438,14 +904,8 @@ def on_slave_report(client_id, data):
         global_stats.entries[request_key].extend(entry, full_request_history=True)
         global_stats.last_request_timestamp = max(global_stats.last_request_timestamp or 0, entry.last_request_timestamp)
 
-    for error_key, error in six.iteritems(data["errors"]):
-        if error_key not in global_stats.errors:
-            global_stats.errors[error_key] = StatsError.from_dict(error)
-        else:
-            global_stats.errors[error_key].occurences += error["occurences"]
-
-events.request_success += on_request_success
-events.request_failure += on_request_failure
+events.request_success.add_fast_listener(on_request_success)
+events.request_failure.add_fast_listener(on_request_failure)
 events.report_to_master += on_report_to_master
 events.slave_report += on_slave_report
 
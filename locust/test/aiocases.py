@@ -0,0 +1,205 @@
+import sys
+import asyncio
+import unittest
+
+from locust import events
+from locust.main import parse_options
+from locust.rpc import Message
+from locust.stats import global_stats
+from locust.exception import StopLocust
+from locust.test.testcases import LocustTestCase
+from locust.aio import AsyncLocust, AsyncTaskSet, AsyncLocustRunner, AsyncSlaveLocustRunner
+
+
+class MockedAsyncRpcClient(object):
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.outbox = []
+
+    async def connect(self):
+        pass
+
+    async def send(self, message):
+        self.outbox.append(message)
+
+    async def recv(self):
+        return await self.queue.get()
+
+    def close(self):
+        pass
+
+
+class TestAsyncTaskSet(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_coroutine_tasks(self):
+        calls = []
+
+        class MyTaskSet(AsyncTaskSet):
+            async def on_start(self):
+                calls.append("on_start")
+
+            async def my_task(self):
+                await asyncio.sleep(0)
+                calls.append("my_task")
+                if len(calls) == 3:
+                    raise StopLocust()
+
+            def sync_task(self):
+                calls.append("sync_task")
+            tasks = [my_task]
+
+        class MyLocust(AsyncLocust):
+            task_set = MyTaskSet
+            min_wait = 0
+            max_wait = 0
+
+        self.loop.run_until_complete(MyLocust().run())
+        self.assertEqual(["on_start", "my_task", "my_task"], calls)
+
+    def test_nested_taskset_and_interrupt(self):
+        calls = []
+
+        class SubTaskSet(AsyncTaskSet):
+            async def sub_task(self):
+                calls.append("sub_task")
+                self.interrupt()
+            tasks = [sub_task]
+
+        class MyTaskSet(AsyncTaskSet):
+            def my_task(self):
+                calls.append("my_task")
+                if len(calls) > 2:
+                    raise StopLocust()
+                self.schedule_task(SubTaskSet)
+            tasks = [my_task]
+
+        class MyLocust(AsyncLocust):
+            task_set = MyTaskSet
+            min_wait = 0
+            max_wait = 0
+
+        self.loop.run_until_complete(MyLocust().run())
+        self.assertEqual(["my_task", "sub_task", "my_task"], calls)
+
+    def test_exception_in_task_fires_locust_error(self):
+        errors = []
+
+        class MyTaskSet(AsyncTaskSet):
+            async def my_task(self):
+                if errors:
+                    raise StopLocust()
+                raise ValueError("oops")
+            tasks = [my_task]
+
+        class MyLocust(AsyncLocust):
+            task_set = MyTaskSet
+            min_wait = 0
+            max_wait = 0
+            _catch_exceptions = True
+
+        def on_locust_error(locust_instance, exception, tb):
+            errors.append(exception)
+        events.locust_error += on_locust_error
+        try:
+            stderr = sys.stderr
+            sys.stderr = open("/dev/null", "w")
+            try:
+                self.loop.run_until_complete(MyLocust().run())
+            finally:
+                sys.stderr.close()
+                sys.stderr = stderr
+        finally:
+            events.locust_error -= on_locust_error
+        self.assertEqual(1, len(errors))
+        self.assertTrue(isinstance(errors[0], ValueError))
+
+
+class TestAsyncLocustRunner(LocustTestCase):
+    def setUp(self):
+        super(TestAsyncLocustRunner, self).setUp()
+        global_stats.reset_all()
+        self._hatch_complete_handlers = list(events.hatch_complete._handlers)
+        self._report_to_master_handlers = list(events.report_to_master._handlers)
+        self._locust_error_handlers = list(events.locust_error._handlers)
+        parser, _, _ = parse_options()
+        self.options, _ = parser.parse_args(["--slave"])
+
+    def tearDown(self):
+        super(TestAsyncLocustRunner, self).tearDown()
+        events.hatch_complete._handlers = self._hatch_complete_handlers
+        events.report_to_master._handlers = self._report_to_master_handlers
+        events.locust_error._handlers = self._locust_error_handlers
+
+    def locust_classes(self):
+        class MyTaskSet(AsyncTaskSet):
+            async def my_task(self):
+                events.request_success.fire(request_type="GET", name="/", response_time=10, response_length=0)
+            tasks = [my_task]
+
+        class User1(AsyncLocust):
+            task_set = MyTaskSet
+            weight = 3
+            min_wait = 10
+            max_wait = 10
+
+        class User2(AsyncLocust):
+            task_set = MyTaskSet
+            weight = 1
+            min_wait = 10
+            max_wait = 10
+        return [User1, User2]
+
+    def test_hatch_and_kill(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = AsyncLocustRunner(self.locust_classes(), self.options)
+
+        async def run():
+            await runner.start_hatching(40, 1000)
+            self.assertEqual(40, runner.user_count)
+            self.assertEqual("running", runner.state)
+            await asyncio.sleep(0.05)
+            self.assertTrue(global_stats.get("/", "GET").num_requests > 0)
+            await runner.start_hatching(20)
+            self.assertEqual(20, runner.user_count)
+            self.assertEqual(15, len(runner.live_locusts[runner.locust_classes[0]]))
+            await runner.stop()
+            self.assertEqual(0, runner.user_count)
+            self.assertEqual("stopped", runner.state)
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+    def test_slave(self):
+        runner = AsyncSlaveLocustRunner(self.locust_classes(), self.options)
+        client = runner.client = MockedAsyncRpcClient()
+
+        async def master():
+            await asyncio.sleep(0.01)
+            await client.queue.put(Message("hatch", {
+                "hatch_rate": 1000, "num_clients": 8, "num_requests": None, "host": None, "stop_timeout": None,
+            }, None))
+            await asyncio.sleep(0.05)
+            self.assertEqual(8, runner.user_count)
+            await client.queue.put(Message("quit", None, None))
+        try:
+            runner.loop.run_until_complete(asyncio.gather(runner.run(), master()))
+        finally:
+            runner.loop.close()
+
+        types = [msg.type for msg in client.outbox]
+        self.assertEqual("client_ready", types[0])
+        self.assertEqual("quit", types[-1])
+        self.assertTrue("heartbeat" in types)
+        self.assertTrue("stats" in types)
+        hatch_complete = [msg for msg in client.outbox if msg.type == "hatch_complete"]
+        self.assertEqual(8, hatch_complete[0].data["count"])
+        self.assertTrue(all(msg.node_id == runner.client_id for msg in client.outbox))
+        self.assertEqual(0, runner.user_count)
@@ -0,0 +1,5 @@
+import sys
+
+if sys.version_info >= (3, 5):
+    # the tests of the asyncio backend use async/await, which older Python versions can't parse
+    from locust.test.aiocases import TestAsyncTaskSet, TestAsyncLocustRunner
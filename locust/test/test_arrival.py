@@ -0,0 +1,92 @@
+import unittest
+from time import time
+
+import gevent
+import mock
+
+from locust.arrival import ArrivalScheduler
+from locust.core import Locust, TaskSet, task
+from locust.main import parse_options
+from locust.runners import LocalLocustRunner
+from locust.test.testcases import LocustTestCase
+
+
+class TestArrivalScheduler(unittest.TestCase):
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, ArrivalScheduler, 0)
+        self.assertRaises(ValueError, ArrivalScheduler, 10, distribution="gaussian")
+
+    def test_fixed_rate(self):
+        scheduler = ArrivalScheduler(100)
+        start = time()
+        for i in range(11):
+            scheduler.wait()
+        self.assertAlmostEqual(0.1, time() - start, delta=0.05)
+        self.assertEqual(11, scheduler.num_arrivals)
+
+    def test_shared_between_greenlets(self):
+        scheduler = ArrivalScheduler(100)
+        start = time()
+        gevent.joinall([gevent.spawn(scheduler.wait) for i in range(11)])
+        self.assertAlmostEqual(0.1, time() - start, delta=0.05)
+        self.assertEqual(0, scheduler.waiting)
+
+    def test_poisson_intervals(self):
+        scheduler = ArrivalScheduler(10, distribution="poisson")
+        intervals = [scheduler.interval() for i in range(10000)]
+        self.assertAlmostEqual(0.1, sum(intervals) / len(intervals), delta=0.01)
+        self.assertNotEqual(intervals[0], intervals[1])
+
+    def test_schedule_lag(self):
+        scheduler = ArrivalScheduler(10)
+        scheduler.next_arrival = time() - 0.5
+        lag = scheduler.wait()
+        self.assertAlmostEqual(0.5, lag, delta=0.05)
+        self.assertAlmostEqual(0.5, scheduler.pop_lag(), delta=0.05)
+        self.assertEqual(0.0, scheduler.pop_lag())
+        self.assertEqual(0, scheduler.num_dropped)
+
+    def test_backlog_is_dropped(self):
+        scheduler = ArrivalScheduler(10, max_backlog=1.0)
+        scheduler.next_arrival = time() - 3.0
+        lag = scheduler.wait()
+        self.assertAlmostEqual(1.0, lag, delta=0.05)
+        self.assertEqual(20, scheduler.num_dropped)
+
+
+class TestArrivalRateRunner(LocustTestCase):
+    def setUp(self):
+        super(TestArrivalRateRunner, self).setUp()
+        parser, _, _ = parse_options()
+        self.options, _ = parser.parse_args(["--clients", "1", "--hatch-rate", "100", "--arrival-rate", "50", "--max-clients", "4"])
+
+    def test_tasks_are_paced(self):
+        class MyLocust(Locust):
+            count = 0
+            class task_set(TaskSet):
+                @task
+                def t(self):
+                    MyLocust.count += 1
+
+        runner = LocalLocustRunner([MyLocust], self.options)
+        runner.start_hatching()
+        gevent.sleep(0.5)
+        self.assertEqual(1, runner.user_count)
+        runner.stop()
+        self.assertTrue(20 <= MyLocust.count <= 30, "Expected about 25 tasks, got %i" % MyLocust.count)
+
+    def test_clients_are_added_to_keep_up(self):
+        class MyLocust(Locust):
+            class task_set(TaskSet):
+                @task
+                def slow(self):
+                    gevent.sleep(0.05)
+
+        with mock.patch("locust.runners.ARRIVAL_CHECK_INTERVAL", new=0.1):
+            runner = LocalLocustRunner([MyLocust], self.options)
+            runner.start_hatching()
+            gevent.sleep(1.0)
+            self.assertEqual(4, runner.num_clients)
+            self.assertEqual(4, len(runner.locusts))
+            self.assertTrue(runner.schedule_lag > 0)
+            runner.stop()
@@ -0,0 +1,67 @@
+import unittest
+
+from locust.events import EventHook
+
+
+class TestEventHook(unittest.TestCase):
+    def setUp(self):
+        self.hook = EventHook(("a", "b"))
+        self.calls = []
+    
+    def on_keyword(self, a, b):
+        self.calls.append(("keyword", a, b))
+    
+    def on_fast(self, a, b):
+        self.calls.append(("fast", a, b))
+    
+    def test_fire_without_listeners(self):
+        self.hook.fire(a=1, b=2)
+        self.hook.fire_fast(1, 2)
+        self.assertFalse(self.hook.has_listeners)
+    
+    def test_fire(self):
+        self.hook += self.on_keyword
+        self.hook.add_fast_listener(self.on_fast)
+        self.hook.fire(a=1, b=2)
+        self.hook.fire_fast(3, 4)
+        self.assertEqual([
+            ("keyword", 1, 2), ("fast", 1, 2),
+            ("keyword", 3, 4), ("fast", 3, 4),
+        ], self.calls)
+    
+    def test_remove_listener(self):
+        self.hook += self.on_keyword
+        self.hook.add_fast_listener(self.on_fast)
+        self.hook -= self.on_fast
+        self.hook -= self.on_keyword
+        self.hook.fire(a=1, b=2)
+        self.assertEqual([], self.calls)
+        self.assertFalse(self.hook.has_listeners)
+    
+    def test_restore_handlers(self):
+        self.hook.add_fast_listener(self.on_fast)
+        handlers = list(self.hook._handlers)
+        self.hook += self.on_keyword
+        self.hook._handlers = handlers
+        self.hook.fire_fast(1, 2)
+        self.assertEqual([("fast", 1, 2)], self.calls)
+    
+    def test_fast_listener_requires_arg_names(self):
+        self.assertRaises(ValueError, lambda: EventHook().add_fast_listener(self.on_fast))
+    
+    def test_timing(self):
+        self.hook += self.on_keyword
+        self.hook.enable_timing()
+        self.hook.add_fast_listener(self.on_fast)
+        self.hook.fire_fast(1, 2)
+        self.hook.fire_fast(1, 2)
+        self.assertEqual(4, len(self.calls))
+        self.assertEqual(2, len(self.hook.timings))
+        for calls, seconds in self.hook.timings.values():
+            self.assertEqual(2, calls)
+            self.assertTrue(seconds >= 0)
+        
+        self.hook.disable_timing()
+        self.assertEqual(None, self.hook.timings)
+        self.hook.fire_fast(1, 2)
+        self.assertEqual(6, len(self.calls))
@@ -1,5 +1,6 @@
 import unittest
 import six
+import mock
 
 from locust.core import HttpLocust, Locust, TaskSet, task, events
 from locust import ResponseError, InterruptTaskSet
@@ -23,11 +24,57 @@ class TestTaskSet(LocustTestCase):
         
         l = MyTasks(self.locust)
 
-        t1_count = len([t for t in l.tasks if t == t1])
-        t2_count = len([t for t in l.tasks if t == t2])
-
-        self.assertEqual(t1_count, 5)
-        self.assertEqual(t2_count, 2)
+        weights = dict(l.task_table.items())
+        self.assertEqual(weights[t1], 5)
+        self.assertEqual(weights[t2], 2)
+        self.assertEqual(2, len(l.tasks))
+    
+    def test_task_float_ratio(self):
+        t1 = lambda l: None
+        t2 = lambda l: None
+        class MyTasks(TaskSet):
+            tasks = [(t1, 0.25), (t2, 0.75)]
+        
+        self.assertEqual([(t1, 0.25), (t2, 0.75)], MyTasks.task_table.ratios())
+        with mock.patch("random.random", return_value=0.2):
+            self.assertEqual(t1, MyTasks(self.locust).get_next_task())
+        with mock.patch("random.random", return_value=0.3):
+            self.assertEqual(t2, MyTasks(self.locust).get_next_task())
+        with mock.patch("random.random", return_value=0.9999999999999999):
+            self.assertEqual(t2, MyTasks(self.locust).get_next_task())
+    
+    def test_tasks_changed_after_class_creation(self):
+        t1 = lambda l: None
+        t2 = lambda l: None
+        class MyTasks(TaskSet):
+            tasks = [t1]
+        
+        l = MyTasks(self.locust)
+        l.tasks = [t2]
+        self.assertEqual(t2, l.get_next_task())
+    
+    def test_tasks_appended_after_class_creation(self):
+        t1 = lambda l: None
+        t2 = lambda l: None
+        class MyTasks(TaskSet):
+            tasks = {t1: 9}
+        
+        MyTasks.tasks.append(t2)
+        with mock.patch("random.random", return_value=0.85):
+            self.assertEqual(t1, MyTasks(self.locust).get_next_task())
+        with mock.patch("random.random", return_value=0.95):
+            self.assertEqual(t2, MyTasks(self.locust).get_next_task())
+        # t1 keeps its weight, and the rebuilt table is used by all instances of the class
+        self.assertEqual([(t1, 9), (t2, 1)], MyTasks.task_table.items())
+    
+    def test_tasks_replaced_after_class_creation(self):
+        t1 = lambda l: None
+        t2 = lambda l: None
+        class MyTasks(TaskSet):
+            tasks = [t1]
+        
+        MyTasks.tasks[0] = t2
+        self.assertEqual(t2, MyTasks(self.locust).get_next_task())
     
     def test_task_decorator_ratio(self):
         t1 = lambda l: None
@@ -47,15 +94,12 @@ class TestTaskSet(LocustTestCase):
 
         l = MyTasks(self.locust)
 
-        t1_count = len([t for t in l.tasks if t == t1])
-        t2_count = len([t for t in l.tasks if t == t2])
-        t3_count = len([t for t in l.tasks if t.__name__ == MyTasks.t3.__name__])
-        t4_count = len([t for t in l.tasks if t.__name__ == MyTasks.t4.__name__])
+        weights = dict(l.task_table.items())
 
-        self.assertEqual(t1_count, 5)
-        self.assertEqual(t2_count, 2)
-        self.assertEqual(t3_count, 3)
-        self.assertEqual(t4_count, 13)
+        self.assertEqual(weights[t1], 5)
+        self.assertEqual(weights[t2], 2)
+        self.assertEqual(weights[six.get_unbound_function(MyTasks.t3)], 3)
+        self.assertEqual(weights[six.get_unbound_function(MyTasks.t4)], 13)
 
     def test_on_start(self):
         class MyTasks(TaskSet):
@@ -174,7 +218,8 @@ class TestTaskSet(LocustTestCase):
             def t1(self):
                 pass
         taskset = MyTaskSet3(self.locust)
-        self.assertEqual(len(taskset.tasks), 3)
+        self.assertEqual(len(taskset.tasks), 1)
+        self.assertEqual([3], taskset.task_table.weights)
     
     def test_sub_taskset(self):
         class MySubTaskSet(TaskSet):
@@ -289,7 +334,44 @@ class TestTaskSet(LocustTestCase):
         self.assertRaises(RescheduleTaskImmediately, lambda: task_set.run(reschedule=True))
         self.assertRaises(RescheduleTask, lambda: task_set.run(reschedule=False))
 
-    
+    def test_pacing(self):
+        from locust.exception import StopLocust
+        import gevent
+        durations = [0.03, 0.07, 0.15]
+        sleeps = []
+
+        class MyTaskSet(TaskSet):
+            def _sleep(self, seconds):
+                sleeps.append(seconds)
+
+            @task
+            def t(self):
+                if not durations:
+                    raise StopLocust()
+                gevent.sleep(durations.pop(0))
+
+        class MyLocust(Locust):
+            host = ""
+            task_set = MyTaskSet
+            pacing = 100
+
+        MyLocust().run()
+        self.assertEqual(3, len(sleeps))
+        self.assertAlmostEqual(0.07, sleeps[0], delta=0.02)
+        self.assertAlmostEqual(0.03, sleeps[1], delta=0.02)
+        # the task took longer than the pacing interval
+        self.assertEqual(0, sleeps[2])
+
+    def test_pacing_overridden_in_taskset(self):
+        class MyTaskSet(TaskSet):
+            pacing = 500
+
+        class MyLocust(Locust):
+            pacing = 2000
+
+        self.assertEqual(500, MyTaskSet(MyLocust()).pacing)
+        self.assertEqual(2000, TaskSet(MyLocust()).pacing)
+
     def test_parent_attribute(self):
         from locust.exception import StopLocust
         parents = {}
@@ -27,3 +27,15 @@ class TestTaskSet(LocustTestCase):
             pass
         
         self.assertFalse(main.is_locust(("ThriftLocust", ThriftLocust)))
+
+    def test_is_load_shape(self):
+        from locust.shape import LoadShape, StepLoadShape
+        self.assertFalse(main.is_load_shape(("LoadShape", LoadShape)))
+        self.assertFalse(main.is_load_shape(("StepLoadShape", StepLoadShape)))
+        self.assertFalse(main.is_load_shape(("MyLocust", Locust)))
+        
+        class MyShape(StepLoadShape):
+            step_clients = 5
+        
+        self.assertTrue(main.is_load_shape(("MyShape", MyShape)))
+        self.assertFalse(main.is_load_shape(("_MyShape", MyShape)))
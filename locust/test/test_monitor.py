@@ -0,0 +1,83 @@
+import time
+import unittest
+
+import gevent
+import mock
+
+from locust.core import Locust, TaskSet, task
+from locust.main import parse_options
+from locust.monitor import LoopMonitor
+from locust.runners import LocalLocustRunner
+from locust.test.testcases import LocustTestCase
+
+
+class TestLoopMonitor(unittest.TestCase):
+    def test_no_lag(self):
+        monitor = LoopMonitor(interval=0.01)
+        self.assertEqual(0.0, monitor.lag)
+        monitor.start()
+        gevent.sleep(0.1)
+        monitor.stop()
+        self.assertTrue(len(monitor.lags) > 0)
+        self.assertTrue(monitor.lag < 0.05)
+
+    def test_blocked_loop(self):
+        monitor = LoopMonitor(interval=0.01)
+        monitor.start()
+        gevent.sleep(0.02)
+        with mock.patch("locust.monitor.logger") as logger:
+            # block the event loop without yielding to the monitor (time.sleep() is monkey patched)
+            start = time.time()
+            while time.time() - start < 0.2:
+                pass
+            gevent.sleep(0.02)
+            monitor.stop()
+            self.assertTrue(monitor.lag >= 0.15)
+            self.assertEqual(1, logger.warning.call_count)
+
+    def test_warnings_are_rate_limited(self):
+        monitor = LoopMonitor()
+        with mock.patch("locust.monitor.logger") as logger:
+            monitor.record(0.5)
+            monitor.record(0.5)
+            self.assertEqual(1, logger.warning.call_count)
+        self.assertEqual(0.5, monitor.lag)
+
+    def test_lag_window(self):
+        monitor = LoopMonitor(interval=1.0)
+        with mock.patch("locust.monitor.logger"):
+            monitor.record(0.5)
+        # the lag is the maximum over the last few seconds
+        for i in range(3):
+            monitor.record(0.001)
+        self.assertEqual(0.001, monitor.lag)
+
+    def test_cpu_usage(self):
+        monitor = LoopMonitor()
+        with mock.patch("locust.monitor.CPU_SAMPLE_INTERVAL", new=0):
+            start = time.time()
+            while time.time() - start < 0.1:
+                pass
+            monitor.record(0.0)
+        self.assertTrue(monitor.cpu_usage > 0)
+
+
+class TestLocalRunnerLoopMonitor(LocustTestCase):
+    def test_monitor_runs_while_hatched(self):
+        class MyTaskSet(TaskSet):
+            @task
+            def my_task(self):
+                gevent.sleep(1)
+
+        class MyTestLocust(Locust):
+            task_set = MyTaskSet
+            min_wait = max_wait = 0
+
+        options = parse_options()[0].parse_args([])[0]
+        runner = LocalLocustRunner([MyTestLocust], options)
+        self.assertEqual(None, runner.loop_monitor.greenlet)
+        runner.start_hatching(2, 100)
+        gevent.sleep(0.2)
+        self.assertTrue(len(runner.loop_monitor.lags) > 0)
+        runner.stop()
+        self.assertEqual(None, runner.loop_monitor.greenlet)
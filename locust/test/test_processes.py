@@ -0,0 +1,79 @@
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+
+import mock
+
+from locust import processes
+from locust.processes import ProcessSupervisor, fork_workers, get_process_count
+from locust.rpc import piperpc, Message
+
+
+class TestGetProcessCount(unittest.TestCase):
+    def test_number(self):
+        self.assertEqual(4, get_process_count("4"))
+    
+    def test_auto(self):
+        with mock.patch("multiprocessing.cpu_count", return_value=12):
+            self.assertEqual(12, get_process_count("auto"))
+    
+    def test_invalid(self):
+        self.assertRaises(ValueError, lambda: get_process_count("many"))
+        self.assertRaises(ValueError, lambda: get_process_count("0"))
+
+
+class TestProcessSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self._sigterm_handler = signal.getsignal(signal.SIGTERM)
+    
+    def tearDown(self):
+        signal.signal(signal.SIGTERM, self._sigterm_handler)
+        shutil.rmtree(self.tmp_dir)
+    
+    def test_restart_crashed_worker(self):
+        with mock.patch.object(processes, "RESTART_DELAY", 0):
+            try:
+                index = ProcessSupervisor(2).run()
+            except SystemExit as e:
+                # only the supervising process gets here, once all workers are done
+                self.assertEqual(0, e.code)
+            else:
+                # worker process
+                marker = os.path.join(self.tmp_dir, str(index))
+                if index == 1 and not os.path.exists(marker):
+                    open(marker, "w").close()
+                    os._exit(1)
+                open(os.path.join(self.tmp_dir, "%i-done" % index), "w").close()
+                os._exit(0)
+        
+        self.assertEqual(["0-done", "1", "1-done"], sorted(os.listdir(self.tmp_dir)))
+
+
+class TestForkWorkers(unittest.TestCase):
+    def test_workers_talk_to_parent(self):
+        def worker(index, sock):
+            client = piperpc.Client(sock)
+            client.send(Message("client_ready", None, "worker-%i" % index))
+            msg = client.recv()
+            client.send(Message("echo", msg.data, "worker-%i" % index))
+        
+        server = piperpc.Server(fork_workers(2, worker))
+        ready = sorted(server.recv().node_id for i in range(2))
+        self.assertEqual(["worker-0", "worker-1"], ready)
+        
+        server.send_to("worker-1", Message("ping", "a", None))
+        server.send_to("worker-0", Message("ping", "b", None))
+        replies = sorted((msg.node_id, msg.data) for msg in (server.recv(), server.recv()))
+        self.assertEqual([("worker-0", "b"), ("worker-1", "a")], replies)
+        
+        os.waitpid(-1, 0)
+        os.waitpid(-1, 0)
+    
+    def test_client_quits_when_parent_goes_away(self):
+        parent_sock, child_sock = processes.socket.socketpair()
+        client = piperpc.Client(child_sock)
+        parent_sock.close()
+        self.assertEqual("quit", client.recv().type)
@@ -1,3 +1,5 @@
+import time
+import socket
 import unittest
 
 import gevent
@@ -6,20 +8,32 @@ import mock
 from gevent.queue import Queue
 from gevent import sleep
 
-from locust.runners import LocalLocustRunner, MasterLocustRunner, SlaveLocustRunner
+from locust.runners import (LocalLocustRunner, MasterLocustRunner, SlaveLocustRunner, RelayLocustRunner, 
+                            ParallelLocalLocustRunner, distribute_clients)
 from locust.core import Locust, task, TaskSet
 from locust.exception import LocustError
 from locust.rpc import Message
 from locust.stats import RequestStats, global_stats
+from locust.rpc.protocol import COLUMNAR_STATS_SUPPORTED
 from locust.main import parse_options
+from locust.sharedstats import SharedReportArea
 from locust.test.testcases import LocustTestCase
-from locust import events
+from locust import events, stats
+
+
+def get_free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
 
 
 def mocked_rpc_server():
     class MockedRpcServer(object):
         queue = Queue()
         outbox = []
+        recipients = []
 
         def __init__(self, host, port):
             pass
@@ -32,14 +46,26 @@ def mocked_rpc_server():
             results = self.queue.get()
             return Message.unserialize(results)
         
-        def send(self, message):
+        def send_to(self, node_id, message):
+            self.outbox.append(message.serialize())
+            self.recipients.append(node_id)
+        
+        def broadcast(self, message):
             self.outbox.append(message.serialize())
+            self.recipients.append(None)
     
     return MockedRpcServer
 
 
+def sent_jobs(server):
+    """ Return a {node_id: data} dict of the hatch jobs that the mocked server has sent """
+    messages = [(node_id, Message.unserialize(msg)) for node_id, msg in zip(server.recipients, server.outbox)]
+    return dict((node_id, msg.data) for node_id, msg in messages if msg.type == "hatch")
+
+
 class TestMasterRunner(LocustTestCase):
     def setUp(self):
+        super(TestMasterRunner, self).setUp()
         global_stats.reset_all()
         self._slave_report_event_handlers = [h for h in events.slave_report._handlers]
 
@@ -52,6 +78,7 @@ class TestMasterRunner(LocustTestCase):
         self.options = opts
         
     def tearDown(self):
+        super(TestMasterRunner, self).tearDown()
         events.slave_report._handlers = self._slave_report_event_handlers
     
     def test_slave_connect(self):
@@ -100,6 +127,29 @@ class TestMasterRunner(LocustTestCase):
             s = master.stats.get("/", "GET")
             self.assertEqual(700, s.median_response_time)
     
+    def test_slave_stats_report_legacy_format(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            server.mocked_send(Message("client_ready", None, "fake_client"))
+            sleep(0)
+            
+            master.stats.get("/", "GET").log(100, 23455)
+            master.stats.get("/", "GET").log(800, 23455)
+            master.stats.get("/", "GET").log(700, 23455)
+            
+            # reports from slaves running an older version doesn't have a stats_version
+            data = {"user_count":1, "errors":{}, "stats":[master.stats.get("/", "GET").serialize()]}
+            master.stats.clear_all()
+            
+            server.mocked_send(Message("stats", data, "fake_client"))
+            sleep(0)
+            s = master.stats.get("/", "GET")
+            self.assertEqual(3, s.num_requests)
+            self.assertEqual(700, s.median_response_time)
+    
     def test_spawn_zero_locusts(self):
         class MyTaskSet(TaskSet):
             @task
@@ -124,6 +174,342 @@ class TestMasterRunner(LocustTestCase):
         finally:
             timeout.cancel()
     
+    def test_hatch_rate(self):
+        class MyTaskSet(TaskSet):
+            @task
+            def my_task(self):
+                pass
+
+        class User1(Locust):
+            task_set = MyTaskSet
+            weight = 3
+
+        class User2(Locust):
+            task_set = MyTaskSet
+            weight = 1
+
+        runner = LocalLocustRunner([User1, User2], self.options)
+        start = time.time()
+        runner.start_hatching(400, 1000)
+        runner.hatching_greenlet.join()
+        elapsed = time.time() - start
+        try:
+            self.assertEqual(400, runner.user_count)
+            self.assertEqual(300, len([g for g in runner.locusts if g.args[0] is User1]))
+            self.assertAlmostEqual(0.4, elapsed, delta=0.1)
+            self.assertAlmostEqual(1000, runner.achieved_hatch_rate, delta=200)
+        finally:
+            runner.stop()
+
+    def test_kill_locusts(self):
+        class MyTaskSet(TaskSet):
+            @task
+            def my_task(self):
+                pass
+
+        class User1(Locust):
+            task_set = MyTaskSet
+            weight = 3
+
+        class User2(Locust):
+            task_set = MyTaskSet
+            weight = 1
+
+        runner = LocalLocustRunner([User1, User2], self.options)
+        runner.start_hatching(40, 1000)
+        runner.hatching_greenlet.join()
+        try:
+            runner.kill_locusts(20)
+            self.assertEqual(20, runner.user_count)
+            self.assertEqual(15, len(runner.live_locusts[User1]))
+            self.assertEqual(5, len(runner.live_locusts[User2]))
+            self.assertEqual(15, len([g for g in runner.locusts if g.args[0] is User1]))
+        finally:
+            runner.stop()
+        self.assertEqual(0, len(runner.live_locusts[User1]))
+
+    def test_kill_locusts_gracefully(self):
+        finished = []
+
+        class MyTaskSet(TaskSet):
+            min_wait = 10000
+            max_wait = 10000
+            @task
+            def my_task(self):
+                gevent.sleep(0.1)
+                finished.append(True)
+
+        class User(Locust):
+            task_set = MyTaskSet
+
+        runner = LocalLocustRunner([User], self.options)
+        runner.start_hatching(2, 1000)
+        runner.hatching_greenlet.join()
+        try:
+            gevent.sleep(0.01)
+            runner.kill_locusts(2, graceful=True)
+            # the locusts are left to finish their current task
+            self.assertEqual(2, runner.user_count)
+            gevent.sleep(0.15)
+            self.assertEqual(2, len(finished))
+            self.assertEqual(0, runner.user_count)
+        finally:
+            runner.stop()
+
+    def test_missing_slave_clients_are_redistributed(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        heartbeat = {"state": "running", "cpu_usage": 12.5, "memory_usage": 1024}
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server, \
+                mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=0.01):
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(3):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+            sleep(0)
+            master.start_hatching(9, 9)
+            for i in range(3):
+                server.mocked_send(Message("hatch_complete", {"count": 3}, "fake_client%i" % i))
+            sleep(0)
+            self.assertEqual(9, master.user_count)
+            del server.outbox[:]
+            del server.recipients[:]
+            
+            # fake_client2 stops sending heartbeats
+            for i in range(10):
+                server.mocked_send(Message("heartbeat", heartbeat, "fake_client0"))
+                server.mocked_send(Message("heartbeat", heartbeat, "fake_client1"))
+                sleep(0.01)
+            self.assertEqual("missing", master.clients["fake_client2"].state)
+            self.assertEqual(12.5, master.clients["fake_client0"].cpu_usage)
+            self.assertEqual(6, master.user_count)
+            jobs = sent_jobs(server)
+            self.assertEqual(["fake_client0", "fake_client1"], sorted(jobs))
+            self.assertEqual(9, sum(job["num_clients"] for job in jobs.values()))
+            
+            # and comes back, still running its clients, so only the other slaves get new jobs
+            del server.outbox[:]
+            del server.recipients[:]
+            server.mocked_send(Message("heartbeat", heartbeat, "fake_client2"))
+            sleep(0)
+            self.assertEqual("running", master.clients["fake_client2"].state)
+            jobs = sent_jobs(server)
+            self.assertEqual(["fake_client0", "fake_client1"], sorted(jobs))
+            self.assertEqual([3, 3], [job["num_clients"] for job in jobs.values()])
+            master.greenlet.kill(block=True)
+    
+    def test_stats_kept_when_missing_slave_clients_are_redistributed(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        heartbeat = {"state": "running", "cpu_usage": 12.5, "memory_usage": 1024}
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server, \
+                mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=0.01):
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(2):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+            sleep(0)
+            master.start_hatching(4, 4)
+            for i in range(2):
+                server.mocked_send(Message("hatch_complete", {"count": 2}, "fake_client%i" % i))
+            sleep(0)
+            self.assertEqual("running", master.state)
+            global_stats.get("/", "GET").log(100, 10)
+            del server.outbox[:]
+            del server.recipients[:]
+            
+            # fake_client1 goes missing, and its clients are moved to fake_client0
+            for i in range(10):
+                server.mocked_send(Message("heartbeat", heartbeat, "fake_client0"))
+                sleep(0.01)
+            self.assertEqual("missing", master.clients["fake_client1"].state)
+            jobs = sent_jobs(server)
+            self.assertEqual(4, jobs["fake_client0"]["num_clients"])
+            self.assertTrue(jobs["fake_client0"]["rebalance"])
+            server.mocked_send(Message("hatch_complete", {"count": 4}, "fake_client0"))
+            sleep(0)
+            self.assertEqual("running", master.state)
+            self.assertEqual(1, global_stats.num_requests)
+            
+            # while a new test does reset the stats once it's hatched
+            master.start_hatching(6, 6)
+            self.assertFalse(sent_jobs(server)["fake_client0"]["rebalance"])
+            server.mocked_send(Message("hatch_complete", {"count": 6}, "fake_client0"))
+            sleep(0)
+            self.assertEqual(0, global_stats.num_requests)
+            master.greenlet.kill(block=True)
+    
+    def test_missing_slave_is_removed(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server, \
+                mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=0.01), \
+                mock.patch("locust.runners.MISSING_NODE_TIMEOUT", new=0.1):
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            server.mocked_send(Message("client_ready", None, "fake_client"))
+            sleep(0.08)
+            self.assertEqual("missing", master.clients["fake_client"].state)
+            sleep(0.1)
+            self.assertEqual(0, len(master.clients))
+            master.greenlet.kill(block=True)
+    
+    def test_parallel_local_runner_splits_num_requests(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        server = mocked_rpc_server()(None, None)
+        class MyRunner(ParallelLocalLocustRunner):
+            def create_server(self):
+                return server
+        
+        self.options.num_requests = 100
+        with mock.patch("locust.runners.WORKER_DONE_CHECK_INTERVAL", new=0.01):
+            runner = MyRunner(MyTestLocust, self.options, [None, None, None])
+            for i in range(3):
+                server.mocked_send(Message("client_ready", None, "worker%i" % i))
+            sleep(0)
+            runner.start_hatching(6, 6)
+            jobs = sent_jobs(server)
+            self.assertEqual([34, 33, 33], sorted([job["num_requests"] for job in jobs.values()], reverse=True))
+            
+            done = gevent.spawn(runner.wait_until_done)
+            for i in range(3):
+                server.mocked_send(Message("hatch_complete", {"count": 2}, "worker%i" % i))
+            sleep(0.05)
+            self.assertFalse(done.ready())
+            # the workers' locusts stop once they have made their share of the requests
+            for i in range(3):
+                server.mocked_send(Message("stats", {"stats":[], "errors":{}, "user_count": 0}, "worker%i" % i))
+            sleep(0.05)
+            self.assertTrue(done.ready())
+            runner.greenlet.kill(block=True)
+    
+    def test_late_messages_from_removed_slave(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            # messages from a slave that has been removed are ignored, and the master keeps listening
+            for msg_type, data in (("hatching", None), ("hatch_complete", {"count": 5}), ("client_stopped", None)):
+                server.mocked_send(Message(msg_type, data, "removed_client"))
+            server.mocked_send(Message("client_ready", None, "fake_client"))
+            sleep(0)
+            self.assertEqual(["fake_client"], list(master.clients.keys()))
+            master.greenlet.kill(block=True)
+    
+    def test_hatch_jobs_weighted_by_capacity(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(3):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+            sleep(0)
+            master.start_hatching(15, 15)
+            for i in range(3):
+                server.mocked_send(Message("hatch_complete", {"count": 5}, "fake_client%i" % i))
+            # fake_client1 uses half as much CPU per client as fake_client0, and fake_client2 
+            # shares its core with another process
+            server.mocked_send(Message("heartbeat", {"state": "running", "cpu_usage": 50.0, "memory_usage": 0, "cores": 1.0}, "fake_client0"))
+            server.mocked_send(Message("heartbeat", {"state": "running", "cpu_usage": 25.0, "memory_usage": 0, "cores": 1.0}, "fake_client1"))
+            server.mocked_send(Message("heartbeat", {"state": "running", "cpu_usage": 25.0, "memory_usage": 0, "cores": 0.5}, "fake_client2"))
+            sleep(0)
+            del server.outbox[:]
+            del server.recipients[:]
+            
+            master.start_hatching(20, 20)
+            jobs = sent_jobs(server)
+            self.assertEqual(5, jobs["fake_client0"]["num_clients"])
+            self.assertEqual(10, jobs["fake_client1"]["num_clients"])
+            self.assertEqual(5, jobs["fake_client2"]["num_clients"])
+            self.assertAlmostEqual(10.0, jobs["fake_client1"]["hatch_rate"])
+            master.greenlet.kill(block=True)
+    
+    def test_saturated_slave_is_rebalanced(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server, \
+                mock.patch("locust.runners.LOAD_REBALANCE_INTERVAL", new=0):
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(2):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+            sleep(0)
+            master.start_hatching(20, 20)
+            for i in range(2):
+                server.mocked_send(Message("hatch_complete", {"count": 10}, "fake_client%i" % i))
+            sleep(0)
+            self.assertEqual("running", master.state)
+            del server.outbox[:]
+            del server.recipients[:]
+            
+            server.mocked_send(Message("heartbeat", {"state": "running", "cpu_usage": 30.0, "memory_usage": 0}, "fake_client1"))
+            sleep(0)
+            self.assertEqual(0, len(server.outbox))
+            server.mocked_send(Message("heartbeat", {"state": "running", "cpu_usage": 99.0, "memory_usage": 0}, "fake_client0"))
+            sleep(0)
+            jobs = sent_jobs(server)
+            self.assertEqual(5, jobs["fake_client0"]["num_clients"])
+            self.assertEqual(15, jobs["fake_client1"]["num_clients"])
+            master.greenlet.kill(block=True)
+    
+    def test_stats_kept_when_saturated_slave_is_rebalanced(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server, \
+                mock.patch("locust.runners.LOAD_REBALANCE_INTERVAL", new=0):
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(2):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+            sleep(0)
+            master.start_hatching(20, 20)
+            for i in range(2):
+                server.mocked_send(Message("hatch_complete", {"count": 10}, "fake_client%i" % i))
+            sleep(0)
+            global_stats.get("/", "GET").log(100, 10)
+            del server.outbox[:]
+            del server.recipients[:]
+            
+            server.mocked_send(Message("heartbeat", {"state": "running", "cpu_usage": 30.0, "memory_usage": 0}, "fake_client1"))
+            server.mocked_send(Message("heartbeat", {"state": "running", "cpu_usage": 99.0, "memory_usage": 0}, "fake_client0"))
+            sleep(0)
+            jobs = sent_jobs(server)
+            self.assertEqual(["fake_client0", "fake_client1"], sorted(jobs))
+            self.assertTrue(all(job["rebalance"] for job in jobs.values()))
+            for i in range(2):
+                server.mocked_send(Message("hatch_complete", {"count": jobs["fake_client%i" % i]["num_clients"]}, "fake_client%i" % i))
+            sleep(0)
+            self.assertEqual("running", master.state)
+            self.assertEqual(1, global_stats.num_requests)
+            master.greenlet.kill(block=True)
+    
+    def test_slave_loop_lag(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(2):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+            sleep(0)
+            with mock.patch("locust.runners.logger") as logger:
+                server.mocked_send(Message("stats", {"stats":[], "errors":{}, "user_count": 5, "loop_lag": 0.01, "cpu_usage": 40.0}, "fake_client0"))
+                server.mocked_send(Message("stats", {"stats":[], "errors":{}, "user_count": 5, "loop_lag": 0.2}, "fake_client1"))
+                sleep(0)
+                self.assertEqual(0.01, master.clients["fake_client0"].loop_lag)
+                self.assertEqual(40.0, master.clients["fake_client0"].cpu_usage)
+                self.assertEqual(0.2, master.loop_lag)
+                self.assertEqual(1, logger.warning.call_count)
+                # the warning is only logged when the lag goes above the threshold
+                server.mocked_send(Message("stats", {"stats":[], "errors":{}, "user_count": 5, "loop_lag": 0.3}, "fake_client1"))
+                sleep(0)
+                self.assertEqual(1, logger.warning.call_count)
+            master.greenlet.kill(block=True)
+    
     def test_spawn_uneven_locusts(self):
         """
         Tests that we can accurately spawn a certain number of locusts, even if it's not an 
@@ -202,10 +588,8 @@ class TestMasterRunner(LocustTestCase):
         class MyTaskSet(TaskSet):
             def __init__(self, *a, **kw):
                 super(MyTaskSet, self).__init__(*a, **kw)
-                self._task_queue = [
-                    {"callable":self.will_error, "args":[], "kwargs":{}}, 
-                    {"callable":self.will_stop, "args":[], "kwargs":{}},
-                ]
+                self.schedule_task(self.will_error)
+                self.schedule_task(self.will_stop)
             
             @task(1)
             def will_error(self):
@@ -239,6 +623,293 @@ class TestMasterRunner(LocustTestCase):
         self.assertEqual(2, exception["count"])
 
 
+def mocked_rpc_client():
+    class MockedRpcClient(object):
+        outbox = []
+
+        def __init__(self, host, port, identity=None):
+            self.queue = Queue()
+        
+        def recv(self):
+            return Message.unserialize(self.queue.get())
+        
+        def send(self, message):
+            self.outbox.append(message.serialize())
+    
+    return MockedRpcClient
+
+
+class TestSlaveRunner(LocustTestCase):
+    def setUp(self):
+        super(TestSlaveRunner, self).setUp()
+        self._report_encoder = stats.report_encoder
+    
+    def tearDown(self):
+        super(TestSlaveRunner, self).tearDown()
+        stats.report_encoder = self._report_encoder
+    
+    @unittest.skipUnless(COLUMNAR_STATS_SUPPORTED, "columnar stats encoding not supported")
+    def test_columnar_stats_encoding(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args(["--stats-encoding", "columnar"])
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            slave = SlaveLocustRunner([MyTestLocust], options)
+            self.assertTrue(isinstance(stats.report_encoder, stats.ColumnarReportEncoder))
+            slave.greenlet.kill(block=True)
+
+    def test_heartbeat(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args([])
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            slave = SlaveLocustRunner([MyTestLocust], options)
+            sleep(0)
+            slave.greenlet.kill(block=True)
+            heartbeats = [Message.unserialize(msg) for msg in client.outbox]
+            heartbeats = [msg for msg in heartbeats if msg.type == "heartbeat"]
+            self.assertEqual(1, len(heartbeats))
+            self.assertEqual(slave.client_id, heartbeats[0].node_id)
+            self.assertEqual("ready", heartbeats[0].data["state"])
+            self.assertTrue(heartbeats[0].data["memory_usage"] > 0)
+    
+    def test_report_loop_lag(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args([])
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            slave = SlaveLocustRunner([MyTestLocust], options)
+            slave.greenlet.kill(block=True)
+            del client.outbox[:]
+            with mock.patch("locust.monitor.logger"):
+                slave.loop_monitor.record(0.25)
+            slave.report_stats()
+            msg = Message.unserialize(client.outbox[0])
+            self.assertEqual(0.25, msg.data["loop_lag"])
+            self.assertTrue("cpu_usage" in msg.data)
+    
+    def test_hatch_job(self):
+        class MyTaskSet(TaskSet):
+            @task
+            def my_task(self):
+                pass
+        
+        class MyTestLocust(Locust):
+            task_set = MyTaskSet
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args([])
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            slave = SlaveLocustRunner([MyTestLocust], options)
+            slave.client.queue.put(Message("hatch", {
+                "hatch_rate": 800.0, "num_clients": 8, "num_requests": None, "host": None, "stop_timeout": None,
+            }, None).serialize())
+            sleep(0)
+            slave.hatching_greenlet.join()
+            self.assertEqual(8, slave.user_count)
+            self.assertEqual(800.0, slave.hatch_rate)
+            slave.stop()
+            slave.greenlet.kill(block=True)
+    
+    def test_rebalance_hatch_job_keeps_stats(self):
+        class MyTaskSet(TaskSet):
+            @task
+            def my_task(self):
+                pass
+        
+        class MyTestLocust(Locust):
+            task_set = MyTaskSet
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args([])
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            slave = SlaveLocustRunner([MyTestLocust], options)
+            job = {"hatch_rate": 800.0, "num_clients": 4, "num_requests": None, "host": None, "stop_timeout": None}
+            slave.client.queue.put(Message("hatch", job, None).serialize())
+            sleep(0)
+            slave.hatching_greenlet.join()
+            global_stats.clear_all()
+            global_stats.get("/", "GET").log(100, 10)
+            
+            job = dict(job, num_clients=6, rebalance=True)
+            slave.client.queue.put(Message("hatch", job, None).serialize())
+            sleep(0)
+            slave.hatching_greenlet.join()
+            self.assertEqual(6, slave.user_count)
+            self.assertEqual(1, global_stats.num_requests)
+            slave.stop()
+            slave.greenlet.kill(block=True)
+    
+    def test_shared_stats_reports(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args([])
+        area = SharedReportArea(2, slot_size=64 * 1024)
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            aggregator = SlaveLocustRunner([MyTestLocust], options, shared_reports=area, worker_index=0)
+            slave = SlaveLocustRunner([MyTestLocust], options, shared_reports=area, worker_index=1)
+            aggregator.greenlet.kill(block=True)
+            slave.greenlet.kill(block=True)
+            # throw away any reports that were made before the greenlets were killed
+            area.collect()
+            del client.outbox[:]
+            
+            global_stats.clear_all()
+            global_stats.get("/", "GET").log(100, 10)
+            slave.report_stats()
+            # the report is left for the aggregator, instead of being sent to the master
+            self.assertEqual(0, len(client.outbox))
+            
+            global_stats.get("/", "GET").log(200, 10)
+            aggregator.report_stats()
+            self.assertEqual(1, len(client.outbox))
+            msg = Message.unserialize(client.outbox[0])
+            self.assertEqual(aggregator.client_id, msg.node_id)
+            self.assertEqual({slave.client_id: 0}, msg.data["node_user_counts"])
+            self.assertEqual({slave.client_id: 0.0}, msg.data["node_loop_lags"])
+            self.assertEqual(2, sum(delta[4] for delta in msg.data["stats"]))
+    
+    @unittest.skipUnless(COLUMNAR_STATS_SUPPORTED, "columnar stats encoding not supported")
+    def test_shared_stats_reports_columnar_fallback(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args(["--stats-encoding", "columnar"])
+        area = SharedReportArea(2, slot_size=64 * 1024)
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            slave = SlaveLocustRunner([MyTestLocust], options, shared_reports=area, worker_index=1)
+            slave.greenlet.kill(block=True)
+            area.collect()
+            del client.outbox[:]
+            
+            global_stats.clear_all()
+            global_stats.get("/", "GET").log(100, 10)
+            slave.report_stats()
+            aggregator_reports = area.collect()
+            self.assertEqual(1, len(aggregator_reports))
+            
+            # the aggregator hasn't collected the second report in time for the third one, so 
+            # that's sent to the master, which hasn't seen the name of the entry yet
+            global_stats.get("/", "GET").log(200, 10)
+            slave.report_stats()
+            global_stats.get("/", "GET").log(300, 10)
+            slave.report_stats()
+            self.assertEqual(1, len(client.outbox))
+            master_stats = RequestStats()
+            stats.ColumnarReportDecoder().apply(master_stats, Message.unserialize(client.outbox[0]).data)
+            self.assertEqual(1, master_stats.get("/", "GET").num_requests)
+            
+            # and the aggregator gets the reports again once it has collected them
+            aggregator_stats = RequestStats()
+            decoder = stats.ColumnarReportDecoder()
+            decoder.apply(aggregator_stats, aggregator_reports[0].data)
+            for msg in area.collect():
+                decoder.apply(aggregator_stats, msg.data)
+            self.assertEqual(2, aggregator_stats.get("/", "GET").num_requests)
+
+
+class TestRelayRunner(LocustTestCase):
+    def setUp(self):
+        super(TestRelayRunner, self).setUp()
+        global_stats.clear_all()
+    
+    def test_relay(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args(["--relay"])
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server, \
+                mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            relay = RelayLocustRunner([MyTestLocust], options)
+            server.mocked_send(Message("client_ready", None, "fake_slave1"))
+            server.mocked_send(Message("client_ready", None, "fake_slave2"))
+            sleep(0)
+            self.assertEqual(2, len(relay.clients))
+            
+            # hatch jobs from the master are split between the relay's slaves
+            relay.client.queue.put(Message("hatch", {
+                "hatch_rate": 10, "num_clients": 10, "num_requests": None, "host": None, "stop_timeout": None,
+            }, None).serialize())
+            sleep(0)
+            jobs = [Message.unserialize(m) for m in server.outbox]
+            self.assertEqual([5, 5], [m.data["num_clients"] for m in jobs if m.type == "hatch"])
+            
+            # the slaves' reports are merged into a single report for the master
+            for slave_id in ("fake_slave1", "fake_slave2"):
+                global_stats.get("/", "GET").log(100, 10)
+                data = {}
+                stats.on_report_to_master(slave_id, data)
+                data["user_count"] = 5
+                server.mocked_send(Message("stats", data, slave_id))
+            sleep(0)
+            
+            data = {}
+            events.report_to_master.fire(client_id=relay.client_id, data=data)
+            self.assertEqual(10, data["user_count"])
+            self.assertEqual(2, sum(delta[4] for delta in data["stats"]))
+            relay.greenlet.kill(block=True)
+    
+    def test_relay_without_slaves(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args(["--relay"])
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server, \
+                mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+            relay = RelayLocustRunner([MyTestLocust], options)
+            del client.outbox[:]
+            relay.client.queue.put(Message("hatch", {
+                "hatch_rate": 10, "num_clients": 10, "num_requests": None, "host": None, "stop_timeout": None,
+            }, None).serialize())
+            sleep(0)
+            # the master isn't left waiting for the relay to finish hatching
+            messages = [Message.unserialize(m) for m in client.outbox]
+            messages = [m for m in messages if m.type in ("hatching", "hatch_complete")]
+            self.assertEqual(["hatching", "hatch_complete"], [m.type for m in messages])
+            self.assertEqual(0, messages[1].data["count"])
+            relay.greenlet.kill(block=True)
+
+
+class TestDistributeClients(unittest.TestCase):
+    def test_distribute_clients(self):
+        self.assertEqual({"a": 5, "b": 5}, distribute_clients(10, {"a": 1.0, "b": 1.0}))
+        self.assertEqual({"a": 3, "b": 7}, distribute_clients(10, {"a": 1.0, "b": 2.5}))
+        self.assertEqual({"a": 1, "b": 1, "c": 0}, distribute_clients(2, {"a": 1.0, "b": 1.0, "c": 1.0}))
+        self.assertEqual({"a": 2, "b": 1}, distribute_clients(3, {"a": 0, "b": 0}))
+        self.assertEqual({}, distribute_clients(3, {}))
+
+
+class TestSharedReportArea(unittest.TestCase):
+    def test_publish_and_collect(self):
+        area = SharedReportArea(3, slot_size=1024)
+        self.assertTrue(area.publish(1, Message("stats", {"a": 1}, "node1")))
+        self.assertTrue(area.publish(2, Message("stats", {"a": 2}, "node2")))
+        # a slot can't be written to again until it has been collected
+        self.assertFalse(area.publish(1, Message("stats", {"a": 3}, "node1")))
+        
+        messages = area.collect(exclude=0)
+        self.assertEqual([("node1", {"a": 1}), ("node2", {"a": 2})], [(m.node_id, m.data) for m in messages])
+        self.assertEqual([], area.collect(exclude=0))
+        self.assertTrue(area.publish(1, Message("stats", {"a": 3}, "node1")))
+        self.assertEqual([{"a": 3}], [m.data for m in area.collect(exclude=0)])
+    
+    def test_too_large_report(self):
+        area = SharedReportArea(2, slot_size=64)
+        self.assertFalse(area.publish(1, Message("stats", {"a": "x" * 100}, "node1")))
+        self.assertEqual([], area.collect())
+
+
 class TestMessageSerializing(unittest.TestCase):
     def test_message_serialize(self):
         msg = Message("client_ready", None, "my_id")
@@ -247,3 +918,33 @@ class TestMessageSerializing(unittest.TestCase):
         self.assertEqual(msg.data, rebuilt.data)
         self.assertEqual(msg.node_id, rebuilt.node_id)
         
+
+
+class TestAddressedRpc(unittest.TestCase):
+    def check_addressed_messages(self, rpc_module):
+        port = get_free_port()
+        server = rpc_module.Server("127.0.0.1", port)
+        sleep(0)
+        clients = [rpc_module.Client("127.0.0.1", port, identity="node%i" % i) for i in range(3)]
+        for i, client in enumerate(clients):
+            client.send(Message("client_ready", None, "node%i" % i))
+        self.assertEqual(["node0", "node1", "node2"], sorted(server.recv().node_id for i in range(3)))
+        
+        server.send_to("node2", Message("hatch", 2, None))
+        server.send_to("node0", Message("hatch", 0, None))
+        self.assertEqual(0, clients[0].recv().data)
+        self.assertEqual(2, clients[2].recv().data)
+        
+        server.broadcast(Message("quit", None, None))
+        self.assertEqual(["quit"] * 3, [client.recv().type for client in clients])
+    
+    def test_socketrpc(self):
+        from locust.rpc import socketrpc
+        self.check_addressed_messages(socketrpc)
+    
+    def test_zmqrpc(self):
+        try:
+            from locust.rpc import zmqrpc
+        except ImportError:
+            raise unittest.SkipTest("pyzmq isn't installed")
+        self.check_addressed_messages(zmqrpc)
@@ -0,0 +1,91 @@
+import unittest
+
+import gevent
+import mock
+
+from locust.core import Locust, TaskSet, task
+from locust.main import parse_options
+from locust.runners import LocalLocustRunner, STATE_STOPPED
+from locust.shape import LoadShape, StepLoadShape, RampLoadShape, SpikeLoadShape, parse_load_shape
+from locust.test.testcases import LocustTestCase
+
+
+class TestLoadShapes(unittest.TestCase):
+    def test_step(self):
+        shape = StepLoadShape(step_clients=10, step_time=60, max_clients=25, time_limit=300, hatch_rate=5)
+        self.assertEqual((10, 5), shape.tick(0))
+        self.assertEqual((10, 5), shape.tick(59.9))
+        self.assertEqual((20, 5), shape.tick(60))
+        self.assertEqual((25, 5), shape.tick(150))
+        self.assertEqual(None, shape.tick(300))
+
+    def test_ramp(self):
+        shape = RampLoadShape(start_clients=10, end_clients=110, ramp_time=100)
+        self.assertEqual(10, shape.tick(0)[0])
+        self.assertEqual(60, shape.tick(50)[0])
+        self.assertEqual(110, shape.tick(100)[0])
+        self.assertEqual(110, shape.tick(1000)[0])
+
+    def test_spike(self):
+        shape = SpikeLoadShape(base_clients=5, spike_clients=50, spike_start=10, spike_time=5)
+        self.assertEqual(5, shape.tick(9)[0])
+        self.assertEqual(50, shape.tick(10)[0])
+        self.assertEqual(50, shape.tick(14.9)[0])
+        self.assertEqual(5, shape.tick(15)[0])
+
+    def test_unknown_attribute(self):
+        self.assertRaises(TypeError, StepLoadShape, ramp_time=10)
+
+    def test_parse_load_shape(self):
+        shape = parse_load_shape("step:10,30,100", hatch_rate=20)
+        self.assertTrue(isinstance(shape, StepLoadShape))
+        self.assertEqual(10, shape.step_clients)
+        self.assertEqual(30.0, shape.step_time)
+        self.assertEqual(100, shape.max_clients)
+        self.assertEqual(None, shape.time_limit)
+        self.assertEqual(20, shape.hatch_rate)
+
+        shape = parse_load_shape("spike:5,50,10,5,60")
+        self.assertEqual(60.0, shape.time_limit)
+        self.assertEqual(10, shape.hatch_rate)
+
+    def test_parse_invalid_load_shape(self):
+        self.assertRaises(ValueError, parse_load_shape, "wave:1,2")
+        self.assertRaises(ValueError, parse_load_shape, "ramp:1,2,3,4,5")
+        self.assertRaises(ValueError, parse_load_shape, "ramp:1,x,3")
+
+
+class TestLoadShapeRunner(LocustTestCase):
+    def test_runner_follows_shape(self):
+        class MyTaskSet(TaskSet):
+            @task
+            def my_task(self):
+                pass
+
+        class MyLocust(Locust):
+            task_set = MyTaskSet
+
+        class MyShape(LoadShape):
+            hatch_rate = 1000
+            def tick(self, run_time):
+                if run_time < 0.15:
+                    return (10, self.hatch_rate)
+                if run_time < 0.3:
+                    return (4, self.hatch_rate)
+                return None
+
+        parser, _, _ = parse_options()
+        options, _ = parser.parse_args([])
+        runner = LocalLocustRunner([MyLocust], options)
+        runner.load_shape = MyShape()
+        counts = []
+        with mock.patch("locust.runners.SHAPE_TICK_INTERVAL", new=0.05):
+            greenlet = runner.start_shape()
+            gevent.sleep(0.075)
+            counts.append(runner.user_count)
+            gevent.sleep(0.15)
+            counts.append(runner.user_count)
+            greenlet.join(timeout=1)
+        self.assertEqual([10, 4], counts)
+        self.assertEqual(STATE_STOPPED, runner.state)
+        self.assertEqual(0, runner.user_count)
@@ -5,10 +5,13 @@ from requests.exceptions import RequestException
 from six.moves import xrange
 
 from .testcases import WebserverTestCase
-from locust.stats import RequestStats, StatsEntry, global_stats
+from locust.stats import (RequestStats, RequestEventBuffer, StatsEntry, CircularCounter, ColumnarReportEncoder, 
+    ColumnarReportDecoder, global_stats)
+from locust.histogram import Histogram, RollingHistogram, HistogramMismatchError
 from locust.core import HttpLocust, Locust, TaskSet, task
+from locust.exception import StopLocust
 from locust.inspectlocust import get_task_ratio_dict
-from locust.rpc.protocol import Message
+from locust.rpc.protocol import Message, COLUMNAR_STATS_SUPPORTED
 
 class TestRequestStats(unittest.TestCase):
     def setUp(self):
@@ -115,6 +118,257 @@ class TestRequestStats(unittest.TestCase):
         u1 = StatsEntry.unserialize(data)
         
         self.assertEqual(20, u1.median_response_time)
+    
+    def test_percentile_large_response_times(self):
+        s = StatsEntry(self.stats, "percentile_test", "GET")
+        for x in xrange(1, 101):
+            s.log(x * 1000, 0)
+        
+        # values above 256 ms are bucketed with a precision of two significant digits
+        for percent, expected in [(0.5, 51000), (0.95, 96000), (0.99, 100000)]:
+            self.assertLessEqual(s.get_response_time_percentile(percent), expected)
+            self.assertGreater(s.get_response_time_percentile(percent), expected * 0.99)
+
+    
+    def test_current_response_time_percentiles(self):
+        s = StatsEntry(self.stats, "current_percentile_test", "GET")
+        for x in xrange(100):
+            s.log(x, 0)
+        self.stats.last_request_timestamp = s.last_request_timestamp
+        self.assertEqual([50, 95, 99], s.get_current_response_time_percentiles([0.5, 0.95, 0.99]))
+        
+        self.stats.last_request_timestamp = s.last_request_timestamp + 25
+        self.assertEqual([0, 0], s.get_current_response_time_percentiles([0.5, 0.95]))
+    
+    def test_current_response_time_percentiles_serialized(self):
+        s1 = StatsEntry(self.stats, "test", "GET")
+        s1.log(10, 0)
+        s1.log(20, 0)
+        s1.log(40, 0)
+        data = Message.unserialize(Message("dummy", s1.serialize(), "none").serialize()).data
+        s = StatsEntry(self.stats, "test", "GET")
+        s.extend(StatsEntry.unserialize(data), full_request_history=True)
+        self.stats.last_request_timestamp = s1.last_request_timestamp
+        self.assertEqual([20, 40], s.get_current_response_time_percentiles([0.5, 1.0]))
+
+    
+    def test_delta_report_through_message(self):
+        s1 = StatsEntry(self.stats, "test", "GET")
+        s1.log(10, 5)
+        s1.log(20, 5)
+        s1.log(4000, 5)
+        s1.log_error("dummy fail")
+        delta = Message.unserialize(Message("dummy", s1.get_delta_report(), "none").serialize()).data
+        self.assertEqual(0, s1.num_requests)
+        self.assertFalse(s1.response_times)
+        
+        s = StatsEntry(self.stats, "test", "GET")
+        s.log(30, 5)
+        s.apply_delta(delta)
+        self.assertEqual(4, s.num_requests)
+        self.assertEqual(1, s.num_failures)
+        self.assertEqual(4060, s.total_response_time)
+        self.assertEqual(10, s.min_response_time)
+        self.assertEqual(4000, s.max_response_time)
+        self.assertEqual(20, s.total_content_length)
+        self.assertEqual(20, s.median_response_time)
+        self.assertEqual(4, sum(s.num_reqs_per_sec.to_dict().values()))
+        self.stats.last_request_timestamp = s.last_request_timestamp
+        self.assertEqual([10, 4000], s.get_current_response_time_percentiles([0.0, 1.0]))
+    
+    def test_apply_delta_with_other_histogram_layout(self):
+        s1 = StatsEntry(self.stats, "test", "GET")
+        s1.response_times = Histogram(significant_digits=3)
+        s1.log(1234, 0)
+        s = StatsEntry(self.stats, "test", "GET")
+        s.apply_delta(s1.get_delta_report(), [3, s1.response_times.highest_trackable_value])
+        self.assertEqual({1232: 1}, s.response_times.to_dict())
+
+    
+    @unittest.skipUnless(COLUMNAR_STATS_SUPPORTED, "columnar stats encoding not supported")
+    def test_columnar_report_through_message(self):
+        stats = RequestStats()
+        stats.get("/a", "GET").log(10, 5)
+        stats.get("/a", "GET").log(4000, 5)
+        stats.get("/b", "POST").log_error("dummy fail")
+        encoder = ColumnarReportEncoder()
+        decoder = ColumnarReportDecoder()
+        master_stats = RequestStats()
+        
+        data = encoder.encode(stats.entries.values())
+        self.assertEqual(2, len(data["names"]))
+        decoder.apply(master_stats, Message.unserialize(Message("stats", data, "none").serialize()).data)
+        
+        a = master_stats.get("/a", "GET")
+        self.assertEqual(2, a.num_requests)
+        self.assertEqual(10, a.min_response_time)
+        self.assertEqual(4000, a.max_response_time)
+        self.assertEqual(10, a.total_content_length)
+        self.assertEqual({10: 1, 4000: 1}, a.response_times.to_dict())
+        self.assertEqual(2, sum(a.num_reqs_per_sec.to_dict().values()))
+        b = master_stats.get("/b", "POST")
+        self.assertEqual(1, b.num_failures)
+        self.assertEqual(None, b.min_response_time)
+        
+        # names are only sent the first time
+        stats.get("/a", "GET").log(20, 5)
+        data = encoder.encode([stats.get("/a", "GET")])
+        self.assertEqual({}, data["names"])
+        decoder.apply(master_stats, Message.unserialize(Message("stats", data, "none").serialize()).data)
+        self.assertEqual(3, a.num_requests)
+        self.assertEqual(20, a.median_response_time)
+
+
+class TestCircularCounter(unittest.TestCase):
+    def test_bounded(self):
+        c = CircularCounter(10)
+        for t in xrange(1000, 1100):
+            c.increment(t)
+        c.increment(1099, 2)
+        self.assertEqual(10, len(c))
+        self.assertEqual(3, c.get(1099))
+        self.assertEqual(0, c.get(1050))
+        self.assertFalse(1050 in c)
+        self.assertEqual(dict((t, 1) for t in xrange(1090, 1099)), dict((t, c[t]) for t in xrange(1090, 1099)))
+    
+    def test_archive(self):
+        c = CircularCounter.with_archive(10, [(10, 3), (60, 10)])
+        for t in xrange(1000, 1100):
+            c.increment(t)
+        self.assertEqual(100, sum(count for period, resolution, count in c.history()))
+        history = c.history()
+        self.assertEqual([(960, 60, 20), (1020, 60, 40), (1060, 10, 10)], history[:3])
+        self.assertEqual((1090, 1, 1), history[5])
+    
+    def test_merge(self):
+        c1 = CircularCounter(10)
+        c1.update({1000: 1, 1001: 2})
+        c2 = CircularCounter(10)
+        c2.update({1001: 1, 1005: 3})
+        c1.merge(c2)
+        self.assertEqual({1000: 1, 1001: 3, 1005: 3}, c1.to_dict())
+        c1.merge(c2, since=1002)
+        self.assertEqual({1000: 1, 1001: 3, 1005: 6}, c1.to_dict())
+
+
+class TestHistogram(unittest.TestCase):
+    def test_exact_below_sub_bucket_count(self):
+        h = Histogram()
+        for x in xrange(h.sub_bucket_count):
+            self.assertEqual(x, h.value_at_index(h.index_for(x)))
+    
+    def test_precision(self):
+        h = Histogram()
+        for x in (257, 1234, 54321, 987654):
+            self.assertLessEqual(h.value_at_index(h.index_for(x)), x)
+            self.assertLess(x - h.value_at_index(h.index_for(x)), x * 0.01)
+    
+    def test_highest_trackable_value(self):
+        h = Histogram()
+        h.record(10 ** 9)
+        self.assertEqual(h.bucket_count - 1, h.max_index)
+    
+    def test_percentiles(self):
+        h = Histogram()
+        for x in xrange(100):
+            h.record(x)
+        self.assertEqual([95, 50, 60], h.get_values_at_percentiles([0.95, 0.5, 0.6]))
+        self.assertEqual(49, h.median)
+    
+    def test_merge(self):
+        h1 = Histogram()
+        h1.record(10)
+        h1.record(700, 2)
+        h2 = Histogram()
+        h2.record(5)
+        h2.record(700)
+        h1.merge(h2)
+        self.assertEqual(5, h1.total_count)
+        self.assertEqual({5: 1, 10: 1, 700: 3}, h1.to_dict())
+        self.assertRaises(HistogramMismatchError, lambda: h1.merge(Histogram.from_dict({1: 1}, significant_digits=3)))
+    
+    def test_dict_round_trip(self):
+        h = Histogram()
+        for x in (1, 1, 300, 4500, 70000):
+            h.record(x)
+        self.assertEqual(h.to_dict(), Histogram.from_dict(h.to_dict()).to_dict())
+
+
+class TestRollingHistogram(unittest.TestCase):
+    def test_window(self):
+        h = RollingHistogram(10)
+        h.record(100, 1000)
+        h.record(200, 1005)
+        h.record(300, 1009)
+        self.assertEqual([200, 300], h.get_values_at_percentiles([0.5, 1.0], 1009))
+        # the first second has dropped out of the window
+        self.assertEqual([200, 300], h.get_values_at_percentiles([0.0, 1.0], 1010))
+        self.assertEqual([300], h.get_values_at_percentiles([0.0], 1015))
+    
+    def test_ring_buffer_overwrite(self):
+        h = RollingHistogram(10)
+        h.record(100, 1000)
+        h.record(200, 1010)
+        # old data for an already reused slot should be ignored
+        h.record(300, 1000)
+        self.assertEqual({1010: {200: 1}}, h.to_dict())
+    
+    def test_merge(self):
+        h1 = RollingHistogram(10)
+        h1.record(100, 1000)
+        h2 = RollingHistogram(10)
+        h2.record(100, 1000)
+        h2.record(50, 1001)
+        h1.merge(h2)
+        self.assertEqual({1000: {100: 2}, 1001: {50: 1}}, h1.to_dict())
+    
+    def test_shared_scratch_histogram(self):
+        h1 = RollingHistogram(10)
+        h1.record(100, 1000)
+        h2 = RollingHistogram(10)
+        h2.record(200, 1000)
+        # the histograms share the bucket array that percentiles are calculated in
+        self.assertTrue(h1._histogram is h2._histogram)
+        self.assertEqual([100], h1.get_values_at_percentiles([1.0], 1000))
+        self.assertEqual([200], h2.get_values_at_percentiles([1.0], 1000))
+        self.assertFalse(h1._histogram is RollingHistogram(10, significant_digits=3)._histogram)
+
+
+class TestRequestEventBuffer(unittest.TestCase):
+    def setUp(self):
+        self.stats = RequestStats()
+        self.buffer = RequestEventBuffer(self.stats, capacity=4)
+    
+    def test_flush(self):
+        self.buffer.on_request_success("GET", "/a", 100, 10)
+        self.buffer.on_request_success("GET", "/a", 200, 20)
+        self.buffer.on_request_failure("GET", "/b", 300, Exception("fail"))
+        self.assertEqual(3, len(self.buffer))
+        self.assertEqual(0, self.stats.num_requests)
+        
+        self.buffer.flush()
+        self.assertEqual(0, len(self.buffer))
+        a = self.stats.get("/a", "GET")
+        self.assertEqual(2, a.num_requests)
+        self.assertEqual(300, a.total_response_time)
+        self.assertEqual(30, a.total_content_length)
+        self.assertEqual(200, a.max_response_time)
+        self.assertEqual(1, self.stats.get("/b", "GET").num_failures)
+        self.assertEqual(1, len(self.stats.errors))
+    
+    def test_flush_when_full(self):
+        for i in xrange(10):
+            self.buffer.on_request_success("GET", "/a", i, 0)
+        self.assertTrue(len(self.buffer) <= 4)
+        self.buffer.flush()
+        self.assertEqual(10, self.stats.get("/a", "GET").num_requests)
+        self.assertEqual(45, self.stats.get("/a", "GET").total_response_time)
+    
+    def test_max_requests(self):
+        self.stats.max_requests = 3
+        for i in xrange(3):
+            self.buffer.on_request_success("GET", "/a", i, 0)
+        self.assertRaises(StopLocust, lambda: self.buffer.on_request_success("GET", "/a", 1, 0))
 
 
 class TestRequestStatsWithWebserver(WebserverTestCase):
@@ -0,0 +1,56 @@
+import unittest
+from time import time
+
+import gevent
+
+from locust import timerwheel
+from locust.timerwheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    def test_sleep(self):
+        wheel = TimerWheel(resolution=0.01)
+        start = time()
+        wheel.sleep(0.05)
+        self.assertAlmostEqual(0.05, time() - start, delta=0.02)
+        self.assertEqual(0, len(wheel))
+        # the event loop timer isn't kept running when nothing is sleeping
+        self.assertEqual(None, wheel._timer)
+
+    def test_many_sleepers(self):
+        wheel = TimerWheel(resolution=0.01)
+        woken = []
+        def sleeper(i):
+            wheel.sleep(0.01 * (i % 5 + 1))
+            woken.append(i)
+        start = time()
+        gevent.joinall([gevent.spawn(sleeper, i) for i in range(1000)])
+        self.assertTrue(time() - start < 0.2)
+        self.assertEqual(1000, len(woken))
+        self.assertEqual(0, len(wheel))
+
+    def test_sleep_longer_than_one_turn(self):
+        wheel = TimerWheel(resolution=0.01, slots=4)
+        start = time()
+        gevent.joinall([gevent.spawn(wheel.sleep, 0.1), gevent.spawn(wheel.sleep, 0.02)])
+        self.assertAlmostEqual(0.1, time() - start, delta=0.03)
+
+    def test_kill_sleeping_greenlet(self):
+        wheel = TimerWheel(resolution=0.01)
+        g = gevent.spawn(wheel.sleep, 0.05)
+        gevent.sleep(0.01)
+        g.kill()
+        self.assertTrue(g.dead)
+        gevent.sleep(0.06)
+        self.assertEqual(0, len(wheel))
+        self.assertEqual(None, wheel._timer)
+
+    def test_sleep_hook(self):
+        try:
+            timerwheel.enable_timer_wheel(resolution=0.01)
+            start = time()
+            timerwheel.sleep(0.03)
+            self.assertAlmostEqual(0.03, time() - start, delta=0.02)
+            self.assertTrue(timerwheel.timer_wheel.last_tick > 0)
+        finally:
+            timerwheel.timer_wheel = None
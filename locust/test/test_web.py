@@ -19,6 +19,8 @@ class TestWebUI(LocustTestCase):
         super(TestWebUI, self).setUp()
         
         stats.global_stats.clear_all()
+        # don't let the requests stats that an earlier test got be served from the cache
+        web.request_stats.clear_cache()
         parser = parse_options()[0]
         options = parser.parse_args([])[0]
         runners.locust_runner = LocustRunner([], options)
@@ -48,7 +50,21 @@ class TestWebUI(LocustTestCase):
         self.assertEqual("/test", data["stats"][0]["name"])
         self.assertEqual("GET", data["stats"][0]["method"])
         self.assertEqual(120, data["stats"][0]["avg_response_time"])
+        self.assertEqual(120, data["stats"][0]["current_response_time_percentile_95"])
+        self.assertEqual(0.0, data["loop_lag"])
         
+    def test_stats_total_median(self):
+        for response_time in (100, 200, 300):
+            stats.global_stats.get("/a", "GET").log(response_time, 0)
+        stats.global_stats.get("/b", "GET").log(1000, 0)
+        stats.global_stats.get("/b", "GET").log(1000, 0)
+        response = requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port)
+        data = json.loads(response.text)
+        total = data["stats"][-1]
+        self.assertEqual("Total", total["name"])
+        # the median of all five response times, rather than of the medians of the entries
+        self.assertEqual(300, total["median_response_time"])
+    
     def test_stats_cache(self):
         stats.global_stats.get("/test", "GET").log(120, 5612)
         response = requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port)
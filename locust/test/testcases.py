@@ -93,6 +93,16 @@ def no_content_length():
     r = send_file(BytesIO("This response does not have content-length in the header".encode('utf-8')), add_etags=False)
     return r
 
+@app.route("/set_cookie")
+def set_cookie():
+    response = make_response("ok")
+    response.set_cookie(request.args.get("name"), request.args.get("value"))
+    return response
+
+@app.route("/get_cookie")
+def get_cookie():
+    return make_response(request.cookies.get(request.args.get("name"), ""))
+
 @app.errorhandler(404)
 def not_found(error):
     return "Not Found", 404
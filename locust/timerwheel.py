@@ -0,0 +1,121 @@
+import math
+
+import gevent
+from gevent.hub import Waiter, get_hub
+from six.moves import xrange
+
+TIMER_WHEEL_RESOLUTION = 0.001
+"""
+Number of seconds per tick of the timer wheel. Sleeping greenlets whose wake up times fall
+within the same tick are resumed together.
+"""
+
+TIMER_WHEEL_SLOTS = 4096
+"""
+Number of slots in the timer wheel. Sleeps that are longer than one turn of the wheel
+(slots * resolution seconds) stay in their slot for more than one turn.
+"""
+
+timer_wheel = None
+"""
+The TimerWheel that the locusts sleep on, or None if they sleep with gevent.sleep
+(see :py:func:`enable_timer_wheel`)
+"""
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel that lets a large number of greenlets sleep on a single, repeating
+    event loop timer, instead of each greenlet starting and stopping its own timer.
+
+    A sleeping greenlet is put in the slot for the tick it should be woken up at. On each
+    tick, the due greenlets in the slots that have passed since the last tick are resumed.
+    Greenlets are never woken up early, but can be woken up to one tick late. The event
+    loop timer only runs while there are greenlets sleeping on the wheel.
+    """
+
+    def __init__(self, resolution=TIMER_WHEEL_RESOLUTION, slots=TIMER_WHEEL_SLOTS):
+        self.resolution = resolution
+        self.slots = [[] for i in xrange(slots)]
+        self.count = 0
+        self.last_tick = 0
+        self._timer = None
+        self._loop = None
+
+    def _tick_at(self, t):
+        return int(t / self.resolution)
+
+    def sleep(self, seconds):
+        """
+        Put the current greenlet to sleep for *seconds* seconds
+        """
+        if seconds < self.resolution:
+            # not worth a trip around the wheel
+            gevent.sleep(seconds)
+            return
+        if self._timer is None:
+            self._start()
+        deadline = int(math.ceil((self._loop.now() + seconds) / self.resolution))
+        waiter = Waiter()
+        self.slots[deadline % len(self.slots)].append((deadline, waiter))
+        self.count += 1
+        waiter.get()
+
+    def _start(self):
+        self._loop = get_hub().loop
+        self.last_tick = self._tick_at(self._loop.now())
+        self._timer = self._loop.timer(self.resolution, self.resolution)
+        self._timer.start(self._on_tick)
+
+    def _stop(self):
+        self._timer.stop()
+        self._timer = None
+
+    def _on_tick(self):
+        tick = self._tick_at(self._loop.now())
+        slots = self.slots
+        # if the event loop has been blocked for a whole turn of the wheel, every slot has passed
+        first = max(self.last_tick + 1, tick - len(slots) + 1)
+        due = []
+        for t in xrange(first, tick + 1):
+            slot = slots[t % len(slots)]
+            if not slot:
+                continue
+            waiting = []
+            for entry in slot:
+                if entry[0] <= tick:
+                    due.append(entry[1])
+                else:
+                    waiting.append(entry)
+            slots[t % len(slots)] = waiting
+        self.last_tick = tick
+        self.count -= len(due)
+        if not self.count:
+            self._stop()
+
+        # the woken greenlets may go back to sleep on the wheel right away, so the slots
+        # are only touched before any of them are resumed
+        for waiter in due:
+            waiter.switch(None)
+
+    def __len__(self):
+        return self.count
+
+
+def sleep(seconds):
+    """
+    Sleep for *seconds* seconds, on the timer wheel if it's enabled, and with gevent.sleep
+    otherwise
+    """
+    if timer_wheel is None:
+        gevent.sleep(seconds)
+    else:
+        timer_wheel.sleep(seconds)
+
+
+def enable_timer_wheel(resolution=TIMER_WHEEL_RESOLUTION, slots=TIMER_WHEEL_SLOTS):
+    """
+    Make the locusts sleep on a shared TimerWheel (see the --timer-wheel command line option)
+    """
+    global timer_wheel
+    timer_wheel = TimerWheel(resolution, slots)
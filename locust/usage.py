@@ -0,0 +1,51 @@
+import sys
+from time import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+class ResourceUsage(object):
+    """
+    Measures the CPU and memory usage of the current process, for the heartbeats that the
+    slave nodes send to the master.
+
+    The CPU usage is the percentage of one core that the process has used since the previous
+    call to :py:meth:`sample() <locust.usage.ResourceUsage.sample>`. The memory usage is the
+    peak resident set size of the process, in bytes. Both are 0 on platforms without the
+    resource module.
+    """
+
+    def __init__(self):
+        self.last_time = time()
+        self.last_cpu_time = self._cpu_time()
+
+    def _cpu_time(self):
+        if resource is None:
+            return 0.0
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+
+    def memory_usage(self):
+        if resource is None:
+            return 0
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on OS X, and in kilobytes everywhere else
+        if sys.platform == "darwin":
+            return rss
+        return rss * 1024
+
+    def sample(self):
+        """
+        Return a (cpu_usage, memory_usage) two-tuple
+        """
+        now = time()
+        cpu_time = self._cpu_time()
+        elapsed = now - self.last_time
+        cpu_usage = 100.0 * (cpu_time - self.last_cpu_time) / elapsed if elapsed > 0 else 0.0
+        self.last_time = now
+        self.last_cpu_time = cpu_time
+        return cpu_usage, self.memory_usage()
@@ -5,8 +5,7 @@ import json
 import os.path
 from time import time
 from itertools import chain
-from collections import defaultdict
-from six.moves import StringIO, xrange
+from six.moves import StringIO
 import six
 
 from gevent import wsgi
@@ -15,7 +14,6 @@ from flask import Flask, make_response, request, render_template
 from . import runners
 from .cache import memoize
 from .runners import MasterLocustRunner
-from locust.stats import median_from_dict
 from locust import __version__ as version
 
 import logging
@@ -41,6 +39,7 @@ def index():
         is_distributed=is_distributed,
         slave_count=slave_count,
         user_count=runners.locust_runner.user_count,
+        arrival_rate=runners.locust_runner.arrival_rate,
         version=version
     )
 
@@ -50,7 +49,11 @@ def swarm():
 
     locust_count = int(request.form["locust_count"])
     hatch_rate = float(request.form["hatch_rate"])
-    runners.locust_runner.start_hatching(locust_count, hatch_rate)
+    if runners.locust_runner.load_shape is not None:
+        # the number of clients is decided by the load shape
+        runners.locust_runner.start_shape()
+    else:
+        runners.locust_runner.start_hatching(locust_count, hatch_rate)
     response = make_response(json.dumps({'success':True, 'message': 'Swarming started'}))
     response.headers["Content-type"] = "application/json"
     return response
@@ -137,7 +140,10 @@ def distribution_stats_csv():
 @memoize(timeout=DEFAULT_CACHE_TIME, dynamic_timeout=True)
 def request_stats():
     stats = []
-    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.aggregated_stats("Total")]):
+    # the total's median is calculated from the merged response time histograms of all the entries
+    total = runners.locust_runner.stats.aggregated_stats("Total", full_request_history=True)
+    for s in chain(_sort_stats(runners.locust_runner.request_stats), [total]):
+        current_percentiles = s.get_current_response_time_percentiles([0.5, 0.95, 0.99])
         stats.append({
             "method": s.method,
             "name": s.name,
@@ -149,30 +155,29 @@ def request_stats():
             "current_rps": s.current_rps,
             "median_response_time": s.median_response_time,
             "avg_content_length": s.avg_content_length,
+            "current_response_time_percentile_50": current_percentiles[0],
+            "current_response_time_percentile_95": current_percentiles[1],
+            "current_response_time_percentile_99": current_percentiles[2],
         })
     
     report = {"stats":stats, "errors":[e.to_dict() for e in six.itervalues(runners.locust_runner.errors)]}
     if stats:
         report["total_rps"] = stats[len(stats)-1]["current_rps"]
-        report["fail_ratio"] = runners.locust_runner.stats.aggregated_stats("Total").fail_ratio
-        
-        # since generating a total response times dict with all response times from all
-        # urls is slow, we make a new total response time dict which will consist of one
-        # entry per url with the median response time as key and the number of requests as
-        # value
-        response_times = defaultdict(int) # used for calculating total median
-        for i in xrange(len(stats)-1):
-            response_times[stats[i]["median_response_time"]] += stats[i]["num_requests"]
-        
-        # calculate total median
-        stats[len(stats)-1]["median_response_time"] = median_from_dict(stats[len(stats)-1]["num_requests"], response_times)
+        report["fail_ratio"] = total.fail_ratio
     
     is_distributed = isinstance(runners.locust_runner, MasterLocustRunner)
     if is_distributed:
         report["slave_count"] = runners.locust_runner.slave_count
+        report["slaves"] = [
+            {"id": c.id, "state": c.state, "user_count": c.user_count, "cpu_usage": c.cpu_usage, "memory_usage": c.memory_usage, "loop_lag": c.loop_lag}
+            for c in six.itervalues(runners.locust_runner.clients)
+        ]
     
     report["state"] = runners.locust_runner.state
     report["user_count"] = runners.locust_runner.user_count
+    report["loop_lag"] = runners.locust_runner.loop_lag
+    if runners.locust_runner.arrival_rate:
+        report["schedule_lag"] = runners.locust_runner.schedule_lag
     return json.dumps(report)
 
 @app.route("/exceptions")